@@ -1,5 +1,8 @@
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from core.auth import get_current_user_id
+from core.config import settings
+from core.context import RequestContext, get_request_context
 from core.logging_config import get_logger
 from db.crud.users import user_crud
 from models.user import User
@@ -7,23 +10,38 @@ from models.user import User
 logger = get_logger(__name__)
 
 
+async def load_user_profile(context: RequestContext, user_id: str) -> Optional[User]:
+    """Fetch a user profile at most once per request."""
+    return await context.memoize(("user", user_id), lambda: user_crud.get_user_by_id(user_id))
+
+
 async def get_current_user_profile(
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: str = Depends(get_current_user_id),
+    context: RequestContext = Depends(get_request_context)
 ) -> User:
-    logger.debug(f"Looking for user with ID: {current_user_id}")
+    logger.debug("Looking for user with ID: %s", current_user_id)
     
-    user = await user_crud.get_user_by_id(current_user_id)
+    user = await load_user_profile(context, current_user_id)
     if not user:
-        logger.warning(f"User not found in database: {current_user_id}")
+        logger.warning("User not found in database: %s", current_user_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User profile not found. Please initialize your profile first."
         )
     
-    logger.debug(f"Found user: {user.name} ({user.user_id})")
+    logger.debug("Found user: %s (%s)", user.name, user.user_id)
     return user
 
 
 async def verify_user_exists(user_id: str) -> bool:
     user = await user_crud.get_user_by_id(user_id)
-    return user is not None
\ No newline at end of file
+    return user is not None
+
+
+async def require_admin(current_user_id: str = Depends(get_current_user_id)) -> str:
+    if current_user_id not in settings.admin_user_ids:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user_id
@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from api.dependencies import require_admin
+from core.config import settings
+from core.profiling import profiler
+from core.tracing import TracedRoute
+from db.slow_queries import slow_query_recorder
+
+router = APIRouter(route_class=TracedRoute, dependencies=[Depends(require_admin)])
+
+
+@router.get("/slow-queries", response_model=dict)
+async def get_slow_queries():
+    """Slow query shapes with their plan summaries and suggested indexes"""
+    return {
+        "threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "shapes": slow_query_recorder.report()
+    }
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_slow_queries():
+    """Reset the slow query report"""
+    slow_query_recorder.clear()
+
+
+def require_profiling():
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiling is disabled")
+
+
+@router.get("/profiles", response_model=dict, dependencies=[Depends(require_profiling)])
+async def list_profiles():
+    """Stored request profiles by route, newest first"""
+    return {
+        **profiler.stats(),
+        "profiles": profiler.list()
+    }
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse, dependencies=[Depends(require_profiling)])
+async def download_profile(profile_id: str):
+    """Collapsed stacks of one profile, ready for flamegraph.pl or speedscope"""
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return PlainTextResponse(
+        profile.collapsed(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+    )
+
+
+@router.delete("/profiles", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(require_profiling)])
+async def clear_profiles():
+    """Drop stored profiles"""
+    profiler.clear()
+
+
+@router.put("/profiling", response_model=dict, dependencies=[Depends(require_profiling)])
+async def set_profiling_sample(
+    sample_percent: float = Query(..., ge=0, le=100, description="Percentage of requests to profile")
+):
+    """Change the share of requests profiled without an X-Profile header"""
+    profiler.sample_percent = sample_percent
+    return profiler.stats()
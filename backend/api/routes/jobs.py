@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from core.auth import get_current_user_id
+from core.config import settings
+from core.controller import to_model
+from core.middleware import standard_rate_limit
+from core.tracing import TracedRoute
+from core.utils import validate_object_id
+from db.jobs import job_runner
+from models.job import JobStatus
+
+router = APIRouter(route_class=TracedRoute)
+
+
+@router.get("/{job_id}", response_model=JobStatus)
+@standard_rate_limit()
+async def get_job(
+    request: Request,
+    job_id: str,
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """Status of a background job the current user started"""
+    job = await job_runner.get(validate_object_id(job_id))
+    if job is None or (job.get("owner_id") != current_user_id and current_user_id not in settings.admin_user_ids):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return to_model(JobStatus, job)
@@ -1,8 +1,11 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from pydantic import BaseModel
 from core.auth import get_current_user_id
+from core.cache import allow_stale
+from core.conditional import check_entity, conditional_list
 from core.middleware import create_rate_limit, search_rate_limit
+from core.tracing import TracedRoute
 from db.crud.projects import project_crud
 from db.crud.testimonials import testimonial_crud
 from models.project import (
@@ -17,7 +20,7 @@ from models.testimonial import TestimonialCreate, TestimonialPublic
 class TestimonialContentRequest(BaseModel):
     content: str
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 
 @router.post("/", response_model=Project, status_code=status.HTTP_201_CREATED)
@@ -31,7 +34,7 @@ async def create_project(
     return await project_crud.create_project(project, current_user_id)
 
 
-@router.get("/", response_model=dict)
+@router.get("/", response_model=dict, dependencies=[Depends(conditional_list("projects")), Depends(allow_stale)])
 @search_rate_limit()
 async def get_projects(
     request: Request,
@@ -57,7 +60,12 @@ async def get_projects(
     )
 
 
-@router.get("/trending", response_model=List[ProjectSummary])
+# Scores also depend on the clock, so the list ETag rotates every 5 minutes
+@router.get(
+    "/trending",
+    response_model=List[ProjectSummary],
+    dependencies=[Depends(conditional_list("projects", max_age=300)), Depends(allow_stale)]
+)
 async def get_trending_projects(
     limit: int = Query(10, ge=1, le=50)
 ):
@@ -66,7 +74,7 @@ async def get_trending_projects(
 
 
 @router.get("/{project_id}", response_model=Project)
-async def get_project(project_id: str):
+async def get_project(project_id: str, request: Request, response: Response):
     """Get a specific project by ID"""
     project = await project_crud.get_project_by_id(project_id)
     if not project:
@@ -74,6 +82,7 @@ async def get_project(project_id: str):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found"
         )
+    check_entity(request, response, project)
     return project
 
 
@@ -145,7 +154,11 @@ async def add_contributor(
     )
 
 
-@router.get("/{project_id}/testimonials", response_model=dict)
+@router.get(
+    "/{project_id}/testimonials",
+    response_model=dict,
+    dependencies=[Depends(conditional_list("testimonials", "users", "projects"))]
+)
 async def get_project_testimonials(
     project_id: str,
     page: int = Query(1, ge=1),
@@ -1,6 +1,10 @@
 from typing import Optional, List
-from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
 from core.auth import get_current_user_id
+from core.cache import allow_stale
+from core.conditional import check_entity, conditional_list
+from core.middleware import create_rate_limit, search_rate_limit
+from core.tracing import TracedRoute
 from db.crud.requests import teammate_request_crud
 from core.logging_config import get_logger
 from models.request import (
@@ -11,10 +15,11 @@ from models.request import (
 logger = get_logger(__name__)
 
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 
 @router.post("/", response_model=TeammateRequestPublic, status_code=status.HTTP_201_CREATED)
+@create_rate_limit()
 async def create_teammate_request(
     request_data: TeammateRequestCreate,
     user_id: str = Depends(get_current_user_id)
@@ -24,14 +29,15 @@ async def create_teammate_request(
         request = await teammate_request_crud.create_request(request_data, user_id)
         return request
     except Exception as e:
-        logger.error(f"Error creating teammate request: {e}")
+        logger.error("Error creating teammate request: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create teammate request"
         )
 
 
-@router.get("/", response_model=dict)
+@router.get("/", response_model=dict, dependencies=[Depends(conditional_list("teammate_requests"))])
+@search_rate_limit()
 async def get_teammate_requests(
     tags: Optional[List[str]] = Query(None),
     search: Optional[str] = Query(None),
@@ -49,7 +55,7 @@ async def get_teammate_requests(
             limit=limit
         )
     except Exception as e:
-        logger.error(f"Error fetching teammate requests: {e}")
+        logger.error("Error fetching teammate requests: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fetch teammate requests"
@@ -70,14 +76,18 @@ async def get_my_requests(
             limit=limit
         )
     except Exception as e:
-        logger.error(f"Error fetching user requests: {e}")
+        logger.error("Error fetching user requests: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fetch user requests"
         )
 
 
-@router.get("/recent", response_model=List[TeammateRequestPublic])
+@router.get(
+    "/recent",
+    response_model=List[TeammateRequestPublic],
+    dependencies=[Depends(conditional_list("teammate_requests")), Depends(allow_stale)]
+)
 async def get_recent_requests(
     limit: int = Query(10, ge=1, le=50)
 ):
@@ -85,14 +95,18 @@ async def get_recent_requests(
     try:
         return await teammate_request_crud.get_recent_requests(limit=limit)
     except Exception as e:
-        logger.error(f"Error fetching recent requests: {e}")
+        logger.error("Error fetching recent requests: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fetch recent requests"
         )
 
 
-@router.get("/by-tags", response_model=List[TeammateRequestPublic])
+@router.get(
+    "/by-tags",
+    response_model=List[TeammateRequestPublic],
+    dependencies=[Depends(conditional_list("teammate_requests"))]
+)
 async def get_requests_by_tags(
     tags: List[str] = Query(...),
     limit: int = Query(10, ge=1, le=50)
@@ -104,14 +118,18 @@ async def get_requests_by_tags(
             limit=limit
         )
     except Exception as e:
-        logger.error(f"Error fetching requests by tags: {e}")
+        logger.error("Error fetching requests by tags: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fetch requests by tags"
         )
 
 
-@router.get("/project/{project_id}", response_model=dict)
+@router.get(
+    "/project/{project_id}",
+    response_model=dict,
+    dependencies=[Depends(conditional_list("teammate_requests", "projects"))]
+)
 async def get_project_requests(
     project_id: str,
     page: int = Query(1, ge=1),
@@ -125,7 +143,7 @@ async def get_project_requests(
             limit=limit
         )
     except Exception as e:
-        logger.error(f"Error fetching project requests: {e}")
+        logger.error("Error fetching project requests: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fetch project requests"
@@ -133,7 +151,7 @@ async def get_project_requests(
 
 
 @router.get("/{request_id}", response_model=TeammateRequestPublic)
-async def get_teammate_request(request_id: str):
+async def get_teammate_request(request_id: str, http_request: Request, response: Response):
     """Get a specific teammate request by ID"""
     try:
         request = await teammate_request_crud.get_request_by_id(request_id)
@@ -142,11 +160,12 @@ async def get_teammate_request(request_id: str):
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Teammate request not found"
             )
+        check_entity(http_request, response, request)
         return request
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching teammate request: {e}")
+        logger.error("Error fetching teammate request: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fetch teammate request"
@@ -169,7 +188,7 @@ async def update_teammate_request(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error updating teammate request: {e}")
+        logger.error("Error updating teammate request: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update teammate request"
@@ -195,7 +214,7 @@ async def delete_teammate_request(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting teammate request: {e}")
+        logger.error("Error deleting teammate request: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete teammate request"
@@ -1,5 +1,8 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
 from core.auth import get_current_user_id
+from core.conditional import check_entity, conditional_list
+from core.middleware import create_rate_limit
+from core.tracing import TracedRoute
 from db.crud.testimonials import testimonial_crud
 from core.logging_config import get_logger
 
@@ -11,10 +14,11 @@ from models.testimonial import (
 
 logger = get_logger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 
 @router.post("/", response_model=TestimonialPublic, status_code=status.HTTP_201_CREATED)
+@create_rate_limit()
 async def create_testimonial(
     testimonial_data: TestimonialCreate,
     user_id: str = Depends(get_current_user_id)
@@ -26,14 +30,14 @@ async def create_testimonial(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error creating testimonial: {e}")
+        logger.error("Error creating testimonial: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create testimonial"
         )
 
 
-@router.get("/", response_model=dict)
+@router.get("/", response_model=dict, dependencies=[Depends(conditional_list("testimonials", "users"))])
 async def get_all_testimonials(
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100)
@@ -47,7 +51,7 @@ async def get_all_testimonials(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching testimonials: {e}")
+        logger.error("Error fetching testimonials: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fetch testimonials"
@@ -70,14 +74,18 @@ async def get_my_testimonials(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching my testimonials: {e}")
+        logger.error("Error fetching my testimonials: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fetch my testimonials"
         )
 
 
-@router.get("/project/{project_id}", response_model=dict)
+@router.get(
+    "/project/{project_id}",
+    response_model=dict,
+    dependencies=[Depends(conditional_list("testimonials", "users", "projects"))]
+)
 async def get_project_testimonials(
     project_id: str,
     page: int = Query(1, ge=1),
@@ -93,7 +101,7 @@ async def get_project_testimonials(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching project testimonials: {e}")
+        logger.error("Error fetching project testimonials: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fetch project testimonials"
@@ -101,7 +109,7 @@ async def get_project_testimonials(
 
 
 @router.get("/{testimonial_id}", response_model=TestimonialPublic)
-async def get_testimonial(testimonial_id: str):
+async def get_testimonial(testimonial_id: str, request: Request, response: Response):
     """Get a specific testimonial by ID"""
     try:
         testimonial = await testimonial_crud.get_testimonial_by_id(testimonial_id)
@@ -110,11 +118,12 @@ async def get_testimonial(testimonial_id: str):
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Testimonial not found"
             )
+        check_entity(request, response, testimonial)
         return testimonial
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching testimonial: {e}")
+        logger.error("Error fetching testimonial: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fetch testimonial"
@@ -137,7 +146,7 @@ async def update_testimonial(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error updating testimonial: {e}")
+        logger.error("Error updating testimonial: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update testimonial"
@@ -163,7 +172,7 @@ async def delete_testimonial(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting testimonial: {e}")
+        logger.error("Error deleting testimonial: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete testimonial"
@@ -1,13 +1,16 @@
 from typing import Optional, List
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from core.auth import get_current_user, get_current_user_id
-from core.middleware import auth_rate_limit, standard_rate_limit
+from core.conditional import check_entity, conditional_list
+from core.context import RequestContext, get_request_context
+from core.middleware import auth_rate_limit, search_rate_limit, standard_rate_limit
+from core.tracing import TracedRoute
 from db.crud.users import user_crud
 from db.crud.projects import project_crud
 from models.user import User, UserInit, UserUpdate, UserPublic
-from api.dependencies import get_current_user_profile
+from api.dependencies import get_current_user_profile, load_user_profile
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 
 @router.post("/init", response_model=User)
@@ -15,10 +18,11 @@ router = APIRouter()
 async def init_user(
     request: Request,
     user_data: UserInit,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    context: RequestContext = Depends(get_request_context)
 ):
     """Initialize user profile on first login"""
-    existing_user = await user_crud.get_user_by_id(current_user["user_id"])
+    existing_user = await load_user_profile(context, current_user["user_id"])
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
@@ -42,20 +46,23 @@ async def get_current_user_profile_route(
     return current_user
 
 
-@router.delete("/me")
+@router.delete("/me", status_code=status.HTTP_202_ACCEPTED)
 @auth_rate_limit()
 async def delete_current_user(
     request: Request,
+    response: Response,
     current_user_id: str = Depends(get_current_user_id)
 ):
-    """Delete current user and all associated data"""
-    success = await user_crud.delete_user(current_user_id)
-    if not success:
+    """Deactivate current user now; their data is deleted by a background job"""
+    job = await user_crud.delete_user(current_user_id)
+    if job is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-    return {"message": "User deleted successfully"}
+    job_id = str(job["_id"])
+    response.headers["Location"] = f"/jobs/{job_id}"
+    return {"message": "User deletion started", "job_id": job_id, "state": job["state"]}
 
 
 @router.put("/update", response_model=User)
@@ -71,7 +78,7 @@ async def update_user(
 
 @router.get("/{user_id}", response_model=UserPublic)
 @standard_rate_limit()
-async def get_user_public(request: Request, user_id: str):
+async def get_user_public(request: Request, response: Response, user_id: str):
     """Get public user profile"""
     user = await user_crud.get_user_public(user_id)
     if not user:
@@ -79,10 +86,11 @@ async def get_user_public(request: Request, user_id: str):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
+    check_entity(request, response, user)
     return user
 
 
-@router.get("/{user_id}/projects")
+@router.get("/{user_id}/projects", dependencies=[Depends(conditional_list("projects", "users"))])
 async def get_user_projects(
     user_id: str,
     page: int = Query(1, ge=1),
@@ -99,7 +107,10 @@ async def get_user_projects(
     return await project_crud.get_user_projects(user_id, page, limit)
 
 
-@router.get("/{user_id}/stats")
+@router.get(
+    "/{user_id}/stats",
+    dependencies=[Depends(conditional_list("users", "projects", "testimonials", "teammate_requests"))]
+)
 async def get_user_stats(user_id: str):
     """Get user statistics"""
     if not await user_crud.user_exists(user_id):
@@ -111,7 +122,8 @@ async def get_user_stats(user_id: str):
     return await user_crud.get_user_stats(user_id)
 
 
-@router.get("/", response_model=dict)
+@router.get("/", response_model=dict, dependencies=[Depends(conditional_list("users"))])
+@search_rate_limit()
 async def search_users(
     search: Optional[str] = Query(None),
     skills: Optional[List[str]] = Query(None),
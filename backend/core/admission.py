@@ -0,0 +1,214 @@
+import asyncio
+import heapq
+import itertools
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+from fastapi import HTTPException, Request, status
+from core.config import settings
+from core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+ROUTE_CLASSES = ("auth", "write", "read", "search")
+# Never queued or shed, so load balancers can still see the instance
+EXEMPT_PATHS = ("/health", "/metrics")
+
+# Lower runs first. Unauthenticated requests rank behind every authenticated one.
+_CLASS_PRIORITY = {"auth": 0, "write": 0, "read": 1, "search": 2}
+_ANONYMOUS_PENALTY = 3
+
+
+class ConcurrencyLimiter:
+    """
+    At most `limit` holders at once, with a bounded priority queue of waiters.
+
+    A full queue admits a newcomer only by evicting a waiter of strictly lower
+    priority; waiters give up after `timeout` seconds. Both outcomes count as
+    shed. Slots are handed directly from release() to the next waiter so a
+    newcomer cannot overtake the queue.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.in_flight = 0
+        self._waiters: List[list] = []  # heap of [priority, sequence, future]
+        self._waiting = 0
+        self._sequence = itertools.count()
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.timeouts = 0
+
+    async def acquire(self, priority: int) -> bool:
+        """Take a slot, waiting if needed. False means the request was shed."""
+        if self.in_flight < self.limit and not self._waiting:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+        if self._waiting >= self.queue_size and not self._evict_below(priority):
+            self.shed += 1
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._sequence), future])
+        self._waiting += 1
+        self.queued += 1
+        try:
+            admitted = await asyncio.wait_for(future, self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.cancelled():
+                # Still queued; the heap entry is skipped lazily by release()
+                self._waiting -= 1
+                admitted = False
+            else:
+                # Resolved in the same tick we gave up
+                admitted = future.result()
+            if isinstance(e, asyncio.CancelledError):
+                if admitted:
+                    self.release()
+                raise
+            if not admitted:
+                self.timeouts += 1
+
+        if admitted:
+            self.admitted += 1
+        else:
+            self.shed += 1
+        return admitted
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._waiting -= 1
+                future.set_result(True)  # the slot passes on; in_flight is unchanged
+                return
+        self.in_flight -= 1
+
+    def _evict_below(self, priority: int) -> bool:
+        """Reject the lowest-priority, most recent waiter if it ranks below `priority`."""
+        live = [entry for entry in self._waiters if not entry[2].done()]
+        if not live:
+            return False
+        worst = max(live, key=lambda entry: (entry[0], entry[1]))
+        if worst[0] <= priority:
+            return False
+        self._waiting -= 1
+        worst[2].set_result(False)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self._waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+            "timeouts": self.timeouts,
+        }
+
+
+class ServiceOverloaded(HTTPException):
+    def __init__(self, route_class: str):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)},
+        )
+        self.route_class = route_class
+
+
+class AdmissionController:
+    """One limiter per route class plus an overall in-flight cap."""
+
+    def __init__(self):
+        limits = {
+            "auth": settings.ADMISSION_AUTH_CONCURRENCY,
+            "write": settings.ADMISSION_WRITE_CONCURRENCY,
+            "read": settings.ADMISSION_READ_CONCURRENCY,
+            "search": settings.ADMISSION_SEARCH_CONCURRENCY,
+        }
+        self.classes = {
+            name: ConcurrencyLimiter(
+                name,
+                limits[name],
+                settings.ADMISSION_QUEUE_SIZE,
+                settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+            )
+            for name in ROUTE_CLASSES
+        }
+        self.overall = ConcurrencyLimiter(
+            "overall",
+            settings.ADMISSION_MAX_IN_FLIGHT,
+            settings.ADMISSION_QUEUE_SIZE * len(ROUTE_CLASSES),
+            settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+        )
+
+    @asynccontextmanager
+    async def slot(self, route_class: str, priority: int):
+        """Hold a class slot and an overall slot, or raise ServiceOverloaded."""
+        class_limiter = self.classes[route_class]
+        if not await class_limiter.acquire(priority):
+            raise ServiceOverloaded(route_class)
+        try:
+            if not await self.overall.acquire(priority):
+                raise ServiceOverloaded(route_class)
+            try:
+                yield
+            finally:
+                self.overall.release()
+        finally:
+            class_limiter.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.ADMISSION_ENABLED,
+            "overall": self.overall.stats(),
+            "classes": {name: limiter.stats() for name, limiter in self.classes.items()},
+        }
+
+
+def classify(request: Request) -> str:
+    """
+    Route class of a request: the `_route_class` set on its endpoint by the
+    rate limit tier decorators, otherwise read for safe methods and write
+    for everything else.
+    """
+    route_class = getattr(request.scope.get("endpoint"), "_route_class", None)
+    if route_class in ROUTE_CLASSES:
+        return route_class
+    return "read" if request.method in ("GET", "HEAD", "OPTIONS") else "write"
+
+
+def request_priority(request: Request, route_class: str) -> int:
+    """
+    Queue priority. Only the presence of a bearer token is checked: it is
+    verified later, and a forged header buys queue position, not access.
+    """
+    authorization = request.headers.get("authorization", "")
+    authenticated = authorization.lower().startswith("bearer ")
+    return _CLASS_PRIORITY[route_class] + (0 if authenticated else _ANONYMOUS_PENALTY)
+
+
+# Global instance
+admission_controller = AdmissionController()
+
+
+async def admit_request(request: Request):
+    """
+    App-wide dependency, registered ahead of the rate limit check: bound
+    in-flight work per route class so that when the database slows down,
+    excess requests fail fast with 503 instead of all of them timing out
+    together. The slot is held until the response has been produced.
+    """
+    if request.url.path in EXEMPT_PATHS:
+        yield
+        return
+    route_class = classify(request)
+    async with admission_controller.slot(route_class, request_priority(request, route_class)):
+        yield
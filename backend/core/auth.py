@@ -1,7 +1,11 @@
+import hashlib
+import time
 import jwt
 from typing import Optional
+from core.cache import TTLCache, _MISSING
 from core.config import settings
 from core.logging_config import get_logger
+from core.context import RequestContext, get_request_context
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import httpx
@@ -11,7 +15,7 @@ from clerk_backend_api.security.types import AuthenticateRequestOptions
 logger = get_logger("core.auth")
 
 _clerk = Clerk(bearer_auth=settings.CLERK_SECRET_KEY)
-_security = HTTPBearer(auto_error=False)
+bearer_scheme = HTTPBearer(auto_error=False)
 
 class AuthenticationError(HTTPException):
     def __init__(self, detail: str = "Authentication failed"):
@@ -55,19 +59,83 @@ async def verify_clerk_token(token: str) -> dict:
         }
 
     except Exception as e:
-        logger.error(f"Clerk authentication error: {e}")
+        logger.error("Clerk authentication error: %s", e)
         raise AuthenticationError("Invalid or expired token")
 
 
+class IdentityCache:
+    """
+    Short-lived map of verified tokens to identities, so a client sending the
+    same session token on every request is verified with Clerk once per TTL
+    instead of once per request. Entries never outlive the token's `exp`.
+    Keys are token digests; raw tokens are not kept in memory.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.ttl = ttl
+        self._entries = TTLCache(max_entries, ttl)
+
+    def peek(self, token: str) -> Optional[dict]:
+        """The identity of an already verified token, without calling Clerk."""
+        if self.ttl <= 0:
+            return None
+        identity = self._entries.get(self._key(token))
+        return None if identity is _MISSING else identity
+
+    async def get_or_verify(self, token: str) -> dict:
+        if self.ttl <= 0:
+            return await verify_clerk_token(token)
+
+        key = self._key(token)
+        identity = self._entries.get(key)
+        if identity is not _MISSING:
+            return identity
+
+        identity = await verify_clerk_token(token)
+        ttl = self.ttl
+        try:
+            expires = jwt.decode(token, options={"verify_signature": False}).get("exp")
+        except Exception:
+            expires = None
+        if expires:
+            ttl = min(ttl, expires - time.time())
+        if ttl > 0:
+            self._entries.set(key, identity, ttl=ttl)
+        return identity
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def stats(self):
+        return self._entries.stats()
+
+
+identity_cache = IdentityCache(
+    max_entries=settings.AUTH_IDENTITY_CACHE_MAX_ENTRIES,
+    ttl=settings.AUTH_IDENTITY_CACHE_TTL_SECONDS
+)
+
+
+async def resolve_identity(token: str, context: RequestContext) -> dict:
+    """
+    Verify a bearer token at most once per request. The route's auth
+    dependency and track_causal_reads both go through here and share the
+    result, a failed verification included.
+    """
+    return await context.memoize(("identity", token), lambda: identity_cache.get_or_verify(token))
+
+
 async def get_current_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_security)
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+    context: RequestContext = Depends(get_request_context)
 ) -> dict:
 
     if not credentials or not credentials.credentials:
         raise AuthenticationError("Missing or invalid token")
 
-    user_data = await verify_clerk_token(credentials.credentials)
-    logger.info(f"Auth Debug - Current user from token: {user_data}")
+    user_data = await resolve_identity(credentials.credentials, context)
+    logger.debug("Authenticated user %s", user_data["user_id"])
     return user_data
 
 
@@ -0,0 +1,700 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import secrets
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, AsyncContextManager, Awaitable, Callable, Dict, Iterable, Optional, Protocol, Set, Tuple, Type
+from fastapi import Response
+from pydantic import BaseModel
+from core.config import settings
+from core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_MISSING = object()
+
+
+class CacheBackend(Protocol):
+    """
+    Shared second-level store (e.g. one reachable by every worker).
+
+    Values are JSON strings so any key/value server can hold them; tags are
+    passed along so the store can drop every key carrying a tag at once.
+    """
+
+    async def get(self, key: str) -> Optional[str]: ...
+
+    async def set(self, key: str, value: str, ttl: float, tags: Iterable[str]): ...
+
+    async def invalidate_tags(self, tags: Iterable[str]): ...
+
+
+class TTLCache:
+    """In-process LRU cache with per-entry expiry and tag-based invalidation."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Any:
+        """Return the cached value, or _MISSING if absent or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return _MISSING
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, tags: Iterable[str] = (), ttl: Optional[float] = None):
+        if key in self._entries:
+            self._remove(key)
+        tags = tuple(tags)
+        self._entries[key] = (time.monotonic() + (ttl or self.ttl), value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate_tags(self, tags: Iterable[str]):
+        for tag in tags:
+            for key in self._tags.pop(tag, ()):
+                if key in self._entries:
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def invalidate_key(self, key: str):
+        if key in self._entries:
+            self._remove(key)
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._tags.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _remove(self, key: str):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class EntityCache:
+    """
+    Read-through cache for single documents returned by CRUD methods.
+
+    Lookups hit the in-process TTLCache first and, when configured, a shared
+    CacheBackend second. Writers call invalidate() with the tags of whatever
+    they changed.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, enabled: bool = True):
+        self.local = TTLCache(max_entries, ttl)
+        self.backend: Optional[CacheBackend] = None
+        self.enabled = enabled
+        # Bumped on every invalidation so a read that raced a write is not stored
+        self._generation = 0
+
+    def set_backend(self, backend: Optional[CacheBackend]):
+        self.backend = backend
+
+    def cached(
+        self,
+        namespace: str,
+        model: Type[BaseModel],
+        tags: Callable[[Any], Iterable[str]]
+    ):
+        """
+        Decorate an async CRUD method whose arguments identify the document.
+        Arguments are bound to the signature, so positional and keyword calls
+        share an entry. None results are not cached.
+        """
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            async def wrapper(crud, *args, **kwargs):
+                if not self.enabled:
+                    return await func(crud, *args, **kwargs)
+
+                arguments = _bind_arguments(signature, (crud, *args), kwargs)
+                key = ":".join([namespace, *(str(value) for _, value in arguments)])
+                value = self.local.get(key)
+                if value is not _MISSING:
+                    return value
+
+                if self.backend is not None:
+                    try:
+                        raw = await self.backend.get(key)
+                    except Exception as e:
+                        logger.warning("Shared cache read failed for %s: %s", key, e)
+                        raw = None
+                    if raw is not None:
+                        value = model.model_validate_json(raw)
+                        self.local.set(key, value, (namespace_tag(namespace), *tags(value)))
+                        return value
+
+                generation = self._generation
+                value = await func(crud, *args, **kwargs)
+                if value is not None and generation == self._generation:
+                    value_tags = (namespace_tag(namespace), *tags(value))
+                    self.local.set(key, value, value_tags)
+                    if self.backend is not None:
+                        try:
+                            await self.backend.set(key, _dump_json(value), self.local.ttl, value_tags)
+                        except Exception as e:
+                            logger.warning("Shared cache write failed for %s: %s", key, e)
+                return value
+            return wrapper
+        return decorator
+
+    async def invalidate(self, *tags: str):
+        self._generation += 1
+        self.local.invalidate_tags(tags)
+        if self.backend is not None:
+            try:
+                await self.backend.invalidate_tags(tags)
+            except Exception as e:
+                logger.warning("Shared cache invalidation failed for %s: %s", tags, e)
+
+    def clear(self):
+        """Drop every local entry, e.g. when remote writes may have been missed."""
+        self._generation += 1
+        self.local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "shared_backend": type(self.backend).__name__ if self.backend else None,
+            **self.local.stats(),
+        }
+
+
+def _dump_json(value: BaseModel) -> str:
+    """Serialize a model including fields hidden from API responses."""
+    data = value.model_dump(mode="json")
+    for name, field in type(value).model_fields.items():
+        if field.exclude:
+            data[name] = getattr(value, name)
+    return json.dumps(data, default=str)
+
+
+class MemoryCacheBackend:
+    """
+    Process-local CacheBackend. Stands in for a shared store in development
+    and tests, where all workers can be assumed to be one process.
+    """
+
+    def __init__(self, max_entries: int = 100_000):
+        self._cache = TTLCache(max_entries, ttl=settings.CACHE_TTL_SECONDS)
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self._cache.get(key)
+        return None if value is _MISSING else value
+
+    async def set(self, key: str, value: str, ttl: float, tags: Iterable[str]):
+        self._cache.set(key, value, tags, ttl)
+
+    async def invalidate_tags(self, tags: Iterable[str]):
+        self._cache.invalidate_tags(tags)
+
+
+class NegativeCache:
+    """
+    Bounded, short-lived record of IDs known not to exist, so repeated
+    lookups of random IDs are answered without a query.
+
+    Create paths must discard() the ID they insert. A plain LRU set is used
+    rather than a Bloom filter because entries have to be removable.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, enabled: bool = True):
+        self._entries = TTLCache(max_entries, ttl)
+        self.enabled = enabled
+        # Per-namespace counters so a miss that raced a create is not recorded
+        self._generations: Dict[str, int] = {}
+
+    def guard(
+        self,
+        namespace: str,
+        missing: Any = None,
+        normalize: Callable[[str], str] = str
+    ):
+        """
+        Decorate an async lookup taking the ID as its first argument and
+        returning `missing` when the document does not exist.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(crud, document_id, *args, **kwargs):
+                if not self.enabled:
+                    return await func(crud, document_id, *args, **kwargs)
+
+                key = f"{namespace}:{normalize(document_id)}"
+                if self._entries.get(key) is not _MISSING:
+                    return missing
+
+                generation = self._generations.get(namespace, 0)
+                result = await func(crud, document_id, *args, **kwargs)
+                if result is missing and generation == self._generations.get(namespace, 0):
+                    self._entries.set(key, True)
+                return result
+            return wrapper
+        return decorator
+
+    def discard(self, namespace: str, document_id: str):
+        """Forget a negative entry; called whenever the ID is inserted."""
+        self._generations[namespace] = self._generations.get(namespace, 0) + 1
+        self._entries.invalidate_key(f"{namespace}:{document_id}")
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._entries.stats()
+        return {
+            "enabled": self.enabled,
+            "entries": stats["entries"],
+            "hit_ratio": stats["hit_ratio"],
+            "queries_avoided": stats["hits"],
+            "evictions": stats["evictions"],
+        }
+
+
+class CollectionVersions:
+    """
+    Per-collection write versions used to validate cached list responses.
+
+    While the change stream runs (`coherent`), it is the only source: a
+    collection's version is the resume token of its last change, a server
+    value that every worker on the stream agrees on and that a restart does
+    not reset. Collections unchanged since the stream opened share the token
+    it opened at. Without the stream, versions are local write counters
+    (bumped by the command listener) under a random epoch, renewed on every
+    switch between the two modes, so no tag issued by another process or an
+    earlier run can match by accident.
+
+    Each stream version also carries the cluster time it stands for, so a
+    body read from a secondary can be made at least as new as its tag.
+    """
+
+    def __init__(self):
+        self.coherent = False
+        self._counters: Dict[str, int] = {}
+        self._tokens: Dict[str, Tuple[str, Any]] = {}
+        self._baseline: Tuple[str, Any] = ("", None)
+        self._epoch = secrets.token_hex(8)
+
+    def bump(self, collection: str):
+        """A local write completed; the change stream reports it instead while it runs."""
+        if not self.coherent:
+            self._counters[collection] = self._counters.get(collection, 0) + 1
+
+    def follow(self, resume_token: Optional[Dict[str, Any]], cluster_time: Any = None):
+        """The change stream (re)opened at `resume_token`, no earlier than `cluster_time`."""
+        self._tokens = {}
+        self._baseline = (_token_version(resume_token) or secrets.token_hex(8), cluster_time)
+        self.coherent = True
+
+    def observe(self, collection: Optional[str], resume_token: Dict[str, Any], cluster_time: Any = None):
+        """A change event; without a collection (dropDatabase) every collection changed."""
+        if collection is None:
+            self.follow(resume_token, cluster_time)
+        else:
+            self._tokens[collection] = (_token_version(resume_token), cluster_time)
+
+    def unfollow(self):
+        """The change stream stopped; back to local counters under a new epoch."""
+        self.coherent = False
+        self._counters = {}
+        self._epoch = secrets.token_hex(8)
+
+    def get(self, collection: str) -> str:
+        if self.coherent:
+            return self._tokens.get(collection, self._baseline)[0]
+        return f"{self._epoch}.{self._counters.get(collection, 0)}"
+
+    def cluster_time(self, collections: Iterable[str]) -> Any:
+        """
+        Cluster time a read must reach to be as new as the versions of
+        `collections`, or None when unknown (no change stream).
+        """
+        if not self.coherent:
+            return None
+        times = [self._tokens.get(collection, self._baseline)[1] for collection in collections]
+        if not times or any(at is None for at in times):
+            return None
+        return max(times)
+
+
+def _token_version(resume_token: Optional[Dict[str, Any]]) -> str:
+    if not resume_token:
+        return ""
+    return str(resume_token.get("_data", resume_token))
+
+
+_private_reads: ContextVar[bool] = ContextVar("private_reads", default=False)
+
+
+def use_private_reads():
+    """
+    Make the current request run its reads itself instead of sharing
+    coalesced, micro-cached or stale results read on behalf of others.
+    """
+    _private_reads.set(True)
+
+
+# Read state a shared read runs under; db.consistency installs one
+_read_scope: Callable[[], AsyncContextManager[Any]] = nullcontext
+
+
+def register_read_scope(scope: Callable[[], AsyncContextManager[Any]]):
+    """`scope()` is called in the request that starts a shared read and entered in the read's task."""
+    global _read_scope
+    _read_scope = scope
+
+
+def _start_shared(loader: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+    """
+    Run a read whose result several requests share as its own task, in a
+    fresh context like the slow query explains, so it uses none of the
+    starting request's state, which ends when that request returns.
+    """
+    scope = _read_scope()
+
+    async def run():
+        async with scope:
+            return await loader()
+    return asyncio.get_running_loop().create_task(run(), context=contextvars.Context())
+
+
+class RequestCoalescer:
+    """
+    Single-flight for list reads: concurrent calls with the same normalized
+    arguments share one in-flight query and its result. With a window set,
+    completed results are also reused for that many seconds.
+
+    Keys include the write versions of the collections a method reads, so a
+    call made after a local write never joins a query started before it.
+    Shared results go to several callers and must be treated as read-only.
+    """
+
+    def __init__(self, window: float, max_entries: int, enabled: bool = True):
+        self.enabled = enabled
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._recent = TTLCache(max_entries, window) if window > 0 else None
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.window_hits = 0
+
+    def coalesce(self, namespace: str, collections: Tuple[str, ...]):
+        """Decorate an async CRUD read whose result depends only on its arguments."""
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not self.enabled or _private_reads.get():
+                    return await func(*args, **kwargs)
+
+                arguments = _bind_arguments(signature, args, kwargs)
+                versions = tuple(collection_versions.get(c) for c in collections)
+                key = repr((namespace, versions, arguments))
+
+                self.calls += 1
+                if self._recent is not None:
+                    value = self._recent.get(key)
+                    if value is not _MISSING:
+                        self.window_hits += 1
+                        return value
+
+                flight = self._in_flight.get(key)
+                if flight is not None:
+                    self.coalesced += 1
+                else:
+                    self.executions += 1
+                    # Runs as its own task so one caller disconnecting does
+                    # not cancel the query for everybody else
+                    flight = _start_shared(lambda: func(*args, **kwargs))
+                    self._in_flight[key] = flight
+                    flight.add_done_callback(functools.partial(self._finish, key))
+                return await asyncio.shield(flight)
+            return wrapper
+        return decorator
+
+    def _finish(self, key: str, flight: asyncio.Future):
+        if self._in_flight.get(key) is flight:
+            del self._in_flight[key]
+        # exception() also marks a failure as retrieved if every caller left
+        if flight.cancelled() or flight.exception() is not None:
+            return
+        if self._recent is not None:
+            self._recent.set(key, flight.result())
+
+    def stats(self) -> Dict[str, Any]:
+        shared = self.coalesced + self.window_hits
+        return {
+            "enabled": self.enabled,
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "window_hits": self.window_hits,
+            "in_flight": len(self._in_flight),
+            "coalescing_ratio": round(shared / self.calls, 4) if self.calls else 0.0,
+        }
+
+
+_stale_response: ContextVar[Optional[Response]] = ContextVar("stale_response", default=None)
+
+
+async def allow_stale(response: Response):
+    """
+    Route dependency: lets stale_cache annotate this response with Age and
+    Warning when it serves a stale value.
+    """
+    _stale_response.set(response)
+
+
+def _mark_stale(age: float, warning: str):
+    response = _stale_response.get()
+    if response is None:
+        return
+    response.headers["Age"] = str(int(age))
+    response.headers["Warning"] = warning
+    # The list ETag describes the current collection state, not this body
+    if "etag" in response.headers:
+        del response.headers["etag"]
+
+
+class StaleWhileRevalidate:
+    """
+    Serving mode for hot list reads where slightly old data beats a timeout.
+
+    Entries younger than `soft_ttl` are served as-is. Older ones, up to
+    `hard_ttl`, are served stale while one background refresh runs. After a
+    write to a collection the method reads, the entry is refreshed inline,
+    but if that takes longer than `latency_budget` seconds or fails, the
+    last good value is served with a Warning header instead.
+    """
+
+    def __init__(
+        self,
+        soft_ttl: float,
+        hard_ttl: float,
+        latency_budget: float,
+        max_entries: int,
+        enabled: bool = True
+    ):
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.latency_budget = latency_budget
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Tuple[float, Any, Tuple[str, ...]]]" = OrderedDict()
+        self._refreshing: Dict[Tuple[str, Tuple[str, ...]], asyncio.Future] = {}
+        self.fresh_hits = 0
+        self.stale_served = 0
+        self.fallbacks = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def serve_stale(
+        self,
+        namespace: str,
+        collections: Tuple[str, ...],
+        when: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ):
+        """
+        Decorate an async CRUD read. `when` receives the bound arguments and
+        limits the mode to some calls, e.g. unfiltered pages.
+        """
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not self.enabled or _private_reads.get():
+                    return await func(*args, **kwargs)
+                arguments = _bind_arguments(signature, args, kwargs)
+                if when is not None and not when(dict(arguments)):
+                    return await func(*args, **kwargs)
+
+                key = repr((namespace, arguments))
+                versions = tuple(collection_versions.get(c) for c in collections)
+                return await self._get(key, versions, lambda: func(*args, **kwargs))
+            return wrapper
+        return decorator
+
+    async def _get(self, key: str, versions: Tuple[str, ...], loader: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        age = 0.0
+        if entry is not None:
+            stored_at, value, entry_versions = entry
+            age = time.monotonic() - stored_at
+            if age >= self.hard_ttl:
+                del self._entries[key]
+                entry = None
+
+        if entry is not None and entry_versions == versions:
+            self._entries.move_to_end(key)
+            if age < self.soft_ttl:
+                self.fresh_hits += 1
+                return value
+            self._refresh(key, versions, loader)
+            self.stale_served += 1
+            _mark_stale(age, '110 - "Response is Stale"')
+            return value
+
+        refresh = self._refresh(key, versions, loader)
+        if entry is None:
+            return await asyncio.shield(refresh)
+        try:
+            return await asyncio.wait_for(asyncio.shield(refresh), self.latency_budget)
+        except asyncio.TimeoutError:
+            warning = '110 - "Response is Stale"'
+        except Exception:
+            warning = '111 - "Revalidation Failed"'
+        self.fallbacks += 1
+        _mark_stale(age, warning)
+        return value
+
+    def _refresh(self, key: str, versions: Tuple[str, ...], loader: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Start (or join) the one refresh for this key and collection state."""
+        flight = self._refreshing.get((key, versions))
+        if flight is None:
+            self.refreshes += 1
+            flight = _start_shared(lambda: self._load(key, versions, loader))
+            self._refreshing[(key, versions)] = flight
+            flight.add_done_callback(functools.partial(self._refresh_done, (key, versions)))
+        return flight
+
+    def _refresh_done(self, flight_key: Tuple[str, Tuple[str, ...]], flight: asyncio.Future):
+        self._refreshing.pop(flight_key, None)
+        # Background refreshes may have no awaiter; mark failures retrieved
+        if not flight.cancelled():
+            flight.exception()
+
+    async def _load(self, key: str, versions: Tuple[str, ...], loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.warning("Refresh of %s failed: %s", key, e)
+            raise
+        self._entries[key] = (time.monotonic(), value, versions)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "fresh_hits": self.fresh_hits,
+            "stale_served": self.stale_served,
+            "fallbacks": self.fallbacks,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+        }
+
+
+def _bind_arguments(signature: inspect.Signature, args: tuple, kwargs: dict) -> Tuple[Tuple[str, Any], ...]:
+    """Normalized (name, value) pairs of a method call, defaults applied, self dropped."""
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    return tuple(
+        (name, _normalize_argument(value))
+        for name, value in list(bound.arguments.items())[1:]
+    )
+
+
+def _normalize_argument(value: Any) -> Any:
+    """Order-insensitive form of filter arguments: tag lists are sets to Mongo."""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted({_normalize_argument(v) for v in value}, key=repr))
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalize_argument(v)) for k, v in value.items()))
+    return value
+
+
+def object_id_key(document_id: str) -> str:
+    """Canonical form of an ObjectId string, so case variants share an entry."""
+    return document_id.lower()
+
+
+def namespace_tag(namespace: str) -> str:
+    return f"ns:{namespace}"
+
+
+def user_tag(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def project_tag(project_id: str) -> str:
+    return f"project:{project_id}"
+
+
+# Global instance
+entity_cache = EntityCache(
+    max_entries=settings.CACHE_MAX_ENTRIES,
+    ttl=settings.CACHE_TTL_SECONDS,
+    enabled=settings.CACHE_ENABLED
+)
+collection_versions = CollectionVersions()
+
+negative_cache = NegativeCache(
+    max_entries=settings.NEGATIVE_CACHE_MAX_ENTRIES,
+    ttl=settings.NEGATIVE_CACHE_TTL_SECONDS,
+    enabled=settings.NEGATIVE_CACHE_ENABLED
+)
+
+request_coalescer = RequestCoalescer(
+    window=settings.COALESCE_WINDOW_SECONDS,
+    max_entries=settings.COALESCE_MAX_ENTRIES,
+    enabled=settings.COALESCE_ENABLED
+)
+
+stale_cache = StaleWhileRevalidate(
+    soft_ttl=settings.STALE_SOFT_TTL_SECONDS,
+    hard_ttl=settings.STALE_HARD_TTL_SECONDS,
+    latency_budget=settings.STALE_LATENCY_BUDGET_SECONDS,
+    max_entries=settings.STALE_MAX_ENTRIES,
+    enabled=settings.STALE_CACHE_ENABLED
+)
+
+if settings.CACHE_SHARED_BACKEND == "memory":
+    entity_cache.set_backend(MemoryCacheBackend())
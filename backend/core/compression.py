@@ -0,0 +1,215 @@
+import asyncio
+import gzip
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from core.config import settings
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+# Larger chunked bodies are treated as streams and never buffered whole
+MAX_BUFFERED_SIZE = 4 * 1024 * 1024
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if encoding == "br":
+        return brotli.compress(data, quality=4)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _supported_encodings() -> List[str]:
+    """Server preference order: cheapest to compress first at similar ratios."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str, supported: List[str]) -> Optional[str]:
+    """Pick the supported coding with the highest client q-value."""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+
+    best, best_q = None, 0.0
+    for coding in supported:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressedVariants:
+    """LRU of compressed bodies keyed by request target, ETag and coding, plus counters."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._variants: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+        self.compressed = 0
+        self.variant_hits = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[bytes]:
+        body = self._variants.get(key)
+        if body is not None:
+            self._variants.move_to_end(key)
+            self.variant_hits += 1
+        return body
+
+    def put(self, key: Tuple[str, str, str], body: bytes):
+        self._variants[key] = body
+        while len(self._variants) > self.max_entries:
+            self._variants.popitem(last=False)
+
+    def record(self, original: int, compressed: int):
+        self.compressed += 1
+        self.bytes_in += original
+        self.bytes_out += compressed
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._variants),
+            "compressed": self.compressed,
+            "variant_hits": self.variant_hits,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+
+compressed_variants = CompressedVariants(settings.COMPRESSION_CACHE_ENTRIES)
+
+
+class CompressionMiddleware:
+    """
+    Negotiated gzip/brotli/zstd compression for complete (non-streaming)
+    responses above a size threshold.
+
+    Bodies larger than COMPRESSION_OFFLOAD_SIZE are compressed in a worker
+    thread so the event loop keeps serving. Responses carrying an ETag are
+    cacheable representations; their compressed variants are kept in an LRU
+    keyed by path, ETag and coding so repeat clients are not recompressed.
+    Every compressible response carries Vary: Accept-Encoding, including
+    those sent as they are (too small, or the client accepts no coding).
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = settings.COMPRESSION_MINIMUM_SIZE,
+        offload_size: int = settings.COMPRESSION_OFFLOAD_SIZE
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.supported = _supported_encodings()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.supported)
+        start_message: Optional[Message] = None
+        chunks: List[bytes] = []
+        buffered = 0
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message, buffered, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = MutableHeaders(raw=message["headers"])
+                if "content-encoding" in headers:
+                    passthrough = True
+                elif headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES) or message["status"] == 304:
+                    # Compressed or not, this representation depends on
+                    # Accept-Encoding; shared caches must key on it
+                    headers.add_vary_header("Accept-Encoding")
+                    passthrough = encoding is None or message["status"] == 304
+                else:
+                    passthrough = True
+                if passthrough:
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            # Bodies can arrive in several chunks (e.g. through BaseHTTPMiddleware)
+            chunks.append(message.get("body", b""))
+            buffered += len(chunks[-1])
+            more_body = message.get("more_body", False)
+            if more_body and buffered <= MAX_BUFFERED_SIZE:
+                return
+
+            body = b"".join(chunks)
+            chunks.clear()
+            if more_body or len(body) < self.minimum_size:
+                # A genuine stream, or not worth compressing: forward untouched
+                passthrough = True
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            target = scope["path"] + "?" + scope.get("query_string", b"").decode("latin-1")
+            compressed = await self._compressed_body(target, headers.get("etag"), body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # The encoded bytes differ from the identity representation
+                headers["ETag"] = f"W/{etag}"
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _compressed_body(self, target: str, etag: Optional[str], body: bytes, encoding: str) -> bytes:
+        key = (target, etag, encoding) if etag else None
+        if key is not None:
+            cached = compressed_variants.get(key)
+            if cached is not None:
+                return cached
+
+        if len(body) >= self.offload_size:
+            compressed = await asyncio.to_thread(_compress, body, encoding)
+        else:
+            compressed = _compress(body, encoding)
+
+        compressed_variants.record(len(body), len(compressed))
+        if key is not None:
+            compressed_variants.put(key, compressed)
+        return compressed
@@ -0,0 +1,109 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional
+from fastapi import HTTPException, Request, Response, status
+from core.cache import collection_versions
+from core.config import settings
+from db.consistency import current_read_state
+
+
+def entity_etag(entity: Any) -> str:
+    """Strong ETag from a document's id, last write time and write version."""
+    document_id = getattr(entity, "id", None) or getattr(entity, "user_id", None)
+    modified = getattr(entity, "updated_at", None) or getattr(entity, "created_at", None)
+    version = getattr(entity, "version", 0)
+    digest = hashlib.sha1(f"{document_id}:{modified}:{version}".encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def last_modified(entity: Any) -> Optional[datetime]:
+    modified = getattr(entity, "updated_at", None) or getattr(entity, "created_at", None)
+    if modified is None:
+        return None
+    if modified.tzinfo is None:
+        modified = modified.replace(tzinfo=timezone.utc)
+    return modified.replace(microsecond=0)
+
+
+def list_etag(request: Request, collections: tuple, max_age: Optional[int] = None) -> str:
+    """
+    Weak ETag for a list response, derived from the path, the normalized
+    query and the write versions of every collection the response reads.
+
+    When remote writes cannot be observed (no change stream) or the result
+    also depends on the clock, the tag additionally rotates every `max_age`
+    seconds so clients never revalidate against it for longer than that.
+    """
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    versions = ",".join(f"{c}:{collection_versions.get(c)}" for c in collections)
+    parts = [request.url.path, query, versions]
+    if max_age is None and not collection_versions.coherent:
+        max_age = settings.CACHE_TTL_SECONDS
+    if max_age:
+        parts.append(str(int(time.time() // max_age)))
+    digest = hashlib.sha1("|".join(parts).encode()).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def is_not_modified(request: Request, etag: str, modified: Optional[datetime] = None) -> bool:
+    """Evaluate If-None-Match (weak comparison), then If-Modified-Since."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag.removeprefix("W/") in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return modified <= since
+    return False
+
+
+def _validator_headers(etag: str, modified: Optional[datetime]) -> dict:
+    headers = {"ETag": etag}
+    if modified is not None:
+        headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+    return headers
+
+
+def check_entity(request: Request, response: Response, entity: Any):
+    """
+    Answer 304 for a detail response the client already holds, before any
+    serialization happens; otherwise attach ETag and Last-Modified.
+    """
+    etag = entity_etag(entity)
+    modified = last_modified(entity)
+    headers = _validator_headers(etag, modified)
+    if is_not_modified(request, etag, modified):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
+
+def conditional_list(*collections: str, max_age: Optional[int] = None):
+    """
+    Route dependency for list endpoints: a matching If-None-Match is answered
+    with 304 before the handler runs, so the database is not read at all.
+
+    Otherwise the body goes out under the tag (and into the compressed
+    variant cache), so it must be at least as new as the versions the tag
+    names: secondary reads wait for their cluster time, or go to the
+    primary when the versions carry none (no change stream).
+    """
+    async def dependency(request: Request, response: Response):
+        etag = list_etag(request, collections, max_age)
+        if is_not_modified(request, etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        state = current_read_state()
+        if state is not None:
+            state.read_after(collection_versions.cluster_time(collections))
+        response.headers["ETag"] = etag
+    return dependency
@@ -5,10 +5,43 @@ class Settings(BaseSettings):
     # Database
     MONGODB_URL: str = Field(..., env="MONGODB_URL")
     DATABASE_NAME: str = Field(..., env="DATABASE_NAME")
+    # Driver pool and wire options; these take precedence over options in MONGODB_URL
+    MONGODB_MAX_POOL_SIZE: int = Field(default=100, env="MONGODB_MAX_POOL_SIZE")  # per server
+    MONGODB_MIN_POOL_SIZE: int = Field(default=10, env="MONGODB_MIN_POOL_SIZE")  # opened at startup
+    MONGODB_MAX_IDLE_TIME_MS: int = Field(default=300000, env="MONGODB_MAX_IDLE_TIME_MS")
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = Field(default=5000, env="MONGODB_WAIT_QUEUE_TIMEOUT_MS")
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = Field(default=5000, env="MONGODB_SERVER_SELECTION_TIMEOUT_MS")
+    MONGODB_CONNECT_TIMEOUT_MS: int = Field(default=10000, env="MONGODB_CONNECT_TIMEOUT_MS")
+    MONGODB_COMPRESSORS: str = Field(default="", env="MONGODB_COMPRESSORS")  # e.g. zstd,snappy,zlib; empty disables
+    SECONDARY_READS_ENABLED: bool = Field(default=True, env="SECONDARY_READS_ENABLED")  # lists and searches prefer secondaries
+    SECONDARY_MAX_STALENESS_SECONDS: int = Field(default=90, env="SECONDARY_MAX_STALENESS_SECONDS")  # server minimum is 90
+    READ_YOUR_WRITES_WINDOW_SECONDS: int = Field(default=120, env="READ_YOUR_WRITES_WINDOW_SECONDS")
+    READ_YOUR_WRITES_MAX_USERS: int = Field(default=10000, env="READ_YOUR_WRITES_MAX_USERS")
+    INDEX_AUTO_APPLY: bool = Field(default=True, env="INDEX_AUTO_APPLY")  # otherwise only `python -m db.indexes apply`
+    INDEX_BUILD_DELAY_SECONDS: float = Field(default=5.0, env="INDEX_BUILD_DELAY_SECONDS")
+    INDEX_BUILD_LEASE_SECONDS: int = Field(default=600, env="INDEX_BUILD_LEASE_SECONDS")
+    INDEX_DROP_UNUSED: bool = Field(default=False, env="INDEX_DROP_UNUSED")
+    INDEX_UNUSED_AFTER_DAYS: int = Field(default=14, env="INDEX_UNUSED_AFTER_DAYS")
+    MIGRATION_AUTO_RUN: bool = Field(default=True, env="MIGRATION_AUTO_RUN")  # otherwise only `python -m db.migrations run`
+    MIGRATION_BATCH_SIZE: int = Field(default=500, env="MIGRATION_BATCH_SIZE")
+    MIGRATION_PAUSE_MS: int = Field(default=50, env="MIGRATION_PAUSE_MS")  # between batches, to leave room for live traffic
+    MIGRATION_LEASE_SECONDS: int = Field(default=300, env="MIGRATION_LEASE_SECONDS")  # renewed after every batch
+    JOB_WORKERS: int = Field(default=2, env="JOB_WORKERS")  # concurrent background jobs per process
+    JOB_POLL_INTERVAL_SECONDS: float = Field(default=2.0, env="JOB_POLL_INTERVAL_SECONDS")  # jobs queued by this process start at once
+    JOB_LEASE_SECONDS: int = Field(default=60, env="JOB_LEASE_SECONDS")  # a dead worker's job is retried after this
+    JOB_MAX_ATTEMPTS: int = Field(default=5, env="JOB_MAX_ATTEMPTS")
+    JOB_BACKOFF_BASE_SECONDS: float = Field(default=5.0, env="JOB_BACKOFF_BASE_SECONDS")  # doubled per failed attempt
+    JOB_BACKOFF_MAX_SECONDS: float = Field(default=600.0, env="JOB_BACKOFF_MAX_SECONDS")
+    JOB_BATCH_SIZE: int = Field(default=500, env="JOB_BATCH_SIZE")
+    JOB_BATCH_PAUSE_MS: int = Field(default=20, env="JOB_BATCH_PAUSE_MS")
+    JOB_RETENTION_DAYS: int = Field(default=7, env="JOB_RETENTION_DAYS")  # finished jobs are then removed (TTL index)
+    ACCOUNT_DELETE_TRANSACTION: bool = Field(default=False, env="ACCOUNT_DELETE_TRANSACTION")  # one transaction where supported, else batches
     
     # Clerk Auth
     CLERK_SECRET_KEY: str = Field(..., env="CLERK_SECRET_KEY")
     CLERK_PUBLISHABLE_KEY: str = Field(..., env="CLERK_PUBLISHABLE_KEY")
+    AUTH_IDENTITY_CACHE_TTL_SECONDS: int = Field(default=60, env="AUTH_IDENTITY_CACHE_TTL_SECONDS")  # 0 disables
+    AUTH_IDENTITY_CACHE_MAX_ENTRIES: int = Field(default=10000, env="AUTH_IDENTITY_CACHE_MAX_ENTRIES")
     
     # API
     API_V1_STR: str = "/api/v1"
@@ -26,10 +59,74 @@ class Settings(BaseSettings):
     DEBUG: bool = Field(default=True, env="DEBUG")
     
     LOG_LEVEL: str = Field(default="INFO", env="LOG_LEVEL")
+    LOG_FORMAT: str = Field(default="json", env="LOG_FORMAT")  # json or text
+    LOG_QUEUE_SIZE: int = Field(default=10000, env="LOG_QUEUE_SIZE")
+    LOG_SAMPLING: str = Field(default="", env="LOG_SAMPLING")  # logger=rate,... for records below WARNING
+    METRICS_ENABLED: bool = Field(default=True, env="METRICS_ENABLED")
+    DB_STATS_HEADERS: bool = Field(default=False, env="DB_STATS_HEADERS")
+    DB_COMMAND_BUDGET: int = Field(default=10, env="DB_COMMAND_BUDGET")  # per request; 0 disables the warning
+    SLOW_QUERY_THRESHOLD_MS: float = Field(default=100.0, env="SLOW_QUERY_THRESHOLD_MS")
+    SLOW_QUERY_MAX_SHAPES: int = Field(default=200, env="SLOW_QUERY_MAX_SHAPES")
+    SLOW_QUERY_EXPLAIN: bool = Field(default=True, env="SLOW_QUERY_EXPLAIN")
+    LOOP_MONITOR_ENABLED: bool = Field(default=True, env="LOOP_MONITOR_ENABLED")
+    LOOP_MONITOR_INTERVAL_MS: int = Field(default=100, env="LOOP_MONITOR_INTERVAL_MS")
+    LOOP_LAG_THRESHOLD_MS: int = Field(default=250, env="LOOP_LAG_THRESHOLD_MS")
+    LOOP_STALL_LOG_INTERVAL_SECONDS: float = Field(default=30.0, env="LOOP_STALL_LOG_INTERVAL_SECONDS")
+    PROFILING_ENABLED: bool = Field(default=False, env="PROFILING_ENABLED")
+    PROFILING_SAMPLE_PERCENT: float = Field(default=0.0, env="PROFILING_SAMPLE_PERCENT")  # of all requests; admins can also send X-Profile
+    PROFILING_INTERVAL_MS: float = Field(default=5.0, env="PROFILING_INTERVAL_MS")
+    PROFILING_MAX_PER_ROUTE: int = Field(default=10, env="PROFILING_MAX_PER_ROUTE")
+    TRACING_ENABLED: bool = Field(default=False, env="TRACING_ENABLED")
+    TRACING_SAMPLE_RATE: float = Field(default=0.01, env="TRACING_SAMPLE_RATE")  # fraction of requests traced
+    TRACING_EXPORTER: str = Field(default="file", env="TRACING_EXPORTER")  # file or zipkin
+    TRACING_FILE: str = Field(default="traces.jsonl", env="TRACING_FILE")
+    TRACING_FILE_MAX_BYTES: int = Field(default=10 * 1024 * 1024, env="TRACING_FILE_MAX_BYTES")
+    TRACING_FILE_BACKUPS: int = Field(default=5, env="TRACING_FILE_BACKUPS")
+    TRACING_ENDPOINT: str = Field(default="http://localhost:9411/api/v2/spans", env="TRACING_ENDPOINT")
+    
+    # Admin
+    ADMIN_USER_IDS: str = Field(default="", env="ADMIN_USER_IDS")  # comma-separated Clerk user IDs
     
     # Rate Limiting
-    RATE_LIMIT_REQUESTS: int = Field(default=100, env="RATE_LIMIT_REQUESTS")
+    RATE_LIMIT_REQUESTS: int = Field(default=100, env="RATE_LIMIT_REQUESTS")  # cost units; a standard request costs 1
     RATE_LIMIT_WINDOW: int = Field(default=60, env="RATE_LIMIT_WINDOW")  # seconds
+    RATE_LIMIT_BACKEND: str = Field(default="memory", env="RATE_LIMIT_BACKEND")  # memory, mongo
+    RATE_LIMIT_MAX_KEYS: int = Field(default=100000, env="RATE_LIMIT_MAX_KEYS")  # memory backend only
+    
+    # Admission control
+    ADMISSION_ENABLED: bool = Field(default=True, env="ADMISSION_ENABLED")
+    ADMISSION_MAX_IN_FLIGHT: int = Field(default=200, env="ADMISSION_MAX_IN_FLIGHT")  # all classes together
+    ADMISSION_SEARCH_CONCURRENCY: int = Field(default=20, env="ADMISSION_SEARCH_CONCURRENCY")
+    ADMISSION_WRITE_CONCURRENCY: int = Field(default=50, env="ADMISSION_WRITE_CONCURRENCY")
+    ADMISSION_READ_CONCURRENCY: int = Field(default=100, env="ADMISSION_READ_CONCURRENCY")
+    ADMISSION_AUTH_CONCURRENCY: int = Field(default=20, env="ADMISSION_AUTH_CONCURRENCY")
+    ADMISSION_QUEUE_SIZE: int = Field(default=50, env="ADMISSION_QUEUE_SIZE")  # waiters per class
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = Field(default=2.0, env="ADMISSION_QUEUE_TIMEOUT_SECONDS")
+    ADMISSION_RETRY_AFTER_SECONDS: int = Field(default=2, env="ADMISSION_RETRY_AFTER_SECONDS")
+    
+    # Caching
+    CACHE_ENABLED: bool = Field(default=True, env="CACHE_ENABLED")
+    CACHE_TTL_SECONDS: int = Field(default=60, env="CACHE_TTL_SECONDS")
+    CACHE_MAX_ENTRIES: int = Field(default=10000, env="CACHE_MAX_ENTRIES")
+    CACHE_SHARED_BACKEND: str = Field(default="", env="CACHE_SHARED_BACKEND")  # "", memory
+    CACHE_CHANGE_STREAM_ENABLED: bool = Field(default=True, env="CACHE_CHANGE_STREAM_ENABLED")
+    NEGATIVE_CACHE_ENABLED: bool = Field(default=True, env="NEGATIVE_CACHE_ENABLED")
+    NEGATIVE_CACHE_TTL_SECONDS: int = Field(default=30, env="NEGATIVE_CACHE_TTL_SECONDS")
+    NEGATIVE_CACHE_MAX_ENTRIES: int = Field(default=50000, env="NEGATIVE_CACHE_MAX_ENTRIES")
+    COALESCE_ENABLED: bool = Field(default=True, env="COALESCE_ENABLED")
+    COALESCE_WINDOW_SECONDS: float = Field(default=0.0, env="COALESCE_WINDOW_SECONDS")  # 0 = in-flight sharing only
+    COALESCE_MAX_ENTRIES: int = Field(default=1000, env="COALESCE_MAX_ENTRIES")
+    STALE_CACHE_ENABLED: bool = Field(default=True, env="STALE_CACHE_ENABLED")
+    STALE_SOFT_TTL_SECONDS: float = Field(default=30.0, env="STALE_SOFT_TTL_SECONDS")
+    STALE_HARD_TTL_SECONDS: float = Field(default=600.0, env="STALE_HARD_TTL_SECONDS")
+    STALE_LATENCY_BUDGET_SECONDS: float = Field(default=0.5, env="STALE_LATENCY_BUDGET_SECONDS")
+    STALE_MAX_ENTRIES: int = Field(default=500, env="STALE_MAX_ENTRIES")
+    
+    # Compression
+    COMPRESSION_ENABLED: bool = Field(default=True, env="COMPRESSION_ENABLED")
+    COMPRESSION_MINIMUM_SIZE: int = Field(default=1024, env="COMPRESSION_MINIMUM_SIZE")  # bytes
+    COMPRESSION_OFFLOAD_SIZE: int = Field(default=65536, env="COMPRESSION_OFFLOAD_SIZE")  # bytes
+    COMPRESSION_CACHE_ENTRIES: int = Field(default=1024, env="COMPRESSION_CACHE_ENTRIES")
     
     @property
     def is_development(self) -> bool:
@@ -39,6 +136,10 @@ class Settings(BaseSettings):
     def is_production(self) -> bool:
         return self.ENVIRONMENT.lower() in ["production", "prod"]
     
+    @property
+    def admin_user_ids(self) -> set:
+        return {user_id.strip() for user_id in self.ADMIN_USER_IDS.split(",") if user_id.strip()}
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
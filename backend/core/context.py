@@ -0,0 +1,50 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from fastapi import Request
+
+
+class RequestContext:
+    """
+    Per-request memo for identity and profile lookups.
+
+    Each key is resolved at most once per request; concurrent callers for the
+    same key await the same in-flight lookup. Failures are memoized as well so
+    a lookup that raised is not retried within the same request.
+    """
+
+    def __init__(self):
+        self._results: Dict[Hashable, asyncio.Future] = {}
+
+    async def memoize(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._results.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._results[key] = future
+        try:
+            result = await loader()
+        except asyncio.CancelledError:
+            self._results.pop(key, None)
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved here so an unawaited failure is not reported at GC time
+            future.exception()
+            raise
+        future.set_result(result)
+        return result
+
+    def forget(self, key: Hashable):
+        """Drop a memoized value, e.g. after the request itself changed it."""
+        self._results.pop(key, None)
+
+
+async def get_request_context(request: Request) -> RequestContext:
+    """FastAPI dependency returning the context bound to the current request."""
+    context = getattr(request.state, "context", None)
+    if context is None:
+        context = RequestContext()
+        request.state.context = context
+    return context
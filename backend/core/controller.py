@@ -1,6 +1,7 @@
 from typing import Dict, Any, List, Optional, TypeVar, Type
 from core.utils import convert_objectid_to_str, paginate_query
 from core.logging_config import get_logger
+from core.tracing import traced
 
 logger = get_logger(__name__)
 
@@ -18,32 +19,38 @@ def process_document(document: dict) -> dict:
         doc["id"] = doc.pop("_id")
     return doc
 
+@traced()
 def process_documents(documents: List[dict]) -> List[dict]:
     """Process multiple documents using the standard process_document function."""
     return [process_document(doc) for doc in documents]
 
+@traced()
 def to_model(model_cls: Type[T], document: dict) -> Optional[T]:
     """Convert a single MongoDB document to a model instance."""
     if not document:
         return None
     return model_cls(**process_document(document))
 
+@traced()
 def to_model_list(model_cls: Type[T], documents: List[dict]) -> List[T]:
     """Convert a list of MongoDB documents to model instances."""
     return [model_cls(**process_document(doc)) for doc in documents]
 
+@traced()
 async def fetch_documents(cursor, pagination: Dict[str, Any]) -> List[dict]:
     """
     Standard function to fetch paginated documents from a MongoDB cursor.
     """
     return await cursor.skip(pagination["skip"]).limit(pagination["limit"]).to_list(length=None)
 
+@traced()
 async def execute_paginated_query(
     collection,
     query: Dict[str, Any] = None,
     sort_options: Dict[str, int] = None,
     page: int = 1,
-    limit: int = 10
+    limit: int = 10,
+    session=None
 ) -> Dict[str, Any]:
     """
     Standard paginated query execution with processed documents.
@@ -55,14 +62,18 @@ async def execute_paginated_query(
     pagination = paginate_query(page, limit)
     
     # Build cursor with query
-    cursor = collection.find(query)
+    cursor = collection.find(query, session=session)
     
     # Apply sorting if provided
     if sort_options:
         cursor = cursor.sort(list(sort_options.items()))
     
-    # Get total count and documents
-    total = await collection.count_documents(query)
+    # Get total count and documents; an unfiltered count would scan the
+    # whole collection, the collection metadata has the same number
+    if query:
+        total = await collection.count_documents(query, session=session)
+    else:
+        total = await collection.estimated_document_count()
     documents = await fetch_documents(cursor, pagination)
     
     return {
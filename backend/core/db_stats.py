@@ -0,0 +1,118 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator, Optional
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from core.config import settings
+from core.logging_config import get_logger
+from core.metrics import metrics, route_template
+
+logger = get_logger(__name__)
+
+db_budget_exceeded = metrics.counter(
+    "db_command_budget_exceeded", "Requests that issued more Mongo commands than their budget", ("route",)
+)
+
+
+@dataclass
+class RequestDbStats:
+    """Mongo round trips made on behalf of one request (or one tracked block)."""
+    commands: int = 0
+    duration: float = 0.0  # seconds, as measured by the driver
+    documents: int = 0
+
+    def record(self, duration: float, documents: int):
+        self.commands += 1
+        self.duration += duration
+        self.documents += documents
+
+
+_current_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("request_db_stats", default=None)
+
+
+def current_db_stats() -> Optional[RequestDbStats]:
+    """Stats of the request being served, or None outside of one."""
+    return _current_stats.get()
+
+
+@contextmanager
+def track_db_commands() -> Iterator[RequestDbStats]:
+    """
+    Count the commands issued inside the block, e.g. to assert a query
+    budget from a script or test:
+
+        with track_db_commands() as stats:
+            await testimonial_crud.get_all_testimonials()
+        assert stats.commands <= 3
+    """
+    stats = RequestDbStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def db_command_budget(commands: int):
+    """Override DB_COMMAND_BUDGET for one endpoint."""
+    def decorator(func):
+        func._db_command_budget = commands
+        return func
+    return decorator
+
+
+class DbStatsMiddleware:
+    """
+    Scopes a RequestDbStats to each request (filled in by the command
+    listener), warns when a route exceeds its command budget and, with
+    DB_STATS_HEADERS, reports the totals in Server-Timing and X-DB-Commands.
+
+    Work started on behalf of the request in other tasks (a coalesced
+    query, a background refresh) is counted against the request that
+    started it.
+    """
+
+    def __init__(self, app: ASGIApp, headers: bool = settings.DB_STATS_HEADERS):
+        self.app = app
+        self.headers = headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDbStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                self._check_budget(scope, stats)
+                if self.headers:
+                    headers = MutableHeaders(raw=message["headers"])
+                    app_ms = (time.perf_counter() - started) * 1000
+                    headers.append(
+                        "Server-Timing",
+                        f'db;dur={stats.duration * 1000:.1f};desc="{stats.commands} commands, '
+                        f'{stats.documents} docs", app;dur={app_ms:.1f}'
+                    )
+                    headers["X-DB-Commands"] = str(stats.commands)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_stats.reset(token)
+
+    @staticmethod
+    def _check_budget(scope: Scope, stats: RequestDbStats):
+        budget = getattr(scope.get("endpoint"), "_db_command_budget", settings.DB_COMMAND_BUDGET)
+        if budget and stats.commands > budget:
+            route = route_template(scope)
+            db_budget_exceeded.inc(route)
+            logger.warning(
+                "%s %s issued %s Mongo commands (budget %s, %.1fms)",
+                scope["method"], route, stats.commands, budget, stats.duration * 1000
+            )
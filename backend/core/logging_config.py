@@ -1,69 +1,160 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
 from core.config import settings
 
-def setup_logging():
-    
+# Attributes every LogRecord has; anything else was passed through `extra=`
+# (except color_message, uvicorn's ANSI-colored copy of the message)
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "color_message"}
+_UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, extras, exception."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of the records below WARNING from selected loggers (and
+    their children), e.g. {"core.db_stats": 0.1}. Warnings and errors always
+    pass.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, Optional[float]] = {}
+
+    def _rate(self, name: str) -> Optional[float]:
+        if name not in self._resolved:
+            rate, candidate = None, name
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition(".")[0]
+            self._resolved[name] = rate
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate is None or random.random() < rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the writer thread without blocking the caller. When
+    the queue is full the record is dropped and counted instead.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now, while they still hold the values being
+        # logged; exception info is left for the output formatter to render
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _parse_sampling(spec: str) -> Dict[str, float]:
+    rates = {}
+    for part in spec.split(","):
+        name, _, rate = part.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+def setup_logging() -> Tuple[DroppingQueueHandler, logging.handlers.QueueListener]:
+    """
+    Route every record through a bounded queue to a background writer
+    thread, so logging never blocks the event loop on stdout.
+    """
     log_level = getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO)
-    
-    logging.basicConfig(
-        level=log_level,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        handlers=[
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
-    
-    root_logger = logging.getLogger()
-    
-    if settings.is_development:
-        app_logger = logging.getLogger("api")
-        app_logger.setLevel(logging.DEBUG)
-        
-        core_logger = logging.getLogger("core")
-        core_logger.setLevel(logging.DEBUG)
-        
-        db_logger = logging.getLogger("db")
-        db_logger.setLevel(logging.DEBUG)
-        
-        models_logger = logging.getLogger("models")
-        models_logger.setLevel(logging.DEBUG)
-        
-        logging.getLogger("pymongo").setLevel(logging.WARNING)
-        logging.getLogger("httpx").setLevel(logging.WARNING)
-        logging.getLogger("httpcore").setLevel(logging.WARNING)
-        
+
+    output = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
     else:
+        output.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+
+    handler = DroppingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    sampling = _parse_sampling(settings.LOG_SAMPLING)
+    if sampling:
+        handler.addFilter(SamplingFilter(sampling))
+
+    root_logger = logging.getLogger()
+    root_logger.handlers = [handler]
+    root_logger.setLevel(log_level)
+
+    # Levels are the only gate, so a disabled level costs one integer check
+    app_level = logging.DEBUG if settings.is_development else logging.INFO
+    for name in ("api", "core", "db", "models", "main"):
+        logging.getLogger(name).setLevel(app_level)
 
-        app_logger = logging.getLogger("api")
-        app_logger.setLevel(logging.INFO)
-        
-        core_logger = logging.getLogger("core")
-        core_logger.setLevel(logging.INFO)
-        
-        db_logger = logging.getLogger("db")
-        db_logger.setLevel(logging.INFO)
-        
-        models_logger = logging.getLogger("models")
-        models_logger.setLevel(logging.INFO)
-        
-        logging.getLogger("pymongo").setLevel(logging.ERROR)
-        logging.getLogger("httpx").setLevel(logging.ERROR)
-        logging.getLogger("httpcore").setLevel(logging.ERROR)
+    library_level = logging.WARNING if settings.is_development else logging.ERROR
+    for name in ("pymongo", "httpx", "httpcore"):
+        logging.getLogger(name).setLevel(library_level)
+    if not settings.is_development:
         logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
-    
-    def get_logger(name: str) -> logging.Logger:
-        logger = logging.getLogger(name)
-        
-        original_debug = logger.debug
-        
-        def env_debug(msg, *args, **kwargs):
-            if settings.is_development:
-                original_debug(msg, *args, **kwargs)
-        
-        logger.debug = env_debug
-        return logger
-    
-    return get_logger
-
-get_logger = setup_logging()
+    # uvicorn configures its loggers before importing the app, each with its
+    # own stream handler writing on the event loop; send them through the queue
+    for name in _UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return handler, listener
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+
+def logging_stats() -> Dict[str, Any]:
+    return {
+        "format": settings.LOG_FORMAT,
+        "queued": log_handler.queue.qsize(),
+        "dropped": log_handler.dropped,
+    }
+
+
+log_handler, log_listener = setup_logging()
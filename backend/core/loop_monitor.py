@@ -0,0 +1,187 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+from starlette.types import ASGIApp, Receive, Scope, Send
+from core.config import settings
+from core.logging_config import get_logger
+from core.metrics import metrics, route_template
+
+logger = get_logger(__name__)
+
+loop_lag = metrics.histogram(
+    "event_loop_lag_seconds",
+    "Delay between a scheduled wake-up of the watchdog task and when it ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+loop_stalls = metrics.counter("event_loop_stalls", "Event loop stalls over the lag threshold", ("route",))
+
+# Frames from these files are asyncio/threading plumbing, not the culprit
+_PLUMBING = ("asyncio/", "threading.py", "concurrent/futures")
+
+
+class LoopLagMonitor:
+    """
+    Watchdog for blocking calls on the event loop.
+
+    A task sleeps for `interval` in a loop, stamping a heartbeat each time;
+    how late each wake-up is, is the loop lag. A helper thread checks the
+    heartbeat and, once it is older than `threshold`, samples the loop
+    thread's stack while it is still blocked and notes which request's
+    task was running. The task reports the stall when the loop recovers.
+
+    Both sides sleep between checks, so the cost is two wake-ups per
+    interval.
+    """
+
+    def __init__(self, interval: float, threshold: float, log_interval: float):
+        self.interval = interval
+        self.threshold = threshold
+        self.log_interval = log_interval
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = time.monotonic()
+        self._sample: Optional[Dict[str, Any]] = None
+        # Request scopes by the task serving them, for attribution
+        self._requests: Dict[asyncio.Task, Scope] = {}
+        self._last_log = 0.0
+        self._suppressed = 0
+        self.stalls = 0
+        self.max_lag = 0.0
+
+    async def start(self):
+        if not settings.LOOP_MONITOR_ENABLED:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._watch(), name="loop-lag-monitor")
+        self._thread = threading.Thread(target=self._sample_stalls, name="loop-stall-sampler", daemon=True)
+        self._thread.start()
+        logger.info("Event loop monitor started (threshold %.0fms)", self.threshold * 1000)
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def track(self, scope: Scope) -> Optional[asyncio.Task]:
+        task = asyncio.current_task()
+        if task is not None and self._task is not None:
+            self._requests[task] = scope
+        return task
+
+    def untrack(self, task: Optional[asyncio.Task]):
+        self._requests.pop(task, None)
+
+    async def _watch(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - expected)
+            loop_lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                self._report(lag)
+            else:
+                self._sample = None  # taken during a stall that ended below the threshold
+
+    def _sample_stalls(self):
+        """Helper thread: capture the loop thread's stack during a stall."""
+        check = min(self.interval, self.threshold / 2)
+        sampled_beat = None
+        while not self._stopping.wait(check):
+            beat = self._heartbeat
+            if beat == sampled_beat or time.monotonic() - beat < self.threshold:
+                continue
+            sampled_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            task = asyncio.current_task(self._loop)
+            scope = self._requests.get(task) if task is not None else None
+            self._sample = {
+                "route": self._describe(scope),
+                "stack": traceback.extract_stack(frame),
+            }
+
+    @staticmethod
+    def _describe(scope: Optional[Scope]) -> str:
+        if scope is None:
+            return "background"
+        route = route_template(scope)
+        if route == "unmatched":
+            # Still in middleware or dependencies before routing finished
+            route = scope.get("path", "unknown")
+        return f"{scope.get('method', '')} {route}".strip()
+
+    def _report(self, lag: float):
+        sample, self._sample = self._sample, None
+        route = sample["route"] if sample else "unknown"
+        self.stalls += 1
+        loop_stalls.inc(route)
+
+        now = time.monotonic()
+        if now - self._last_log < self.log_interval:
+            self._suppressed += 1
+            return
+        suppressed, self._suppressed = self._suppressed, 0
+        self._last_log = now
+        stack = "".join(traceback.format_list(self._relevant(sample["stack"]))) if sample else "(not sampled)\n"
+        logger.warning(
+            "Event loop blocked for %.0fms while serving %s%s; loop thread stack:\n%s",
+            lag * 1000, route, f" ({suppressed} more stalls since last report)" if suppressed else "", stack
+        )
+
+    @staticmethod
+    def _relevant(stack: traceback.StackSummary) -> List[traceback.FrameSummary]:
+        frames = [frame for frame in stack if not any(part in frame.filename for part in _PLUMBING)]
+        return frames[-15:] or list(stack)[-15:]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self._task is not None,
+            "stalls": self.stalls,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+        }
+
+
+# Global instance
+loop_monitor = LoopLagMonitor(
+    interval=settings.LOOP_MONITOR_INTERVAL_MS / 1000,
+    threshold=settings.LOOP_LAG_THRESHOLD_MS / 1000,
+    log_interval=settings.LOOP_STALL_LOG_INTERVAL_SECONDS
+)
+
+
+class LoopMonitorMiddleware:
+    """Remembers which task serves which request so stalls can be attributed."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        task = loop_monitor.track(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            loop_monitor.untrack(task)
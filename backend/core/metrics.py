@@ -0,0 +1,279 @@
+import bisect
+import math
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Everything here is updated from the event loop thread only (middleware and
+# driver listeners run there), so plain dict and list updates need no locks.
+
+NAMESPACE = "runegard"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = f"{NAMESPACE}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """(suffix, label string, value) triples."""
+        return ()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield "_total", _format_labels(self.labelnames, labels), value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield "", _format_labels(self.labelnames, labels), value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield "_bucket", _format_labels(self.labelnames, labels, le), cumulative
+            label_string = _format_labels(self.labelnames, labels)
+            yield "_sum", label_string, total
+            yield "_count", label_string, cumulative
+
+
+class StatsGauges(Metric):
+    """
+    Gauges read at scrape time from a component's stats() dict; every
+    numeric field becomes `<name>_<field>`. Non-numeric fields are skipped.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, stats: Callable[[], Dict[str, Any]]):
+        super().__init__(name, documentation)
+        self.stats = stats
+
+    def render(self) -> List[str]:
+        lines = []
+        for field, value in _flatten(self.stats()):
+            metric = f"{self.name}_{field}"
+            lines.append(f"# HELP {metric} {self.documentation} ({field.replace('_', ' ')})")
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {_format_value(float(value))}")
+        return lines
+
+
+def _flatten(stats: Dict[str, Any], prefix: str = "") -> Iterable[Tuple[str, float]]:
+    for key, value in stats.items():
+        field = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{field}_")
+        elif isinstance(value, bool):
+            yield field, int(value)
+        elif isinstance(value, (int, float)):
+            yield field, value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_stats(self, name: str, documentation: str, stats: Callable[[], Dict[str, Any]]):
+        self.register(StatsGauges(name, documentation, stats))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global instance
+metrics = MetricsRegistry()
+
+http_requests = metrics.counter(
+    "http_requests", "HTTP requests by route template, method and status", ("route", "method", "status")
+)
+http_request_duration = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("route", "method", "status")
+)
+http_in_flight = metrics.gauge("http_requests_in_flight", "HTTP requests being served")
+
+mongo_commands = metrics.counter(
+    "mongo_commands", "MongoDB commands by collection, command and outcome", ("collection", "command", "outcome")
+)
+mongo_command_duration = metrics.histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command latency as measured by the driver",
+    ("collection", "command"),
+    DB_LATENCY_BUCKETS
+)
+mongo_pool_connections = metrics.gauge(
+    "mongo_pool_connections", "Open connections in the driver pool", ("address",)
+)
+mongo_pool_checked_out = metrics.gauge(
+    "mongo_pool_checked_out", "Connections currently checked out of the driver pool", ("address",)
+)
+mongo_pool_checkout_failures = metrics.counter(
+    "mongo_pool_checkout_failures", "Failed connection checkouts", ("address", "reason")
+)
+mongo_pool_checkout_wait = metrics.histogram(
+    "mongo_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection, including connection setup",
+    ("address",),
+    DB_LATENCY_BUCKETS
+)
+mongo_pool_waiting = metrics.gauge(
+    "mongo_pool_waiting", "Operations waiting to check out a connection", ("address",)
+)
+mongo_pool_saturation = metrics.gauge(
+    "mongo_pool_saturation", "Checked-out connections as a fraction of maxPoolSize", ("address",)
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def route_template(scope: Scope) -> str:
+    """Path template of the matched route, so IDs do not explode label cardinality."""
+    route = scope.get("route")
+    template = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if not template:
+        return "unmatched"
+    # Routes of included routers carry their path without the router prefix;
+    # recover the prefix from the concrete path
+    try:
+        rendered = template.format(**{k: str(v) for k, v in scope.get("path_params", {}).items()})
+    except (KeyError, IndexError, ValueError):
+        return template
+    path = scope["path"]
+    if path.endswith(rendered) and path != rendered:
+        return path[: len(path) - len(rendered)] + template
+    return template
+
+
+class MetricsMiddleware:
+    """Records request count and latency by route template, method and status."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            labels = (route_template(scope), scope["method"], str(status_code))
+            http_requests.inc(*labels)
+            http_request_duration.observe(time.perf_counter() - started, *labels)
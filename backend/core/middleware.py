@@ -1,43 +1,230 @@
-import logging
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
+import heapq
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Protocol, Tuple
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import HTTPAuthorizationCredentials
+from pymongo import ReturnDocument
+from core.auth import bearer_scheme, identity_cache
 from core.config import settings
+from core.logging_config import get_logger
+from db.mongo import mongodb
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    requests: int
+    window: int  # seconds
+
+    @property
+    def emission_interval(self) -> float:
+        return self.window / self.requests
+
+    def __str__(self) -> str:
+        return f"{self.requests} per {self.window} second"
+
+
+class RateLimitExceeded(HTTPException):
+    def __init__(self, limit: RateLimit, retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate limit exceeded: {limit}",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+class RateLimitStore(Protocol):
+    async def acquire(self, key: str, limit: RateLimit, now: float, cost: float) -> Tuple[bool, float]:
+        """
+        Apply one GCRA step of weight `cost` for `key`. Returns (allowed,
+        retry_after seconds). Must be atomic per key so concurrent workers
+        cannot both pass.
+        """
+        ...
+
+
+class MemoryRateLimitStore:
+    """
+    Per-process GCRA state: one float (the theoretical arrival time) per key.
+
+    A key whose arrival time is in the past carries no information. Once the
+    table exceeds max_keys, keys are evicted in arrival-time order from a
+    min-heap: every expired key goes first, and a key still being throttled
+    only when nothing has expired. The heap holds one entry per update and
+    skips superseded ones as it pops; it is rebuilt from the table once
+    they make up most of it, so each acquire costs O(log n) amortized.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._tats: Dict[str, float] = {}
+        self._expiry: List[Tuple[float, str]] = []
+
+    async def acquire(self, key: str, limit: RateLimit, now: float, cost: float) -> Tuple[bool, float]:
+        tat = max(self._tats.get(key, now), now)
+        new_tat = tat + limit.emission_interval * cost
+        allow_at = new_tat - limit.window
+        if allow_at > now:
+            return False, allow_at - now
+        self._tats[key] = new_tat
+        heapq.heappush(self._expiry, (new_tat, key))
+        if len(self._tats) > self.max_keys:
+            self._prune(now)
+        elif len(self._expiry) > 2 * self.max_keys:
+            self._compact()
+        return True, 0.0
+
+    def _prune(self, now: float):
+        # Sweep every expired key while at it, so a full table is not pruned again on the next new key
+        while self._expiry and (self._expiry[0][0] <= now or len(self._tats) > self.max_keys):
+            tat, key = heapq.heappop(self._expiry)
+            if self._tats.get(key) == tat:
+                del self._tats[key]
+
+    def _compact(self):
+        self._expiry = [(tat, key) for key, tat in self._tats.items()]
+        heapq.heapify(self._expiry)
+
+
+class MongoRateLimitStore:
+    """
+    Shared GCRA state in the `rate_limits` collection, one small document per
+    key, updated atomically with a pipeline update so every worker and
+    replica draws from the same budget. Documents expire through the TTL index
+    in the manifest (db/indexes.py) once their arrival time has passed.
+    """
+
+    async def acquire(self, key: str, limit: RateLimit, now: float, cost: float) -> Tuple[bool, float]:
+        increment = limit.emission_interval * cost
+        next_tat = {"$add": [{"$max": [{"$ifNull": ["$tat", now]}, now]}, increment]}
+        allowed = {"$lte": [next_tat, now + limit.window]}
+        document = await mongodb.rate_limits.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {
+                    "allowed": allowed,
+                    "tat": {"$cond": [allowed, next_tat, {"$ifNull": ["$tat", now]}]},
+                }},
+                {"$set": {"expires_at": {"$toDate": {"$multiply": ["$tat", 1000]}}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if document["allowed"]:
+            return True, 0.0
+        return False, document["tat"] + increment - limit.window - now
+
+
+class RateLimiter:
+    """
+    Cost-weighted GCRA rate limiter: every client has one budget of
+    `limit.requests` units per window, and each endpoint spends its cost
+    (1 unless tagged by a decorator below). One acquire() per request.
+    """
+
+    def __init__(self, store: RateLimitStore, limit: RateLimit):
+        self.store = store
+        self.limit = limit
+
+    async def check(self, request: Request, client_key: str):
+        endpoint = request.scope.get("endpoint")
+        cost: float = getattr(endpoint, "_rate_limit_cost", 1.0)
+        try:
+            allowed, retry_after = await self.store.acquire(client_key, self.limit, time.time(), cost)
+        except Exception as e:
+            # Fail open: an unavailable shared store must not take the API down
+            logger.warning("Rate limit store error: %s", e)
+            return
+        if not allowed:
+            raise RateLimitExceeded(self.limit, retry_after)
+
+
+def get_remote_address(request: Request) -> str:
+    return request.client.host if request.client else "127.0.0.1"
+
+
+async def get_rate_limit_key(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+) -> str:
+    """
+    Budget key: the user of a token already verified and held in the
+    identity cache, so users behind one campus NAT do not share a bucket;
+    the client IP otherwise. Tokens are never verified here: a request
+    with a new or bogus token spends its IP's budget before anything
+    calls Clerk for it.
+    """
+    if credentials and credentials.credentials:
+        identity = identity_cache.peek(credentials.credentials)
+        if identity is not None:
+            return f"user:{identity['user_id']}"
+    return f"ip:{get_remote_address(request)}"
+
+
+def _create_store() -> RateLimitStore:
+    if settings.RATE_LIMIT_BACKEND == "mongo":
+        return MongoRateLimitStore()
+    return MemoryRateLimitStore(max_keys=settings.RATE_LIMIT_MAX_KEYS)
 
-logger = logging.getLogger(__name__)
 
 # Create rate limiter instance
-limiter = Limiter(
-    key_func=get_remote_address,
-    default_limits=[f"{settings.RATE_LIMIT_REQUESTS}/{settings.RATE_LIMIT_WINDOW}seconds"]
+limiter = RateLimiter(
+    store=_create_store(),
+    limit=RateLimit(settings.RATE_LIMIT_REQUESTS, settings.RATE_LIMIT_WINDOW)
 )
 
+
+async def enforce_rate_limit(request: Request, client_key: str = Depends(get_rate_limit_key)):
+    """App-wide dependency: the single rate limit check for every route."""
+    await limiter.check(request, client_key)
+
+
 def setup_rate_limiting(app):
     """Setup rate limiting for the FastAPI app"""
     app.state.limiter = limiter
-    app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-    app.add_middleware(SlowAPIMiddleware)
-    
+
     if settings.is_development:
-        logger.info(f"Rate limiting configured: {settings.RATE_LIMIT_REQUESTS} requests per {settings.RATE_LIMIT_WINDOW}s")
+        logger.info(
+            "Rate limiting configured: budget of %s per %ss per client (%s)",
+            settings.RATE_LIMIT_REQUESTS, settings.RATE_LIMIT_WINDOW, type(limiter.store).__name__
+        )
+
+# Rate limit decorators for different endpoints. Each tier is a cost against
+# the shared per-client budget, sized so a client using only that tier gets
+# the same allowance the separate per-tier limits used to give.
+def rate_limit(cost: float, route_class: Optional[str] = None):
+    """
+    Set the budget cost of one endpoint; charged by enforce_rate_limit.
+    `route_class` also files the endpoint under that admission class.
+    """
+    def decorator(func):
+        func._rate_limit_cost = cost
+        if route_class:
+            func._route_class = route_class
+        return func
+    return decorator
+
+def _tier_cost(tier_limit: int) -> float:
+    return settings.RATE_LIMIT_REQUESTS / tier_limit
 
-# Rate limit decorators for different endpoints
 def standard_rate_limit():
     """Standard rate limit for most endpoints"""
-    return limiter.limit(f"{settings.RATE_LIMIT_REQUESTS}/{settings.RATE_LIMIT_WINDOW}seconds")
+    return rate_limit(1.0)
 
 def auth_rate_limit():
     """Stricter rate limit for authentication endpoints"""
     auth_limit = max(10, settings.RATE_LIMIT_REQUESTS // 10)  # 10x stricter
-    return limiter.limit(f"{auth_limit}/{settings.RATE_LIMIT_WINDOW}seconds")
+    return rate_limit(_tier_cost(auth_limit), route_class="auth")
 
 def create_rate_limit():
     """Rate limit for resource creation endpoints"""
     create_limit = max(20, settings.RATE_LIMIT_REQUESTS // 5)  # 5x stricter
-    return limiter.limit(f"{create_limit}/{settings.RATE_LIMIT_WINDOW}seconds")
+    return rate_limit(_tier_cost(create_limit), route_class="write")
 
 def search_rate_limit():
     """Rate limit for search endpoints"""
     search_limit = max(30, settings.RATE_LIMIT_REQUESTS // 3)  # 3x stricter
-    return limiter.limit(f"{search_limit}/{settings.RATE_LIMIT_WINDOW}seconds")
+    return rate_limit(_tier_cost(search_limit), route_class="search")
@@ -0,0 +1,237 @@
+import asyncio
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from core.auth import identity_cache
+from core.config import settings
+from core.logging_config import get_logger
+from core.metrics import route_template
+
+logger = get_logger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+# Samples taken while the request's tasks were suspended (awaiting Mongo, Clerk, ...)
+AWAITING = "[awaiting I/O]"
+
+_active_profile: ContextVar[Optional["Profile"]] = ContextVar("active_profile", default=None)
+
+
+class Profile:
+    """Stack samples of one request, aggregated by collapsed stack."""
+
+    def __init__(self, method: str, path: str, reason: str):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.route: Optional[str] = None
+        self.status: Optional[int] = None
+        self.started = time.time()
+        self.duration = 0.0
+        self.samples = 0
+        self.stacks: Dict[str, int] = {}
+
+    def add(self, stack: str):
+        self.samples += 1
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed format, one `frame;frame;... count` per line."""
+        lines = [f"{stack} {count}" for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1])]
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "reason": self.reason,
+            "started": self.started,
+            "duration_ms": round(self.duration * 1000, 1),
+            "samples": self.samples,
+            "awaiting_samples": self.stacks.get(AWAITING, 0),
+        }
+
+
+def _collapse(frame) -> str:
+    """Stack from the running task's coroutine inwards; event loop frames are dropped."""
+    frames = []
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "?")
+        if frames and module.startswith("asyncio."):
+            break
+        frames.append(f"{module}:{frame.f_code.co_qualname}")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for opted-in requests.
+
+    While at least one profiled request is in flight, a helper thread
+    samples the event loop thread's stack every `interval` and charges it to
+    the profile of the task that is running, found through the task's
+    context, so work the request hands to other tasks is included. Profiles
+    whose tasks are all suspended get an `[awaiting I/O]` sample instead.
+    Requests that are not profiled pay nothing beyond a context lookup per
+    sample, and nothing at all when no profile is active.
+
+    The last `max_per_route` profiles of each route are kept for download.
+    """
+
+    def __init__(self, interval: float, max_per_route: int, sample_percent: float):
+        self.interval = interval
+        self.max_per_route = max_per_route
+        self.sample_percent = sample_percent
+        self._active: Dict[str, Profile] = {}
+        self._by_route: "OrderedDict[str, Deque[Profile]]" = OrderedDict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self.profiled = 0
+
+    def should_sample(self) -> bool:
+        return self.sample_percent > 0 and random.random() * 100 < self.sample_percent
+
+    def begin(self, profile: Profile):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+            self._thread.start()
+        self._active[profile.id] = profile
+        self._wake.set()
+
+    def finish(self, profile: Profile, scope: Scope, duration: float):
+        self._active.pop(profile.id, None)
+        if not self._active:
+            self._wake.clear()
+        profile.duration = duration
+        profile.route = route_template(scope)
+        key = f"{profile.method} {profile.route}"
+        profiles = self._by_route.get(key)
+        if profiles is None:
+            profiles = self._by_route[key] = deque(maxlen=self.max_per_route)
+        profiles.append(profile)
+        self.profiled += 1
+        logger.info(
+            "Profiled %s %s: %.1fms, %s samples (profile %s)",
+            profile.method, profile.route, duration * 1000, profile.samples, profile.id
+        )
+
+    def _sample(self):
+        """Helper thread: sample the loop thread while profiles are active."""
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            active = list(self._active.values())
+            if not active:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            task = asyncio.current_task(self._loop)
+            running = task.get_context().get(_active_profile) if task is not None else None
+            for profile in active:
+                if profile is running and frame is not None:
+                    profile.add(_collapse(frame))
+                else:
+                    profile.add(AWAITING)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        for profiles in self._by_route.values():
+            for profile in profiles:
+                if profile.id == profile_id:
+                    return profile
+        return None
+
+    def list(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Stored profiles by route, newest first."""
+        return {
+            route: [profile.summary() for profile in reversed(profiles)]
+            for route, profiles in self._by_route.items()
+        }
+
+    def clear(self):
+        self._by_route.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sample_percent": self.sample_percent,
+            "active": len(self._active),
+            "profiled": self.profiled,
+            "stored": sum(len(profiles) for profiles in self._by_route.values()),
+        }
+
+
+# Global instance
+profiler = SamplingProfiler(
+    interval=settings.PROFILING_INTERVAL_MS / 1000,
+    max_per_route=settings.PROFILING_MAX_PER_ROUTE,
+    sample_percent=settings.PROFILING_SAMPLE_PERCENT
+)
+
+
+async def _requested_by_admin(headers: Headers) -> bool:
+    if PROFILE_HEADER not in headers:
+        return False
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    # Middleware runs before the rate limit; only tokens already verified
+    # by an earlier request count, so a stream of bogus tokens costs no Clerk call
+    identity = identity_cache.peek(token)
+    return identity is not None and identity["user_id"] in settings.admin_user_ids
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request when an admin sends `X-Profile: 1` with a token an
+    earlier request already verified, or for PROFILING_SAMPLE_PERCENT of
+    all requests. The profile id is returned in
+    X-Profile-Id and the collapsed stacks are served from /admin/profiles.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        if await _requested_by_admin(headers):
+            reason = "header"
+        elif profiler.should_sample():
+            reason = "sampled"
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["method"], scope["path"], reason)
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                MutableHeaders(raw=message["headers"])[PROFILE_ID_HEADER] = profile.id
+            await send(message)
+
+        token = _active_profile.set(profile)
+        profiler.begin(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _active_profile.reset(token)
+            profiler.finish(profile, scope, time.perf_counter() - started)
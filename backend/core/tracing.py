@@ -0,0 +1,345 @@
+import atexit
+import functools
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import httpx
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from core.config import settings
+from core.logging_config import DroppingQueueHandler, get_logger
+from core.metrics import route_template
+
+logger = get_logger(__name__)
+
+SERVICE_NAME = "runegard-api"
+TRACE_ID_HEADER = "X-Trace-Id"
+
+
+def _now_us() -> int:
+    return time.time_ns() // 1000
+
+
+class Trace:
+    """Spans of one sampled request, exported together when the root span ends."""
+
+    def __init__(self):
+        self.id = os.urandom(16).hex()
+        self.spans: List["Span"] = []
+        self.exported = False
+
+
+class Span:
+    def __init__(
+        self,
+        trace: Trace,
+        name: str,
+        parent: Optional["Span"] = None,
+        kind: Optional[str] = None,
+        tags: Optional[Dict[str, Any]] = None,
+        timestamp: Optional[int] = None
+    ):
+        self.trace = trace
+        self.id = os.urandom(8).hex()
+        self.parent = parent
+        self.name = name
+        self.kind = kind
+        self.tags = {key: str(value) for key, value in (tags or {}).items()}
+        self.timestamp = timestamp or _now_us()
+        self.duration: Optional[int] = None
+        self.marks: Dict[str, int] = {}
+        self._started = time.perf_counter()
+
+    def tag(self, key: str, value: Any):
+        self.tags[key] = str(value)
+
+    def finish(self, duration: Optional[int] = None):
+        self.duration = duration if duration is not None else max(int((time.perf_counter() - self._started) * 1e6), 1)
+        tracer.record(self)
+
+    def to_zipkin(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace.id,
+            "id": self.id,
+            "name": self.name,
+            "timestamp": self.timestamp,
+            "duration": self.duration,
+            "localEndpoint": {"serviceName": SERVICE_NAME},
+        }
+        if self.parent is not None:
+            span["parentId"] = self.parent.id
+        if self.kind:
+            span["kind"] = self.kind
+        if self.tags:
+            span["tags"] = self.tags
+        return span
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class ZipkinHttpHandler(logging.Handler):
+    """POSTs each exported batch to a Zipkin-compatible collector."""
+
+    def __init__(self, endpoint: str):
+        super().__init__()
+        self.endpoint = endpoint
+        self._client = httpx.Client(timeout=5.0)
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self._client.post(self.endpoint, content=record.getMessage(), headers={"Content-Type": "application/json"})
+        except Exception:
+            self.handleError(record)
+
+
+class Tracer:
+    """
+    Request tracing in the Zipkin v2 JSON model.
+
+    A request is sampled at its root span with probability `sample_rate`;
+    child spans are only created under a sampled root, so everything else
+    costs one context variable lookup per instrumented call. Finished
+    traces are written as one JSON array of spans per line, by a
+    background thread, to a rotating file or a collector endpoint.
+    """
+
+    def __init__(self, enabled: bool, sample_rate: float):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self._handler: Optional[DroppingQueueHandler] = None
+        self.sampled = 0
+        self.exported = 0
+
+    def configure_export(self, exporter: str, path: str, max_bytes: int, backups: int, endpoint: str):
+        if not self.enabled:
+            return
+        if exporter == "zipkin":
+            output: logging.Handler = ZipkinHttpHandler(endpoint)
+        else:
+            output = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        output.setFormatter(logging.Formatter("%(message)s"))
+        self._handler = DroppingQueueHandler(queue.Queue(maxsize=1000))
+        listener = logging.handlers.QueueListener(self._handler.queue, output)
+        listener.start()
+        atexit.register(listener.stop)
+
+    def start_trace(self, name: str, tags: Optional[Dict[str, Any]] = None) -> Optional[Span]:
+        """Root span of a request, or None when the request is not sampled."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        self.sampled += 1
+        return Span(Trace(), name, kind="SERVER", tags=tags)
+
+    def record(self, span: Span):
+        trace = span.trace
+        if trace.exported:
+            # Finished after its request, e.g. a coalesced query another request still awaits
+            self._export([span])
+            return
+        trace.spans.append(span)
+        if span.parent is None:
+            trace.exported = True
+            self._export(trace.spans)
+
+    def _export(self, spans: List[Span]):
+        if self._handler is None:
+            return
+        self.exported += 1
+        self._handler.handle(logging.makeLogRecord({
+            "msg": json.dumps([span.to_zipkin() for span in spans]),
+            "levelno": logging.INFO,
+            "levelname": "INFO",
+        }))
+
+    @contextmanager
+    def span(self, name: str, kind: Optional[str] = None, **tags: Any) -> Iterator[Optional[Span]]:
+        """Child span of the current span; a no-op outside a sampled request."""
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        span = Span(parent.trace, name, parent, kind, tags)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.tag("error", type(e).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "sampled": self.sampled,
+            "exported": self.exported,
+            "dropped": self._handler.dropped if self._handler else 0,
+        }
+
+
+# Global instance
+tracer = Tracer(enabled=settings.TRACING_ENABLED, sample_rate=settings.TRACING_SAMPLE_RATE)
+tracer.configure_export(
+    exporter=settings.TRACING_EXPORTER,
+    path=settings.TRACING_FILE,
+    max_bytes=settings.TRACING_FILE_MAX_BYTES,
+    backups=settings.TRACING_FILE_BACKUPS,
+    endpoint=settings.TRACING_ENDPOINT
+)
+
+
+def traced(name: Optional[str] = None):
+    """Record calls of a function, sync or async, as child spans."""
+    def decorator(func: Callable):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with tracer.span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_methods(cls):
+    """Apply @traced to every public method a class defines."""
+    for attribute, value in list(vars(cls).items()):
+        if not attribute.startswith("_") and inspect.isfunction(value):
+            setattr(cls, attribute, traced(f"{cls.__name__}.{attribute}")(value))
+    return cls
+
+
+class TracedRoute(APIRoute):
+    """
+    Route whose handling is split into spans: `dependencies` (parameter
+    validation and dependencies), the endpoint itself, and `serialize`
+    (response model validation and encoding).
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            endpoint = self._trace_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    @staticmethod
+    def _trace_endpoint(endpoint: Callable) -> Callable:
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            route_span = _current_span.get()
+            if route_span is None:
+                return await endpoint(*args, **kwargs)
+            started = _now_us()
+            Span(route_span.trace, "dependencies", route_span, timestamp=route_span.timestamp).finish(
+                max(started - route_span.timestamp, 1)
+            )
+            try:
+                with tracer.span(f"endpoint {endpoint.__name__}"):
+                    return await endpoint(*args, **kwargs)
+            finally:
+                route_span.marks["serialize"] = _now_us()
+        return wrapper
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        path = self.path_format
+
+        async def traced_handler(request):
+            if _current_span.get() is None:
+                return await handler(request)
+            with tracer.span(f"route {path}") as route_span:
+                response = await handler(request)
+                serialize_from = route_span.marks.get("serialize")
+                if serialize_from is not None:
+                    Span(route_span.trace, "serialize", route_span, timestamp=serialize_from).finish(
+                        max(_now_us() - serialize_from, 1)
+                    )
+                return response
+        return traced_handler
+
+
+class TracingMiddleware:
+    """Starts the root span of sampled requests and returns the trace id in X-Trace-Id."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        root = tracer.start_trace(scope["method"], {"http.method": scope["method"], "http.path": scope["path"]})
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                root.tag("http.status_code", message["status"])
+                MutableHeaders(raw=message["headers"])[TRACE_ID_HEADER] = root.trace.id
+            await send(message)
+
+        token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_span.reset(token)
+            root.name = f"{scope['method']} {route_template(scope)}"
+            root.finish()
+
+
+class TracingListener(monitoring.CommandListener):
+    """One CLIENT span per driver command issued inside a sampled request."""
+
+    def __init__(self):
+        self._pending: Dict[Any, Span] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        parent = _current_span.get()
+        if parent is None:
+            return
+        collection = event.command.get(event.command_name)
+        tags = {"db.system": "mongodb", "db.name": event.database_name, "db.operation": event.command_name}
+        if isinstance(collection, str):
+            tags["db.collection"] = collection
+        span = Span(parent.trace, f"mongo {event.command_name}", parent, "CLIENT", tags)
+        self._pending[(event.request_id, event.connection_id)] = span
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        span = self._pending.pop((event.request_id, event.connection_id), None)
+        if span is not None:
+            span.finish(max(event.duration_micros, 1))
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        span = self._pending.pop((event.request_id, event.connection_id), None)
+        if span is not None:
+            span.tag("error", event.failure.get("codeName", "failed"))
+            span.finish(max(event.duration_micros, 1))
@@ -0,0 +1,148 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+from pymongo.errors import OperationFailure, PyMongoError
+from core.cache import collection_versions, entity_cache, negative_cache, namespace_tag, project_tag, user_tag
+from core.config import settings
+from core.logging_config import get_logger
+from db.mongo import mongodb
+
+logger = get_logger(__name__)
+
+WATCHED_COLLECTIONS = ("users", "projects", "teammate_requests", "testimonials")
+
+# Server errors meaning change streams cannot work on this deployment at all
+# (standalone server, or $changeStream not permitted).
+_UNSUPPORTED_CODES = {40573, 40324, 13}
+# The resume token fell off the oplog; events since then are lost.
+_HISTORY_LOST_CODES = {286, 280}
+# Negative-cache namespaces keyed by ObjectId, per collection
+_NEGATIVE_NAMESPACES = {"projects": "projects", "teammate_requests": "requests"}
+
+
+class CacheInvalidationListener:
+    """
+    Tails a database-wide change stream and invalidates local cache entries
+    for documents written by other workers or replicas.
+
+    The last resume token is kept so transient errors resume without gaps.
+    When the deployment does not support change streams (a standalone
+    mongod), the listener stops and entries simply age out after
+    CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._resume_token: Optional[Dict[str, Any]] = None
+        self.active = False
+        self.events = 0
+
+    async def start(self):
+        if not settings.CACHE_CHANGE_STREAM_ENABLED or not entity_cache.enabled:
+            logger.info("Cache change stream disabled; relying on TTL expiry")
+            return
+        self._task = asyncio.create_task(self._run(), name="cache-invalidation-listener")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.active = False
+        collection_versions.unfollow()
+
+    async def _run(self):
+        pipeline = [
+            {"$match": {"ns.coll": {"$in": list(WATCHED_COLLECTIONS)}}},
+            {"$project": {"operationType": 1, "ns": 1, "documentKey": 1, "clusterTime": 1, "fullDocument.user_id": 1}},
+        ]
+        backoff = 1
+        while True:
+            try:
+                async with await mongodb.db.watch(
+                    pipeline,
+                    full_document="updateLookup",
+                    resume_after=self._resume_token
+                ) as stream:
+                    if not self.active:
+                        logger.info("Cache change stream listener started")
+                    self.active = True
+                    # Every write before the stream opened is at or before this time
+                    opened_at = (await mongodb.client.admin.command("ping")).get("operationTime")
+                    collection_versions.follow(stream.resume_token, opened_at)
+                    backoff = 1
+                    async for change in stream:
+                        await self._apply(change)
+                        self._resume_token = stream.resume_token
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                self.active = False
+                collection_versions.unfollow()
+                if e.code in _UNSUPPORTED_CODES:
+                    logger.info("Change streams unavailable (%s); relying on TTL expiry", e)
+                    return
+                if e.code in _HISTORY_LOST_CODES:
+                    logger.warning("Change stream history lost; clearing cache and restarting stream")
+                    self._resume_token = None
+                    entity_cache.clear()
+                else:
+                    logger.warning("Change stream error: %s", e)
+            except PyMongoError as e:
+                self.active = False
+                collection_versions.unfollow()
+                logger.warning("Change stream interrupted: %s", e)
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    async def _apply(self, change: Dict[str, Any]):
+        self.events += 1
+        operation = change.get("operationType")
+        collection = change.get("ns", {}).get("coll")
+        collection_versions.observe(collection, change["_id"], change.get("clusterTime"))
+        if operation in ("drop", "rename", "dropDatabase", "invalidate"):
+            entity_cache.clear()
+            return
+
+        if operation == "insert":
+            self._discard_negative(change)
+
+        tags = self._tags_for(change)
+        if tags:
+            await entity_cache.invalidate(*tags)
+
+    @staticmethod
+    def _discard_negative(change: Dict[str, Any]):
+        collection = change.get("ns", {}).get("coll")
+        if collection == "users":
+            user_id = (change.get("fullDocument") or {}).get("user_id")
+            if user_id:
+                negative_cache.discard("users", user_id)
+        elif collection in _NEGATIVE_NAMESPACES:
+            document_id = str(change.get("documentKey", {}).get("_id"))
+            negative_cache.discard(_NEGATIVE_NAMESPACES[collection], document_id)
+
+    @staticmethod
+    def _tags_for(change: Dict[str, Any]) -> List[str]:
+        collection = change.get("ns", {}).get("coll")
+        document_id = str(change.get("documentKey", {}).get("_id"))
+
+        if collection == "projects":
+            return [project_tag(document_id)]
+        if collection == "users":
+            full_document = change.get("fullDocument") or {}
+            if full_document.get("user_id"):
+                return [user_tag(full_document["user_id"])]
+            # Deletes only carry _id; drop all cached profiles instead
+            return [namespace_tag("user_public")]
+        return []
+
+    def stats(self) -> Dict[str, Any]:
+        return {"active": self.active, "events": self.events}
+
+
+# Global instance
+cache_invalidation_listener = CacheInvalidationListener()
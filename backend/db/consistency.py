@@ -0,0 +1,158 @@
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from fastapi import Depends
+from fastapi.security import HTTPAuthorizationCredentials
+from pymongo import monitoring
+from pymongo.asynchronous.client_session import AsyncClientSession
+from core.auth import AuthenticationError, bearer_scheme, resolve_identity
+from core.cache import TTLCache, _MISSING, register_read_scope, use_private_reads
+from core.config import settings
+from core.context import RequestContext, get_request_context
+from core.logging_config import get_logger
+from db.monitoring import WRITE_COMMANDS
+
+logger = get_logger(__name__)
+
+
+class CausalTokens:
+    """
+    Cluster and operation times of each user's latest write, kept for the
+    window in which a secondary may not have replicated it yet.
+    """
+
+    def __init__(self, max_entries: int, window: float):
+        self.window = window
+        self._entries = TTLCache(max_entries, window)
+
+    def record(self, user_id: str, cluster_time: Optional[Dict[str, Any]], operation_time: Any):
+        current = self._entries.get(user_id)
+        if current is not _MISSING and current[1] >= operation_time:
+            return
+        self._entries.set(user_id, (cluster_time, operation_time))
+
+    def get(self, user_id: str) -> Optional[Tuple[Optional[Dict[str, Any]], Any]]:
+        tokens = self._entries.get(user_id)
+        return None if tokens is _MISSING else tokens
+
+    def stats(self) -> Dict[str, Any]:
+        return self._entries.stats()
+
+
+# Global instance
+causal_tokens = CausalTokens(
+    max_entries=settings.READ_YOUR_WRITES_MAX_USERS,
+    window=settings.READ_YOUR_WRITES_WINDOW_SECONDS
+)
+
+
+class ReadState:
+    """
+    The authenticated user of a request and, once a secondary read needs
+    it, a causally consistent session advanced past the user's last write
+    and past `after_cluster_time`. `primary` keeps every read of the
+    request off secondaries.
+
+    Belongs to the task that created it, which ends the session. A task
+    that inherited it by copying the context (and may outlive the
+    request) must not use it; shared reads get their own (read_scope).
+    """
+
+    def __init__(self, user_id: Optional[str]):
+        self.user_id = user_id
+        self.session: Optional[AsyncClientSession] = None
+        self.after_cluster_time: Any = None
+        self.primary = False
+        self.owner = asyncio.current_task()
+
+    def owned(self) -> bool:
+        return self.owner is asyncio.current_task()
+
+    def read_after(self, cluster_time: Any):
+        """Secondary reads must see every write up to `cluster_time`; None means only the primary can tell."""
+        if cluster_time is None:
+            self.primary = True
+        elif self.after_cluster_time is None or cluster_time > self.after_cluster_time:
+            self.after_cluster_time = cluster_time
+
+
+_read_state: ContextVar[Optional[ReadState]] = ContextVar("read_state", default=None)
+
+
+def current_read_state() -> Optional[ReadState]:
+    return _read_state.get()
+
+
+async def track_causal_reads(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+    context: RequestContext = Depends(get_request_context)
+):
+    """
+    App-wide dependency: note who the request belongs to, so their writes
+    are recorded and their reads made consistent with them. A user with a
+    write in the window also skips coalesced and stale shared results,
+    which may have been read before the write reached a secondary.
+    """
+    user_id = None
+    if credentials and credentials.credentials:
+        try:
+            user_id = (await resolve_identity(credentials.credentials, context))["user_id"]
+        except AuthenticationError:
+            pass  # the route's own auth dependency reports it
+    if user_id is not None and causal_tokens.get(user_id) is not None:
+        use_private_reads()
+
+    state = ReadState(user_id)
+    _read_state.set(state)
+    try:
+        yield
+    finally:
+        if state.session is not None:
+            await state.session.end_session()
+
+
+def read_scope():
+    """
+    Read state for a coalesced or stale-refresh read. Taken in the request
+    that starts the read and entered in the read's own task, which runs in
+    a fresh context: the read keeps the request's floor (after_cluster_time,
+    primary) but opens and ends a session of its own, so the request can
+    return and end its session while the read still runs.
+    """
+    parent = current_read_state()
+
+    @asynccontextmanager
+    async def scope() -> AsyncIterator[None]:
+        state = ReadState(None)
+        if parent is not None:
+            state.after_cluster_time, state.primary = parent.after_cluster_time, parent.primary
+        _read_state.set(state)
+        try:
+            yield
+        finally:
+            if state.session is not None:
+                await state.session.end_session()
+    return scope()
+
+
+register_read_scope(read_scope)
+
+
+class CausalTokenListener(monitoring.CommandListener):
+    """Records the operation time of each successful write against the user who made it."""
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        if event.command_name not in WRITE_COMMANDS:
+            return
+        state = _read_state.get()
+        operation_time = event.reply.get("operationTime")
+        if state is None or state.user_id is None or operation_time is None:
+            return  # standalone servers report no operation time
+        causal_tokens.record(state.user_id, event.reply.get("$clusterTime"), operation_time)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        pass
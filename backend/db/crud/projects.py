@@ -1,14 +1,18 @@
 from typing import Optional, List, Dict, Any
 from datetime import timedelta
 from fastapi import HTTPException, status
+from pymongo import ReturnDocument
 from db.mongo import mongodb
 from core.utils import validate_object_id, build_search_query, utc_now
+from core.cache import entity_cache, negative_cache, request_coalescer, stale_cache, object_id_key, project_tag, user_tag
 from core.controller import to_model, to_model_list, execute_paginated_query
 from core.logging_config import get_logger
+from core.tracing import traced_methods
 from models.project import ProjectCreate, ProjectUpdate, Project, ProjectSummary
 
 logger = get_logger(__name__)
 
+@traced_methods
 class ProjectCRUD:
     
     async def create_project(self, project_data: ProjectCreate, user_id: str) -> Project:
@@ -34,15 +38,21 @@ class ProjectCRUD:
             if user_id not in project_dict["contributors"]:
                 project_dict["contributors"].append(user_id)
             result = await mongodb.projects.insert_one(project_dict)
+            negative_cache.discard("projects", str(result.inserted_id))
             created_project = await mongodb.projects.find_one({"_id": result.inserted_id})
             return to_model(Project, created_project)
         except Exception as e:
-            logger.error(f"Error creating project: {e}")
+            logger.error("Error creating project: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to create project"
             )
 
+    @negative_cache.guard("projects", normalize=object_id_key)
+    @entity_cache.cached("project", Project, tags=lambda project: [
+        project_tag(project.id),
+        *(user_tag(user_id) for user_id in {project.created_by, *project.contributors})
+    ])
     async def get_project_by_id(self, project_id: str) -> Optional[Project]:
         """Get project by ID"""
         try:
@@ -54,12 +64,16 @@ class ProjectCRUD:
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error fetching project {project_id}: {e}")
+            logger.error("Error fetching project %s: %s", project_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch project"
             )
 
+    @stale_cache.serve_stale("projects", collections=("projects",), when=lambda args: not any(
+        args[name] for name in ("tech_stack", "tags", "status", "search", "featured_only")
+    ))
+    @request_coalescer.coalesce("projects", collections=("projects",))
     async def get_projects(
         self,
         tech_stack: Optional[List[str]] = None,
@@ -77,11 +91,12 @@ class ProjectCRUD:
             sort_options = self._get_sort_options(sort)
             
             result = await execute_paginated_query(
-                mongodb.projects, 
+                mongodb.secondary("projects"), 
                 query=query, 
                 sort_options=sort_options, 
                 page=page, 
-                limit=limit
+                limit=limit,
+                session=mongodb.read_session()
             )
             
             project_summaries = to_model_list(ProjectSummary, result["documents"])
@@ -94,12 +109,14 @@ class ProjectCRUD:
                 "limit": result["limit"]
             }
         except Exception as e:
-            logger.error(f"Error fetching projects: {e}")
+            logger.error("Error fetching projects: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch projects"
             )
 
+    @stale_cache.serve_stale("trending_projects", collections=("projects",))
+    @request_coalescer.coalesce("trending_projects", collections=("projects",))
     async def get_trending_projects(self, limit: int = 10) -> List[ProjectSummary]:
         """Get trending projects based on upvotes and recency"""
         try:
@@ -124,16 +141,17 @@ class ProjectCRUD:
                 {"$sort": {"trending_score": -1}},
                 {"$limit": limit}
             ]
-            cursor = mongodb.projects.aggregate(pipeline)
+            cursor = await mongodb.secondary("projects").aggregate(pipeline, session=mongodb.read_session())
             projects = await cursor.to_list(length=None)
             return to_model_list(ProjectSummary, projects)
         except Exception as e:
-            logger.error(f"Error fetching trending projects: {e}")
+            logger.error("Error fetching trending projects: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch trending projects"
             )
 
+    @request_coalescer.coalesce("user_projects", collections=("projects",))
     async def get_user_projects(self, user_id: str, page: int = 1, limit: int = 10) -> Dict[str, Any]:
         """Get projects created by a specific user"""
         try:
@@ -158,7 +176,7 @@ class ProjectCRUD:
                 "limit": result["limit"]
             }
         except Exception as e:
-            logger.error(f"Error fetching user projects: {e}")
+            logger.error("Error fetching user projects: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch user projects"
@@ -168,7 +186,6 @@ class ProjectCRUD:
         """Update project (only by owner)"""
         try:
             object_id = validate_object_id(project_id)
-            await self._verify_ownership(object_id, user_id)
             update_dict = update_data.model_dump(exclude_none=True)
 
             for url_field in ["github_link", "demo_link", "report_url"]:
@@ -179,26 +196,30 @@ class ProjectCRUD:
                 update_dict["status"] = update_dict["status"].value
 
             if not update_dict:
+                await self._verify_ownership(object_id, user_id)
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="No valid fields to update"
                 )
             update_dict["updated_at"] = utc_now()
-            result = await mongodb.projects.update_one(
-                {"_id": object_id},
-                {"$set": update_dict}
+            # Ownership is part of the filter; only a miss needs a second lookup
+            updated_project = await mongodb.projects.find_one_and_update(
+                {"_id": object_id, "created_by": user_id},
+                {"$set": update_dict, "$inc": {"version": 1}},
+                return_document=ReturnDocument.AFTER
             )
-            if result.matched_count == 0:
+            if not updated_project:
+                await self._verify_ownership(object_id, user_id)
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Project not found"
                 )
-            updated_project = await mongodb.projects.find_one({"_id": object_id})
+            await entity_cache.invalidate(project_tag(str(object_id)))
             return to_model(Project, updated_project)
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error updating project {project_id}: {e}")
+            logger.error("Error updating project %s: %s", project_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to update project"
@@ -208,13 +229,15 @@ class ProjectCRUD:
         """Delete project (only by owner)"""
         try:
             object_id = validate_object_id(project_id)
-            await self._verify_ownership(object_id, user_id)
-            result = await mongodb.projects.delete_one({"_id": object_id})
+            result = await mongodb.projects.delete_one({"_id": object_id, "created_by": user_id})
+            if result.deleted_count == 0:
+                await self._verify_ownership(object_id, user_id)
+            await entity_cache.invalidate(project_tag(str(object_id)))
             return result.deleted_count > 0
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error deleting project {project_id}: {e}")
+            logger.error("Error deleting project %s: %s", project_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to delete project"
@@ -224,33 +247,31 @@ class ProjectCRUD:
         """Upvote a project (one per user)"""
         try:
             object_id = validate_object_id(project_id)
-            existing_upvote = await mongodb.projects.find_one({
-                "_id": object_id,
-                "upvoted_by": user_id
-            })
-            if existing_upvote:
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail="Already upvoted"
-                )
-            result = await mongodb.projects.update_one(
-                {"_id": object_id},
+            updated_project = await mongodb.projects.find_one_and_update(
+                {"_id": object_id, "upvoted_by": {"$ne": user_id}},
                 {
-                    "$inc": {"upvotes": 1},
-                    "$push": {"upvoted_by": user_id}
-                }
+                    "$inc": {"upvotes": 1, "version": 1},
+                    "$push": {"upvoted_by": user_id},
+                    "$set": {"updated_at": utc_now()}
+                },
+                return_document=ReturnDocument.AFTER
             )
-            if result.matched_count == 0:
+            if not updated_project:
+                if await mongodb.projects.find_one({"_id": object_id}, {"_id": 1}):
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail="Already upvoted"
+                    )
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Project not found"
                 )
-            updated_project = await mongodb.projects.find_one({"_id": object_id})
+            await entity_cache.invalidate(project_tag(str(object_id)))
             return to_model(Project, updated_project)
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error upvoting project {project_id}: {e}")
+            logger.error("Error upvoting project %s: %s", project_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to upvote project"
@@ -260,28 +281,26 @@ class ProjectCRUD:
         """Remove upvote from a project"""
         try:
             object_id = validate_object_id(project_id)
-            existing_upvote = await mongodb.projects.find_one({
-                "_id": object_id,
-                "upvoted_by": user_id
-            })
-            if not existing_upvote:
+            updated_project = await mongodb.projects.find_one_and_update(
+                {"_id": object_id, "upvoted_by": user_id},
+                {
+                    "$inc": {"upvotes": -1, "version": 1},
+                    "$pull": {"upvoted_by": user_id},
+                    "$set": {"updated_at": utc_now()}
+                },
+                return_document=ReturnDocument.AFTER
+            )
+            if not updated_project:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Haven't upvoted this project"
                 )
-            result = await mongodb.projects.update_one(
-                {"_id": object_id},
-                {
-                    "$inc": {"upvotes": -1},
-                    "$pull": {"upvoted_by": user_id}
-                }
-            )
-            updated_project = await mongodb.projects.find_one({"_id": object_id})
+            await entity_cache.invalidate(project_tag(str(object_id)))
             return to_model(Project, updated_project)
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error removing upvote from project {project_id}: {e}")
+            logger.error("Error removing upvote from project %s: %s", project_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to remove upvote"
@@ -291,22 +310,27 @@ class ProjectCRUD:
         """Add contributor to project (only by owner)"""
         try:
             object_id = validate_object_id(project_id)
-            project = await self._verify_ownership(object_id, owner_id)
-            if contributor_id in project.get("contributors", []):
+            updated_project = await mongodb.projects.find_one_and_update(
+                {"_id": object_id, "created_by": owner_id, "contributors": {"$ne": contributor_id}},
+                {
+                    "$push": {"contributors": contributor_id},
+                    "$set": {"updated_at": utc_now()},
+                    "$inc": {"version": 1}
+                },
+                return_document=ReturnDocument.AFTER
+            )
+            if not updated_project:
+                await self._verify_ownership(object_id, owner_id)
                 raise HTTPException(
                     status_code=status.HTTP_409_CONFLICT,
                     detail="User is already a contributor"
                 )
-            await mongodb.projects.update_one(
-                {"_id": object_id},
-                {"$push": {"contributors": contributor_id}}
-            )
-            updated_project = await mongodb.projects.find_one({"_id": object_id})
+            await entity_cache.invalidate(project_tag(str(object_id)))
             return to_model(Project, updated_project)
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error adding contributor to project {project_id}: {e}")
+            logger.error("Error adding contributor to project %s: %s", project_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to add contributor"
@@ -1,15 +1,19 @@
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timezone
 from fastapi import HTTPException, status
+from pymongo import ReturnDocument
 from db.mongo import mongodb
 from core.utils import validate_object_id, build_search_query, utc_now
+from core.cache import negative_cache, request_coalescer, stale_cache, object_id_key
 from core.controller import to_model, to_model_list, execute_paginated_query
 from core.logging_config import get_logger
+from core.tracing import traced_methods
 from models.request import TeammateRequestCreate, TeammateRequestUpdate, TeammateRequest, TeammateRequestPublic, TeammateRequestPublic
 
 logger = get_logger(__name__)
 
 
+@traced_methods
 class TeammateRequestCRUD:
 
     async def create_request(self, request_data: TeammateRequestCreate, user_id: str) -> TeammateRequest:
@@ -20,17 +24,19 @@ class TeammateRequestCRUD:
             request_dict["created_at"] = utc_now()
             
             result = await mongodb.teammate_requests.insert_one(request_dict)
+            negative_cache.discard("requests", str(result.inserted_id))
             
             created_request = await mongodb.teammate_requests.find_one({"_id": result.inserted_id})
             return to_model(TeammateRequest, created_request)
             
         except Exception as e:
-            logger.error(f"Error creating teammate request: {e}")
+            logger.error("Error creating teammate request: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to create teammate request"
             )
 
+    @negative_cache.guard("requests", normalize=object_id_key)
     async def get_request_by_id(self, request_id: str) -> Optional[TeammateRequest]:
         """Get teammate request by ID"""
         try:
@@ -40,12 +46,13 @@ class TeammateRequestCRUD:
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error fetching teammate request {request_id}: {e}")
+            logger.error("Error fetching teammate request %s: %s", request_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch teammate request"
             )
 
+    @request_coalescer.coalesce("requests", collections=("teammate_requests",))
     async def get_requests(
         self,
         tags: Optional[List[str]] = None,
@@ -84,7 +91,7 @@ class TeammateRequestCRUD:
             }
             
         except Exception as e:
-            logger.error(f"Error fetching teammate requests: {e}")
+            logger.error("Error fetching teammate requests: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch teammate requests"
@@ -110,7 +117,7 @@ class TeammateRequestCRUD:
             }
             
         except Exception as e:
-            logger.error(f"Error fetching user requests: {e}")
+            logger.error("Error fetching user requests: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch user requests"
@@ -121,46 +128,35 @@ class TeammateRequestCRUD:
         try:
             object_id = validate_object_id(request_id)
             
-            # Check ownership
-            request = await mongodb.teammate_requests.find_one({"_id": object_id})
-            if not request:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Teammate request not found"
-                )
-            
-            if request["user_id"] != user_id:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Only request owner can update the request"
-                )
-            
             # Convert to dict and filter out None values
             update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
             
             if not update_dict:
+                request = await self._verify_ownership(object_id, user_id, "update")
                 return to_model(TeammateRequest, request)
             
             update_dict["updated_at"] = utc_now()
             
-            result = await mongodb.teammate_requests.update_one(
-                {"_id": object_id},
-                {"$set": update_dict}
+            # Ownership is part of the filter; only a miss needs a second lookup
+            updated_request = await mongodb.teammate_requests.find_one_and_update(
+                {"_id": object_id, "user_id": user_id},
+                {"$set": update_dict, "$inc": {"version": 1}},
+                return_document=ReturnDocument.AFTER
             )
             
-            if result.matched_count == 0:
+            if not updated_request:
+                await self._verify_ownership(object_id, user_id, "update")
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Teammate request not found"
                 )
             
-            updated_request = await mongodb.teammate_requests.find_one({"_id": object_id})
             return to_model(TeammateRequest, updated_request)
             
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error updating teammate request {request_id}: {e}")
+            logger.error("Error updating teammate request %s: %s", request_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to update teammate request"
@@ -171,32 +167,21 @@ class TeammateRequestCRUD:
         try:
             object_id = validate_object_id(request_id)
             
-            # Check ownership
-            request = await mongodb.teammate_requests.find_one({"_id": object_id})
-            if not request:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Teammate request not found"
-                )
-            
-            if request["user_id"] != user_id:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Only request owner can delete the request"
-                )
-            
-            result = await mongodb.teammate_requests.delete_one({"_id": object_id})
+            result = await mongodb.teammate_requests.delete_one({"_id": object_id, "user_id": user_id})
+            if result.deleted_count == 0:
+                await self._verify_ownership(object_id, user_id, "delete")
             return result.deleted_count > 0
             
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error deleting teammate request {request_id}: {e}")
+            logger.error("Error deleting teammate request %s: %s", request_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to delete teammate request"
             )
 
+    @request_coalescer.coalesce("project_requests", collections=("teammate_requests", "projects"))
     async def get_requests_by_project(self, project_id: str, page: int = 1, limit: int = 10) -> Dict[str, Any]:
         """Get teammate requests for a specific project"""
         try:
@@ -228,43 +213,66 @@ class TeammateRequestCRUD:
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error fetching project requests: {e}")
+            logger.error("Error fetching project requests: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch project requests"
             )
 
+    @stale_cache.serve_stale("recent_requests", collections=("teammate_requests",))
+    @request_coalescer.coalesce("recent_requests", collections=("teammate_requests",))
     async def get_recent_requests(self, limit: int = 10) -> List[TeammateRequestPublic]:
         """Get most recent teammate requests"""
         try:
-            cursor = mongodb.teammate_requests.find({}).sort("created_at", -1).limit(limit)
+            cursor = mongodb.secondary("teammate_requests").find({}, session=mongodb.read_session())
+            cursor = cursor.sort("created_at", -1).limit(limit)
             requests = await cursor.to_list(length=None)
             public_requests = to_model_list(TeammateRequestPublic, requests)
             return public_requests
             
         except Exception as e:
-            logger.error(f"Error fetching recent requests: {e}")
+            logger.error("Error fetching recent requests: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch recent requests"
             )
 
+    @request_coalescer.coalesce("requests_by_tags", collections=("teammate_requests",))
     async def get_requests_by_tags(self, tags: List[str], limit: int = 10) -> List[TeammateRequestPublic]:
         """Get teammate requests matching specific tags"""
         try:
             query = {"tags": {"$in": tags}}
-            cursor = mongodb.teammate_requests.find(query).sort("created_at", -1).limit(limit)
+            cursor = mongodb.secondary("teammate_requests").find(query, session=mongodb.read_session())
+            cursor = cursor.sort("created_at", -1).limit(limit)
             requests = await cursor.to_list(length=None)
             public_requests = to_model_list(TeammateRequestPublic, requests)
             return public_requests
             
         except Exception as e:
-            logger.error(f"Error fetching requests by tags: {e}")
+            logger.error("Error fetching requests by tags: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch requests by tags"
             )
 
+    # Helper methods
+    async def _verify_ownership(self, object_id, user_id, action):
+        """Verify user owns the teammate request"""
+        request = await mongodb.teammate_requests.find_one({"_id": object_id})
+        if not request:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Teammate request not found"
+            )
+        
+        if request["user_id"] != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Only request owner can {action} the request"
+            )
+        
+        return request
+
 
 # Global instance
 teammate_request_crud = TeammateRequestCRUD()
\ No newline at end of file
@@ -1,16 +1,21 @@
 from typing import Optional, Dict, Any
+from bson import ObjectId
 from datetime import datetime, timezone
 from pymongo.errors import DuplicateKeyError
 from fastapi import HTTPException, status
+from pymongo import ReturnDocument
 from db.mongo import mongodb
 from core.utils import validate_object_id, utc_now
+from core.cache import request_coalescer
 from core.controller import to_model, execute_paginated_query
 from core.logging_config import get_logger
+from core.tracing import traced_methods
 from models.testimonial import TestimonialCreate, TestimonialUpdate, Testimonial, TestimonialWithUser, TestimonialWithProject
 
 logger = get_logger(__name__)
 
 
+@traced_methods
 class TestimonialCRUD:
 
     async def create_testimonial(self, testimonial_data: TestimonialCreate, from_user: str) -> Testimonial:
@@ -52,7 +57,7 @@ class TestimonialCRUD:
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error creating testimonial: {e}")
+            logger.error("Error creating testimonial: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to create testimonial"
@@ -67,12 +72,13 @@ class TestimonialCRUD:
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error fetching testimonial {testimonial_id}: {e}")
+            logger.error("Error fetching testimonial %s: %s", testimonial_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch testimonial"
             )
 
+    @request_coalescer.coalesce("testimonials", collections=("testimonials", "users"))
     async def get_all_testimonials(self, page: int = 1, limit: int = 10) -> Dict[str, Any]:
         """Get all testimonials with pagination"""
         try:
@@ -83,15 +89,13 @@ class TestimonialCRUD:
                 page=page, limit=limit
             )
             
+            user_names = await self._user_names(result["documents"])
             testimonials_with_info = []
             for testimonial in result["documents"]:
-                from_user = await mongodb.users.find_one({"user_id": testimonial["from_user"]})
-                from_user_name = from_user.get("name", "Unknown User") if from_user else "Unknown User"
-                
                 testimonial_with_user = TestimonialWithUser(
                     id=testimonial["id"],
                     from_user=testimonial["from_user"],
-                    from_user_name=from_user_name,
+                    from_user_name=user_names.get(testimonial["from_user"], "Unknown User"),
                     project_id=testimonial["project_id"],
                     content=testimonial["content"],
                     created_at=testimonial["created_at"]
@@ -107,7 +111,7 @@ class TestimonialCRUD:
             }
             
         except Exception as e:
-            logger.error(f"Error fetching testimonials: {e}")
+            logger.error("Error fetching testimonials: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch testimonials"
@@ -123,23 +127,17 @@ class TestimonialCRUD:
                 page=page, limit=limit
             )
             
-            # Enrich testimonials with project information
+            # Enrich testimonials with project and author names, one query each
+            project_titles = await self._project_titles(result["documents"])
+            user_names = await self._user_names(result["documents"])
             testimonials_with_info = []
             for testimonial in result["documents"]:
-                # Get project info
-                project = await mongodb.projects.find_one({"_id": validate_object_id(testimonial["project_id"])})
-                project_title = project.get("title", "Unknown Project") if project else "Unknown Project"
-                
-                # Get user info
-                from_user = await mongodb.users.find_one({"user_id": testimonial["from_user"]})
-                from_user_name = from_user.get("name", "Unknown User") if from_user else "Unknown User"
-                
                 testimonial_with_project = TestimonialWithProject(
                     id=testimonial["id"],
                     from_user=testimonial["from_user"],
-                    from_user_name=from_user_name,
+                    from_user_name=user_names.get(testimonial["from_user"], "Unknown User"),
                     project_id=testimonial["project_id"],
-                    project_title=project_title,
+                    project_title=project_titles.get(testimonial["project_id"], "Unknown Project"),
                     content=testimonial["content"],
                     created_at=testimonial["created_at"]
                 )
@@ -154,12 +152,13 @@ class TestimonialCRUD:
             }
             
         except Exception as e:
-            logger.error(f"Error fetching author testimonials: {e}")
+            logger.error("Error fetching author testimonials: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch author testimonials"
             )
 
+    @request_coalescer.coalesce("project_testimonials", collections=("testimonials", "users", "projects"))
     async def get_testimonials_by_project(self, project_id: str, page: int = 1, limit: int = 10) -> Dict[str, Any]:
         """Get testimonials for a specific project"""
         try:
@@ -179,15 +178,13 @@ class TestimonialCRUD:
                 page=page, limit=limit
             )
             
+            user_names = await self._user_names(result["documents"])
             testimonials_with_info = []
             for testimonial in result["documents"]:
-                from_user = await mongodb.users.find_one({"user_id": testimonial["from_user"]})
-                from_user_name = from_user.get("name", "Unknown User") if from_user else "Unknown User"
-                
                 testimonial_with_user = TestimonialWithUser(
                     id=testimonial["id"],
                     from_user=testimonial["from_user"],
-                    from_user_name=from_user_name,
+                    from_user_name=user_names.get(testimonial["from_user"], "Unknown User"),
                     project_id=testimonial["project_id"],
                     content=testimonial["content"],
                     created_at=testimonial["created_at"]
@@ -205,7 +202,7 @@ class TestimonialCRUD:
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error fetching project testimonials: {e}")
+            logger.error("Error fetching project testimonials: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch project testimonials"
@@ -216,47 +213,36 @@ class TestimonialCRUD:
         try:
             object_id = validate_object_id(testimonial_id)
             
-            # Check if user is the author
-            testimonial = await mongodb.testimonials.find_one({"_id": object_id})
-            if not testimonial:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Testimonial not found"
-                )
-            
-            if testimonial["from_user"] != user_id:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Only testimonial author can update it"
-                )
-            
             update_dict = {}
             if update_data.content is not None:
                 update_dict["content"] = update_data.content
             
             if not update_dict:
+                testimonial = await self._verify_author(object_id, user_id, "update")
                 return to_model(Testimonial, testimonial)
             
             update_dict["updated_at"] = utc_now()
             
-            result = await mongodb.testimonials.update_one(
-                {"_id": object_id},
-                {"$set": update_dict}
+            # Authorship is part of the filter; only a miss needs a second lookup
+            updated_testimonial = await mongodb.testimonials.find_one_and_update(
+                {"_id": object_id, "from_user": user_id},
+                {"$set": update_dict, "$inc": {"version": 1}},
+                return_document=ReturnDocument.AFTER
             )
             
-            if result.matched_count == 0:
+            if not updated_testimonial:
+                await self._verify_author(object_id, user_id, "update")
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Testimonial not found"
                 )
             
-            updated_testimonial = await mongodb.testimonials.find_one({"_id": object_id})
             return to_model(Testimonial, updated_testimonial)
             
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error updating testimonial {testimonial_id}: {e}")
+            logger.error("Error updating testimonial %s: %s", testimonial_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to update testimonial"
@@ -267,31 +253,56 @@ class TestimonialCRUD:
         try:
             object_id = validate_object_id(testimonial_id)
             
-            # Check if user is the author
-            testimonial = await mongodb.testimonials.find_one({"_id": object_id})
-            if not testimonial:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Testimonial not found"
-                )
-            
-            if testimonial["from_user"] != user_id:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Only testimonial author can delete it"
-                )
-            
-            result = await mongodb.testimonials.delete_one({"_id": object_id})
+            result = await mongodb.testimonials.delete_one({"_id": object_id, "from_user": user_id})
+            if result.deleted_count == 0:
+                await self._verify_author(object_id, user_id, "delete")
             return result.deleted_count > 0
             
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error deleting testimonial {testimonial_id}: {e}")
+            logger.error("Error deleting testimonial %s: %s", testimonial_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to delete testimonial"
             )
+    # Helper methods
+    async def _user_names(self, testimonials) -> Dict[str, str]:
+        """Names of the testimonials' authors, in one query rather than one per testimonial"""
+        user_ids = list({testimonial["from_user"] for testimonial in testimonials})
+        if not user_ids:
+            return {}
+        users = await mongodb.users.find(
+            {"user_id": {"$in": user_ids}}, {"_id": 0, "user_id": 1, "name": 1}
+        ).to_list(length=None)
+        return {user["user_id"]: user.get("name", "Unknown User") for user in users}
+
+    async def _project_titles(self, testimonials) -> Dict[str, str]:
+        """Titles of the testimonials' projects, in one query"""
+        project_ids = {testimonial["project_id"] for testimonial in testimonials}
+        object_ids = [ObjectId(project_id) for project_id in project_ids if ObjectId.is_valid(project_id)]
+        if not object_ids:
+            return {}
+        projects = await mongodb.projects.find({"_id": {"$in": object_ids}}, {"title": 1}).to_list(length=None)
+        return {str(project["_id"]): project.get("title", "Unknown Project") for project in projects}
+
+    async def _verify_author(self, object_id, user_id, action):
+        """Verify user is the author of the testimonial"""
+        testimonial = await mongodb.testimonials.find_one({"_id": object_id})
+        if not testimonial:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Testimonial not found"
+            )
+        
+        if testimonial["from_user"] != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Only testimonial author can {action} it"
+            )
+        
+        return testimonial
+
 
 # Global instance
 testimonial_crud = TestimonialCRUD()
\ No newline at end of file
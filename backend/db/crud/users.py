@@ -2,15 +2,35 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime, timezone
 from pymongo.errors import DuplicateKeyError
 from fastapi import HTTPException, status
+from db.jobs import Job, job_runner
+from db.migrations.runner import migration_runner
 from db.mongo import mongodb
 from core.utils import utc_now
+from core.cache import entity_cache, negative_cache, request_coalescer, user_tag
+from core.config import settings
 from core.controller import to_model, to_model_list, execute_paginated_query
 from core.logging_config import get_logger
+from core.tracing import traced_methods
 from models.user import UserUpdate, UserInit, User, UserPublic
 
 logger = get_logger(__name__)
 
+# Backfills `active` on users written before the flag existed
+ACTIVE_FLAG_MIGRATION = "m0001_active_flag"
 
+
+def active_filter() -> Any:
+    """
+    Condition on `active` that matches active users. `True` lets the
+    (user_id, active) partial index answer, but misses users without the
+    flag, so until the backfill is complete those count as active too.
+    """
+    if migration_runner.is_complete(ACTIVE_FLAG_MIGRATION):
+        return True
+    return {"$ne": False}
+
+
+@traced_methods
 class UserCRUD:
 
     async def init_user(self, user_data: UserInit, user_id: str, email: str) -> User:
@@ -22,8 +42,10 @@ class UserCRUD:
             user_dict["created_at"] = utc_now()
             user_dict["updated_at"] = utc_now()
             user_dict["active"] = True
-            result = await mongodb.users.insert_one(user_dict)
-            created_user = await mongodb.users.find_one({"_id": result.inserted_id})
+            # insert_one sets "_id" on user_dict, so no read-back is needed
+            await mongodb.users.insert_one(user_dict)
+            negative_cache.discard("users", user_id)
+            created_user = user_dict
             # Ensure created_at and updated_at are valid datetimes and format as ISO 8601 Z
             for field in ("created_at", "updated_at"):
                 if field in created_user:
@@ -42,7 +64,7 @@ class UserCRUD:
                 detail="User already initialized"
             )
         except Exception as e:
-            logger.error(f"Error initializing user: {e}")
+            logger.error("Error initializing user: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to initialize user"
@@ -53,7 +75,7 @@ class UserCRUD:
         try:
             user = await mongodb.users.find_one({
                 "user_id": user_id,
-                "active": {"$ne": False}
+                "active": active_filter()
             })
             if user:
                 for field in ("created_at", "updated_at"):
@@ -68,18 +90,20 @@ class UserCRUD:
                 return to_model(User, user)
             return None
         except Exception as e:
-            logger.error(f"Error fetching user {user_id}: {e}")
+            logger.error("Error fetching user %s: %s", user_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch user"
             )
 
+    @negative_cache.guard("users")
+    @entity_cache.cached("user_public", UserPublic, tags=lambda user: [user_tag(user.user_id)])
     async def get_user_public(self, user_id: str) -> Optional[UserPublic]:
         """Get public user profile"""
         try:
             user = await mongodb.users.find_one({
                 "user_id": user_id,
-                "active": {"$ne": False}
+                "active": active_filter()
             })
             if user:
                 for field in ("created_at", "updated_at"):
@@ -94,7 +118,7 @@ class UserCRUD:
                 return to_model(UserPublic, user)
             return None
         except Exception as e:
-            logger.error(f"Error fetching public user {user_id}: {e}")
+            logger.error("Error fetching public user %s: %s", user_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch user"
@@ -113,8 +137,8 @@ class UserCRUD:
             update_dict["updated_at"] = utc_now()
             
             result = await mongodb.users.update_one(
-                {"user_id": user_id, "active": {"$ne": False}},
-                {"$set": update_dict}
+                {"user_id": user_id, "active": active_filter()},
+                {"$set": update_dict, "$inc": {"version": 1}}
             )
             
             if result.matched_count == 0:
@@ -123,52 +147,106 @@ class UserCRUD:
                     detail="User not found"
                 )
             
+            await entity_cache.invalidate(user_tag(user_id))
             return await self.get_user_by_id(user_id)
             
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error updating user {user_id}: {e}")
+            logger.error("Error updating user %s: %s", user_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to update user"
             )
 
-    async def delete_user(self, user_id: str) -> bool:
-        """Hard delete user and all associated records"""
+    async def delete_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Deactivate the user at once and queue the cascade that deletes their
+        records. Returns the deletion job, or None when there is no such user;
+        asking again while a deletion is under way returns the same job.
+        """
         try:
-            # Delete user's projects
-            await mongodb.projects.delete_many({"created_by": user_id})
+            # Also deactivates users m0001_active_flag has not reached yet
+            result = await mongodb.users.update_one(
+                {"user_id": user_id, "active": {"$ne": False}},
+                {"$set": {"active": False, "updated_at": utc_now()}, "$inc": {"version": 1}}
+            )
+            if result.matched_count == 0:
+                # Already deactivated, e.g. by a deletion whose job failed; queue it again
+                if await mongodb.users.find_one({"user_id": user_id}, {"_id": 1}) is None:
+                    return await job_runner.find_unfinished(f"delete_user:{user_id}")
             
-            # Remove user from contributors in other projects
+            await entity_cache.invalidate(user_tag(user_id))
+            return await job_runner.enqueue(
+                "delete_user",
+                {"user_id": user_id},
+                owner_id=user_id,
+                dedupe_key=f"delete_user:{user_id}"
+            )
+            
+        except Exception as e:
+            logger.error("Error deleting user %s: %s", user_id, e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to delete user"
+            )
+
+    async def _delete_user_job(self, job: Job):
+        """Job handler: hard delete a deactivated user and all associated records."""
+        user_id = job.payload["user_id"]
+        
+        if settings.ACCOUNT_DELETE_TRANSACTION and await mongodb.supports_transactions():
+            await job.step("cascade", lambda: self._delete_user_transaction(user_id))
+        else:
+            # Each step is a throttled batch loop that only finds what is left to do
+            await job.step("projects", lambda: job.delete_many(mongodb.projects, {"created_by": user_id}))
+            await job.step("contributors", lambda: job.update_many(
+                mongodb.projects,
+                {"contributors": user_id},
+                {
+                    "$pull": {"contributors": user_id},
+                    "$set": {"updated_at": utc_now()},
+                    "$inc": {"version": 1}
+                }
+            ))
+            await job.step("testimonials", lambda: job.delete_many(mongodb.testimonials, {"from_user": user_id}))
+            await job.step("requests", lambda: job.delete_many(mongodb.teammate_requests, {
+                "$or": [
+                    {"user_id": user_id},
+                    {"requested_by": user_id}
+                ]
+            }))
+            # Last, so a failed cascade leaves the deactivated user to retry from
+            await job.step("user", lambda: mongodb.users.delete_one({"user_id": user_id}))
+        
+        # Drops the profile and every cached project owned by or listing the user
+        await entity_cache.invalidate(user_tag(user_id))
+
+    async def _delete_user_transaction(self, user_id: str):
+        async def cascade(session):
+            await mongodb.projects.delete_many({"created_by": user_id}, session=session)
             await mongodb.projects.update_many(
                 {"contributors": user_id},
-                {"$pull": {"contributors": user_id}}
+                {
+                    "$pull": {"contributors": user_id},
+                    "$set": {"updated_at": utc_now()},
+                    "$inc": {"version": 1}
+                },
+                session=session
             )
-            
-            # Delete user's testimonials (given by this user)
-            await mongodb.testimonials.delete_many({"from_user": user_id})
-            
-            # Delete user's teammate requests
+            await mongodb.testimonials.delete_many({"from_user": user_id}, session=session)
             await mongodb.teammate_requests.delete_many({
                 "$or": [
                     {"user_id": user_id},
                     {"requested_by": user_id}
                 ]
-            })
-            
-            # Finally, delete the user record
-            result = await mongodb.users.delete_one({"user_id": user_id})
-            
-            return result.deleted_count > 0
-            
-        except Exception as e:
-            logger.error(f"Error hard deleting user {user_id}: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to delete user"
-            )
+            }, session=session)
+            await mongodb.users.delete_one({"user_id": user_id}, session=session)
+        
+        async with mongodb.client.start_session() as session:
+            await session.with_transaction(cascade)
 
+    @request_coalescer.coalesce("user_search", collections=("users",))
     async def search_users(
         self,
         search_term: Optional[str] = None,
@@ -180,7 +258,7 @@ class UserCRUD:
     ) -> Dict[str, Any]:
         """Search users with filters and pagination"""
         try:
-            query = {"active": {"$ne": False}}
+            query = {"active": active_filter()}
             
             # Build search query
             if search_term:
@@ -199,7 +277,9 @@ class UserCRUD:
                 query["grad_year"] = grad_year
             
             # Use standardized paginated query
-            result = await execute_paginated_query(mongodb.users, query, page=page, limit=limit)
+            result = await execute_paginated_query(
+                mongodb.secondary("users"), query, page=page, limit=limit, session=mongodb.read_session()
+            )
             users_public = to_model_list(UserPublic, result["documents"])
             
             return {
@@ -211,34 +291,46 @@ class UserCRUD:
             }
             
         except Exception as e:
-            logger.error(f"Error searching users: {e}")
+            logger.error("Error searching users: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to search users"
             )
 
+    @negative_cache.guard("users", missing=False)
     async def user_exists(self, user_id: str) -> bool:
         """Check if user exists and is active"""
         try:
-            count = await mongodb.users.count_documents({
-                "user_id": user_id,
-                "active": {"$ne": False}
-            })
-            return count > 0
+            # Answered from the (user_id, active) partial index alone once the flag is backfilled
+            user = await mongodb.users.find_one(
+                {"user_id": user_id, "active": active_filter()},
+                {"_id": 0, "user_id": 1}
+            )
+            return user is not None
         except Exception as e:
-            logger.error(f"Error checking user existence {user_id}: {e}")
-            return False
+            # Raised rather than answered False, which the guard would cache as a miss
+            logger.error("Error checking user existence %s: %s", user_id, e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to check user"
+            )
 
     async def get_user_stats(self, user_id: str) -> Dict[str, int]:
         """Get user statistics"""
         try:
-            projects_count = await mongodb.projects.count_documents({"created_by": user_id})
-            contributed_count = await mongodb.projects.count_documents({
+            session = mongodb.read_session()
+            projects = mongodb.secondary("projects")
+            projects_count = await projects.count_documents({"created_by": user_id}, session=session)
+            contributed_count = await projects.count_documents({
                 "contributors": user_id,
                 "created_by": {"$ne": user_id}
-            })
-            testimonials_count = await mongodb.testimonials.count_documents({"from_user": user_id})
-            requests_count = await mongodb.teammate_requests.count_documents({"user_id": user_id})
+            }, session=session)
+            testimonials_count = await mongodb.secondary("testimonials").count_documents(
+                {"from_user": user_id}, session=session
+            )
+            requests_count = await mongodb.secondary("teammate_requests").count_documents(
+                {"user_id": user_id}, session=session
+            )
             
             return {
                 "projects_created": projects_count,
@@ -248,7 +340,7 @@ class UserCRUD:
             }
             
         except Exception as e:
-            logger.error(f"Error fetching user stats {user_id}: {e}")
+            logger.error("Error fetching user stats %s: %s", user_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch user statistics"
@@ -256,4 +348,5 @@ class UserCRUD:
 
 
 # Global instance
-user_crud = UserCRUD()
\ No newline at end of file
+user_crud = UserCRUD()
+job_runner.register("delete_user", user_crud._delete_user_job)
\ No newline at end of file
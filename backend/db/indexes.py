@@ -0,0 +1,353 @@
+"""
+Versioned index manifest.
+
+The indexes every collection should have are declared in INDEXES. On
+startup a background task (or `python -m db.indexes apply`) diffs them
+against the live indexes and builds what is missing, one index at a time,
+while the API keeps serving. A lease in the `schema_meta` collection makes
+sure only one process builds at a time, and the applied manifest version
+is recorded there.
+
+Bump MANIFEST_VERSION whenever INDEXES changes.
+
+    python -m db.indexes plan                  # show the diff, change nothing
+    python -m db.indexes apply                 # build missing indexes
+    python -m db.indexes apply --drop-unused   # also drop unmanaged, unused indexes
+"""
+import argparse
+import asyncio
+import json
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from core.config import settings
+from core.logging_config import get_logger
+from core.utils import utc_now
+from db.leases import META_COLLECTION, Lease, process_owner
+from db.mongo import mongodb
+
+logger = get_logger(__name__)
+
+MANIFEST_VERSION = 5
+
+# Compound indexes follow equality, sort, range: the filtered field first,
+# then the sort key, so paginated lists read the page straight off the index.
+# Indexes a compound one now prefixes are left out; `apply --drop-unused`
+# removes them once they stop being used. `python -m db.query_plans`
+# checks every CRUD query against this manifest.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+        # Active users only; covers existence checks without touching documents
+        IndexModel([("user_id", ASCENDING), ("active", ASCENDING)], partialFilterExpression={"active": True}),
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("skills", ASCENDING)]),
+        IndexModel([("institute", ASCENDING)]),
+        IndexModel([("grad_year", ASCENDING)]),
+    ],
+    "projects": [
+        IndexModel([("created_by", ASCENDING), ("created_at", DESCENDING)]),
+        # get_user_stats: contributors equality, created_by $ne bounded in the index
+        IndexModel([("contributors", ASCENDING), ("created_by", ASCENDING)]),
+        IndexModel([("tech_stack", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("tags", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+        IndexModel([("upvotes", DESCENDING), ("created_at", DESCENDING)]),
+        # Only a handful of projects are featured; the rest need no entry
+        IndexModel(
+            [("featured", ASCENDING), ("created_at", DESCENDING)],
+            partialFilterExpression={"featured": True}
+        ),
+        IndexModel([("title", TEXT), ("abstract", TEXT)]),
+    ],
+    "teammate_requests": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("project_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("tags", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    "testimonials": [
+        IndexModel([("from_user", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("project_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("from_user", ASCENDING), ("project_id", ASCENDING)], unique=True),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    "jobs": [
+        IndexModel([("state", ASCENDING), ("run_after", ASCENDING)]),
+        IndexModel([("dedupe_key", ASCENDING), ("state", ASCENDING)]),
+        # At most one unfinished job per dedupe key; the field is unset when the job finishes
+        IndexModel(
+            [("active_dedupe_key", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"active_dedupe_key": {"$exists": True}}
+        ),
+        IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=settings.JOB_RETENTION_DAYS * 86400),
+    ],
+    # MongoRateLimitStore: a key's document expires once its arrival time has passed
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+}
+
+META_ID = "indexes"
+# Options that make two indexes with the same name different indexes
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+@dataclass
+class IndexPlan:
+    create: Dict[str, List[IndexModel]] = field(default_factory=dict)
+    # Same name as a manifest index but different options; rebuilt
+    changed: Dict[str, List[IndexModel]] = field(default_factory=dict)
+    # Live indexes the manifest does not declare, with their $indexStats
+    unmanaged: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.create or self.changed)
+
+    def summary(self) -> Dict[str, Any]:
+        def names(models: Dict[str, List[IndexModel]]):
+            return {coll: [model.document["name"] for model in items] for coll, items in models.items()}
+        return {
+            "create": names(self.create),
+            "changed": names(self.changed),
+            "unmanaged": self.unmanaged,
+        }
+
+
+def _options(spec: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: spec.get(name) for name in _COMPARED_OPTIONS if spec.get(name) not in (None, False)}
+
+
+def _standin_name(model: IndexModel) -> str:
+    return f"{model.document['name']}_rebuild"
+
+
+def _standin(model: IndexModel) -> Optional[IndexModel]:
+    """
+    Non-unique index that serves the same queries as `model` while it is
+    rebuilt: the same keys with a trailing _id, so its key pattern differs
+    from both the old and the new index. A collection has at most one text
+    index, so text indexes get none and are rebuilt in place.
+    """
+    keys = list(model.document["key"].items())
+    if any(direction == TEXT for _, direction in keys) or any(field_name == "_id" for field_name, _ in keys):
+        return None
+    options = {"name": _standin_name(model)}
+    if "partialFilterExpression" in model.document:
+        options["partialFilterExpression"] = model.document["partialFilterExpression"]
+    return IndexModel(keys + [("_id", ASCENDING)], **options)
+
+
+async def _index_usage(collection) -> Dict[str, Dict[str, Any]]:
+    usage = {}
+    try:
+        async for stats in await collection.aggregate([{"$indexStats": {}}]):
+            usage[stats["name"]] = {"ops": stats["accesses"]["ops"], "since": stats["accesses"]["since"]}
+    except Exception as e:
+        logger.warning("$indexStats unavailable for %s: %s", collection.name, e)
+    return usage
+
+
+async def plan(db) -> IndexPlan:
+    """Diff INDEXES against the live indexes."""
+    result = IndexPlan()
+    for name, models in INDEXES.items():
+        collection = db[name]
+        live = await collection.index_information()
+        declared = {model.document["name"]: model for model in models}
+
+        for index_name, model in declared.items():
+            if index_name not in live:
+                result.create.setdefault(name, []).append(model)
+            elif _options(live[index_name]) != _options(model.document):
+                result.changed.setdefault(name, []).append(model)
+
+        extra = [index_name for index_name in live if index_name != "_id_" and index_name not in declared]
+        if extra:
+            usage = await _index_usage(collection)
+            result.unmanaged[name] = [{"name": index_name, **usage.get(index_name, {})} for index_name in extra]
+    return result
+
+
+class IndexManager:
+    """Applies the manifest under a lease, from the API process or the CLI."""
+
+    def __init__(self, lease_seconds: float, unused_after_days: int):
+        self.lease_seconds = lease_seconds
+        self.unused_after_days = unused_after_days
+        self.owner = process_owner()
+        self._task: Optional[asyncio.Task] = None
+        self.applied_version: Optional[int] = None
+        self.pending = 0
+        self.built = 0
+        self.failed = 0
+
+    async def apply(self, db, drop_unused: bool = False) -> Optional[IndexPlan]:
+        """Build what the manifest is missing. Returns None when another process holds the lease."""
+        lease = Lease(db, META_ID, self.owner, self.lease_seconds)
+        if not await lease.acquire():
+            logger.info("Index build lease held by another process; skipping")
+            return None
+        # A single build can outlast the lease, so it is renewed on a timer
+        renewal = asyncio.create_task(self._renew(lease), name="index-lease")
+        failed = self.failed
+        try:
+            diff = await plan(db)
+            self.pending = sum(map(len, diff.create.values())) + sum(map(len, diff.changed.values()))
+
+            # One build at a time keeps the load on the server bounded
+            for name, models in diff.changed.items():
+                for model in models:
+                    await self._rebuild(db[name], model)
+                    self.pending -= 1
+
+            for name, models in diff.create.items():
+                leftovers = {index["name"] for index in diff.unmanaged.get(name, [])}
+                for model in models:
+                    if await self._build(db[name], model) and _standin_name(model) in leftovers:
+                        # Stand-in of an earlier rebuild whose build failed
+                        await db[name].drop_index(_standin_name(model))
+                    self.pending -= 1
+
+            if drop_unused:
+                await self._drop_unused(db, diff)
+
+            if self.failed > failed:
+                # Left unrecorded so the next run diffs and retries
+                logger.warning("Index manifest %d not applied: %d builds failed", MANIFEST_VERSION, self.failed - failed)
+                return diff
+            await db[META_COLLECTION].update_one({"_id": META_ID}, {"$set": {
+                "version": MANIFEST_VERSION,
+                "applied_at": utc_now(),
+                "applied_by": self.owner,
+                "manifest": {name: [model.document["name"] for model in models] for name, models in INDEXES.items()},
+            }})
+            self.applied_version = MANIFEST_VERSION
+            return diff
+        finally:
+            renewal.cancel()
+            await lease.release()
+
+    async def _renew(self, lease: Lease):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await lease.renew()
+            except Exception as e:
+                logger.warning("Renewing the index build lease failed: %s", e)
+
+    async def _build(self, collection, model: IndexModel) -> bool:
+        index_name = model.document["name"]
+        try:
+            await collection.create_indexes([model])
+        except Exception as e:
+            self.failed += 1
+            logger.error("Building index %s.%s failed: %s", collection.name, index_name, e)
+            return False
+        self.built += 1
+        logger.info("Built index %s.%s", collection.name, index_name)
+        return True
+
+    async def _rebuild(self, collection, model: IndexModel):
+        """
+        Replace an index whose options changed. The old index keeps serving
+        until a stand-in covering the same queries is built; only then is it
+        dropped and rebuilt under its own name, and the stand-in dropped once
+        that build succeeds. A failed rebuild leaves the stand-in in place.
+        """
+        index_name = model.document["name"]
+        logger.info("Rebuilding index %s.%s with new options", collection.name, index_name)
+        standin = _standin(model)
+        if standin is not None:
+            try:
+                await collection.create_indexes([standin])
+            except Exception as e:
+                self.failed += 1
+                logger.error("Building stand-in for %s.%s failed; keeping the old index: %s", collection.name, index_name, e)
+                return
+        await collection.drop_index(index_name)
+        if await self._build(collection, model) and standin is not None:
+            await collection.drop_index(standin.document["name"])
+
+    async def _drop_unused(self, db, diff: IndexPlan):
+        """
+        Drop unmanaged indexes with no recorded use for `unused_after_days`.
+        $indexStats counts are per member and reset on restart, so an index
+        only qualifies once its counters are at least that old. With
+        secondary reads on, an index idle on the member answering here may
+        still serve reads on another, so nothing is dropped.
+        """
+        if settings.SECONDARY_READS_ENABLED:
+            logger.warning("Not dropping unused indexes: $indexStats covers one member and SECONDARY_READS_ENABLED is on")
+            return
+        cutoff = utc_now() - timedelta(days=self.unused_after_days)
+        for name, indexes in diff.unmanaged.items():
+            for index in indexes:
+                since = index.get("since")
+                if index.get("ops") != 0 or since is None or since.replace(tzinfo=cutoff.tzinfo) > cutoff:
+                    continue
+                logger.info("Dropping unused index %s.%s", name, index["name"])
+                await db[name].drop_index(index["name"])
+
+    def start(self):
+        """Apply in the background once the API is serving."""
+        if settings.INDEX_AUTO_APPLY and self._task is None:
+            self._task = asyncio.create_task(self._run(), name="index-manager")
+
+    async def _run(self):
+        try:
+            await asyncio.sleep(settings.INDEX_BUILD_DELAY_SECONDS)
+            await self.apply(mongodb.db, drop_unused=settings.INDEX_DROP_UNUSED)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Never fatal: the API works without new indexes, just slower
+            logger.error("Applying index manifest failed: %s", e)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "manifest_version": MANIFEST_VERSION,
+            "applied_version": self.applied_version or 0,
+            "pending": self.pending,
+            "built": self.built,
+            "failed": self.failed,
+        }
+
+
+# Global instance
+index_manager = IndexManager(
+    lease_seconds=settings.INDEX_BUILD_LEASE_SECONDS,
+    unused_after_days=settings.INDEX_UNUSED_AFTER_DAYS
+)
+
+
+async def _main(args: argparse.Namespace):
+    await mongodb.connect()
+    try:
+        if args.command == "plan":
+            print(json.dumps((await plan(mongodb.db)).summary(), indent=2, default=str))
+        else:
+            diff = await index_manager.apply(mongodb.db, drop_unused=args.drop_unused)
+            print("lease held by another process" if diff is None else json.dumps(diff.summary(), indent=2, default=str))
+    finally:
+        await mongodb.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Diff or apply the index manifest")
+    parser.add_argument("command", choices=("plan", "apply"))
+    parser.add_argument("--drop-unused", action="store_true", help="drop unmanaged indexes unused for INDEX_UNUSED_AFTER_DAYS")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,291 @@
+import asyncio
+import random
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from core.config import settings
+from core.logging_config import get_logger
+from core.utils import utc_now
+from db.leases import process_owner
+from db.mongo import mongodb
+
+logger = get_logger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+UNFINISHED = [QUEUED, RUNNING]
+
+
+class Job:
+    """
+    A claimed job as its handler sees it. Handlers are made of named steps;
+    each finished step is recorded, so a retried job skips the steps an
+    earlier attempt completed. Steps must be safe to repeat, since an
+    attempt can die after a step's writes but before it is recorded.
+    """
+
+    def __init__(self, runner: "JobRunner", document: Dict[str, Any]):
+        self.runner = runner
+        self.id: ObjectId = document["_id"]
+        self.type: str = document["type"]
+        self.payload: Dict[str, Any] = document.get("payload", {})
+        self.attempts: int = document.get("attempts", 0)
+        self.steps_done: List[str] = list(document.get("steps_done", []))
+
+    async def step(self, name: str, func: Callable[[], Awaitable[Any]]):
+        if name in self.steps_done:
+            return
+        await func()
+        self.steps_done.append(name)
+        await mongodb.jobs.update_one(
+            {"_id": self.id, "lease_owner": self.runner.owner},
+            {"$addToSet": {"steps_done": name}, "$set": {"updated_at": utc_now()}}
+        )
+        await self.heartbeat()
+
+    async def heartbeat(self):
+        """Extend the lease; long steps call this between batches."""
+        await mongodb.jobs.update_one(
+            {"_id": self.id, "lease_owner": self.runner.owner},
+            {"$set": {"lease_expires": utc_now() + timedelta(seconds=self.runner.lease_seconds)}}
+        )
+
+    async def delete_many(self, collection, query: Dict[str, Any]) -> int:
+        """delete_many in throttled batches; matching documents leave the query as they go."""
+        deleted = 0
+        while True:
+            ids = await self._next_batch(collection, query)
+            if not ids:
+                return deleted
+            result = await collection.delete_many({"_id": {"$in": ids}, **query})
+            deleted += result.deleted_count
+            await self._pause()
+
+    async def update_many(self, collection, query: Dict[str, Any], update: Dict[str, Any]) -> int:
+        """update_many in throttled batches; `update` must take documents out of `query`."""
+        modified = 0
+        while True:
+            ids = await self._next_batch(collection, query)
+            if not ids:
+                return modified
+            result = await collection.update_many({"_id": {"$in": ids}, **query}, update)
+            modified += result.modified_count
+            await self._pause()
+
+    async def _next_batch(self, collection, query: Dict[str, Any]) -> List[ObjectId]:
+        cursor = collection.find(query, {"_id": 1}).limit(self.runner.batch_size)
+        return [doc["_id"] for doc in await cursor.to_list(length=None)]
+
+    async def _pause(self):
+        await self.heartbeat()
+        await asyncio.sleep(self.runner.batch_pause)
+
+
+Handler = Callable[[Job], Awaitable[None]]
+
+
+class JobRunner:
+    """
+    Durable background jobs for work too slow or too side-effect-heavy for
+    a request, queued in the `jobs` collection.
+
+    Workers claim due jobs with a lease that they renew while working; a
+    job whose worker died is claimed again once its lease expires. Failed
+    attempts are retried with exponential backoff and jitter up to
+    `max_attempts`, after which the job is marked failed with its last
+    error. Finished jobs expire after JOB_RETENTION_DAYS (TTL index).
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        poll_interval: float,
+        lease_seconds: float,
+        max_attempts: int,
+        backoff_base: float,
+        backoff_max: float,
+        batch_size: int,
+        batch_pause: float
+    ):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.owner = process_owner()
+        self._handlers: Dict[str, Handler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wake = asyncio.Event()
+        self.running = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.failed = 0
+
+    def register(self, job_type: str, handler: Handler):
+        self._handlers[job_type] = handler
+
+    async def enqueue(
+        self,
+        job_type: str,
+        payload: Dict[str, Any],
+        owner_id: Optional[str] = None,
+        dedupe_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Queue a job; with a dedupe_key, an unfinished job with the same key is returned instead."""
+        now = utc_now()
+        job = {
+            "type": job_type,
+            "payload": payload,
+            "owner_id": owner_id,
+            "dedupe_key": dedupe_key,
+            "state": QUEUED,
+            "attempts": 0,
+            "steps_done": [],
+            "run_after": now,
+            "created_at": now,
+            "updated_at": now,
+        }
+        if dedupe_key is not None:
+            # Unique while the job is unfinished, so concurrent callers cannot both insert
+            job["active_dedupe_key"] = dedupe_key
+        while True:
+            if dedupe_key is not None:
+                existing = await self.find_unfinished(dedupe_key)
+                if existing is not None:
+                    return existing
+            try:
+                await mongodb.jobs.insert_one(job)
+            except DuplicateKeyError:
+                job.pop("_id", None)
+                continue  # lost the race; return the winner, or insert if it already finished
+            self._wake.set()
+            return job
+
+    async def get(self, job_id: ObjectId) -> Optional[Dict[str, Any]]:
+        return await mongodb.jobs.find_one({"_id": job_id})
+
+    async def find_unfinished(self, dedupe_key: str) -> Optional[Dict[str, Any]]:
+        return await mongodb.jobs.find_one({"dedupe_key": dedupe_key, "state": {"$in": UNFINISHED}})
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = utc_now()
+        return await mongodb.jobs.find_one_and_update(
+            {
+                "state": {"$in": UNFINISHED},
+                "run_after": {"$lte": now},
+                "type": {"$in": list(self._handlers)},
+                "$or": [{"lease_expires": {"$exists": False}}, {"lease_expires": {"$lt": now}}],
+            },
+            {
+                "$set": {
+                    "state": RUNNING,
+                    "lease_owner": self.owner,
+                    "lease_expires": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_after", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _execute(self, document: Dict[str, Any]):
+        job = Job(self, document)
+        owned = {"_id": job.id, "lease_owner": self.owner}
+        self.running += 1
+        try:
+            await self._handlers[job.type](job)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back now rather than after the lease expires.
+            # The run did not fail, so it does not count against max_attempts.
+            await mongodb.jobs.update_one(owned, {
+                "$set": {"state": QUEUED, "updated_at": utc_now()},
+                "$unset": {"lease_owner": "", "lease_expires": ""},
+                "$inc": {"attempts": -1},
+            })
+            raise
+        except Exception as e:
+            now = utc_now()
+            if job.attempts >= self.max_attempts:
+                self.failed += 1
+                logger.error("Job %s (%s) failed after %s attempts: %s", job.id, job.type, job.attempts, e)
+                update = {"state": FAILED, "finished_at": now}
+                unset = {"lease_owner": "", "lease_expires": "", "active_dedupe_key": ""}
+            else:
+                self.retried += 1
+                delay = self._backoff(job.attempts)
+                logger.warning("Job %s (%s) attempt %s failed, retrying in %.0fs: %s", job.id, job.type, job.attempts, delay, e)
+                update = {"state": QUEUED, "run_after": now + timedelta(seconds=delay)}
+                unset = {"lease_owner": "", "lease_expires": ""}
+            await mongodb.jobs.update_one(owned, {
+                "$set": {**update, "error": str(e), "updated_at": now},
+                "$unset": unset
+            })
+        else:
+            self.succeeded += 1
+            now = utc_now()
+            await mongodb.jobs.update_one(owned, {
+                "$set": {"state": SUCCEEDED, "finished_at": now, "updated_at": now},
+                "$unset": {"lease_owner": "", "lease_expires": "", "error": "", "active_dedupe_key": ""}
+            })
+            logger.info("Job %s (%s) succeeded", job.id, job.type)
+        finally:
+            self.running -= 1
+
+    async def _work(self):
+        while True:
+            try:
+                document = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Claiming a job failed: %s", e)
+                document = None
+            if document is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(document)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work(), name=f"job-worker-{i}") for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._tasks),
+            "running": self.running,
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+# Global instance
+job_runner = JobRunner(
+    workers=settings.JOB_WORKERS,
+    poll_interval=settings.JOB_POLL_INTERVAL_SECONDS,
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    backoff_base=settings.JOB_BACKOFF_BASE_SECONDS,
+    backoff_max=settings.JOB_BACKOFF_MAX_SECONDS,
+    batch_size=settings.JOB_BATCH_SIZE,
+    batch_pause=settings.JOB_BATCH_PAUSE_MS / 1000
+)
@@ -0,0 +1,56 @@
+import os
+import socket
+from datetime import timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from core.utils import utc_now
+
+# Bookkeeping documents of background schema work (index builds, migrations)
+META_COLLECTION = "schema_meta"
+
+
+def process_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Lease:
+    """
+    Expiring claim on one schema_meta document, so that only one process
+    at a time does a piece of background work. A crashed holder's lease
+    runs out after `seconds`; the holder renews it while it makes progress.
+    """
+
+    def __init__(self, db, key: str, owner: str, seconds: float):
+        self.meta = db[META_COLLECTION]
+        self.key = key
+        self.owner = owner
+        self.seconds = seconds
+
+    async def acquire(self) -> bool:
+        now = utc_now()
+        try:
+            lease = await self.meta.find_one_and_update(
+                {"_id": self.key, "$or": [
+                    {"lease_expires": {"$exists": False}},
+                    {"lease_expires": {"$lt": now}},
+                    {"lease_owner": self.owner},
+                ]},
+                {"$set": {"lease_owner": self.owner, "lease_expires": now + timedelta(seconds=self.seconds)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            return False  # another process holds it; the upsert collided with its document
+        return lease is not None
+
+    async def renew(self):
+        await self.meta.update_one(
+            {"_id": self.key, "lease_owner": self.owner},
+            {"$set": {"lease_expires": utc_now() + timedelta(seconds=self.seconds)}}
+        )
+
+    async def release(self):
+        await self.meta.update_one(
+            {"_id": self.key, "lease_owner": self.owner},
+            {"$set": {"lease_expires": utc_now()}}
+        )
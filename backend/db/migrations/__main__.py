@@ -0,0 +1,25 @@
+import argparse
+import asyncio
+import json
+from db.migrations.runner import migration_runner
+from db.mongo import mongodb
+
+
+async def _main(args: argparse.Namespace):
+    await mongodb.connect()
+    try:
+        if args.command == "status":
+            result = await migration_runner.status(mongodb.db)
+        else:
+            result = await migration_runner.run(mongodb.db, only=args.only, dry_run=args.dry_run)
+        print("lease held by another process" if result is None else json.dumps(result, indent=2, default=str))
+    finally:
+        await mongodb.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or run data migrations")
+    parser.add_argument("command", choices=("status", "run"))
+    parser.add_argument("--dry-run", action="store_true", help="count and sample the changes without writing")
+    parser.add_argument("--only", help="run just this migration, e.g. m0001_active_flag")
+    asyncio.run(_main(parser.parse_args()))
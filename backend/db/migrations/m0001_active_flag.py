@@ -0,0 +1,16 @@
+from db.migrations.runner import Migration
+
+
+class ActiveFlag(Migration):
+    """Users written before the flag existed have no `active`, which meant active."""
+
+    collection = "users"
+    description = "Give every user an explicit boolean active flag"
+    filter = {"active": {"$not": {"$type": "bool"}}}
+    projection = {"_id": 1}
+
+    def update(self, document):
+        return {"$set": {"active": True}}
+
+
+migration = ActiveFlag()
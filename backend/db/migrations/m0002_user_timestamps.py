@@ -0,0 +1,29 @@
+from datetime import datetime, timezone
+from db.migrations.runner import Migration
+
+FIELDS = ("created_at", "updated_at")
+
+
+class UserTimestamps(Migration):
+    """Some user documents hold ISO strings where BSON dates belong."""
+
+    collection = "users"
+    description = "Store user created_at/updated_at as dates instead of ISO strings"
+    filter = {"$or": [{field: {"$type": "string"}} for field in FIELDS]}
+    projection = {field: 1 for field in FIELDS}
+
+    def update(self, document):
+        values = {}
+        for field in FIELDS:
+            value = document.get(field)
+            if not isinstance(value, str):
+                continue
+            try:
+                parsed = datetime.fromisoformat(value)
+            except ValueError:
+                continue  # left for a person to look at; the read path tolerates it
+            values[field] = parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+        return {"$set": values} if values else None
+
+
+migration = UserTimestamps()
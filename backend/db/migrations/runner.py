@@ -0,0 +1,255 @@
+"""
+Online data migrations.
+
+Every module of this package named `mNNNN_<name>.py` defines `migration`,
+a Migration that rewrites the documents of one collection matching its
+filter. Migrations run in version order, in _id-ordered batches with a
+pause between batches, from one process at a time under a lease. The last
+_id of each batch is checkpointed in the `migrations` collection, so a
+run that dies resumes after the last finished batch. Because each update
+re-checks the filter, repeating a batch is harmless.
+
+They run in the background at startup (MIGRATION_AUTO_RUN) or from the CLI:
+
+    python -m db.migrations status
+    python -m db.migrations run --dry-run              # count and sample the changes, write nothing
+    python -m db.migrations run [--only m0001_active_flag]
+"""
+import asyncio
+import importlib
+import os
+import pkgutil
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Set
+from pymongo import UpdateOne
+from core.config import settings
+from core.logging_config import get_logger
+from core.utils import utc_now
+from db.leases import Lease, process_owner
+from db.mongo import mongodb
+
+logger = get_logger(__name__)
+
+CHECKPOINTS = "migrations"
+LEASE_ID = "migrations"
+_MODULE_NAME = re.compile(r"m\d{4}_\w+")
+_DRY_RUN_SAMPLES = 5
+
+
+class Migration(ABC):
+    """
+    A change to every document of `collection` that matches `filter`.
+    Subclasses must define both `filter` (a class attribute will do) and
+    `update`; one missing either cannot be instantiated, so its module
+    fails to load.
+    """
+
+    id: str = ""  # module name, set when loaded
+    collection: str
+    description: str = ""
+    projection: Optional[Dict[str, Any]] = None
+
+    @property
+    @abstractmethod
+    def filter(self) -> Dict[str, Any]:
+        """Documents that still need the change; also guards each update."""
+
+    @abstractmethod
+    def update(self, document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update operators for one document, or None to leave it as it is."""
+
+
+def load_migrations() -> List[Migration]:
+    """The package's migrations in version order."""
+    migrations = []
+    names = sorted(
+        info.name for info in pkgutil.iter_modules([os.path.dirname(__file__)])
+        if _MODULE_NAME.fullmatch(info.name)
+    )
+    for name in names:
+        migration = importlib.import_module(f"db.migrations.{name}").migration
+        migration.id = name
+        migrations.append(migration)
+    return migrations
+
+
+class MigrationRunner:
+    def __init__(self, batch_size: int, pause: float, lease_seconds: float):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.lease_seconds = lease_seconds
+        self.owner = process_owner()
+        self._task: Optional[asyncio.Task] = None
+        # Per migration run by this process: state, processed, modified, remaining
+        self.progress: Dict[str, Dict[str, Any]] = {}
+        # Known to be complete, from the checkpoints at startup and this process's runs
+        self.completed: Set[str] = set()
+
+    async def load_completed(self, db):
+        """Note the migrations earlier runs, by any process, have finished."""
+        async for checkpoint in db[CHECKPOINTS].find({"state": "complete"}, {"_id": 1}):
+            self.completed.add(checkpoint["_id"])
+
+    def is_complete(self, migration_id: str) -> bool:
+        """Whether every document is known to have the change; False may just mean not yet known."""
+        return migration_id in self.completed
+
+    async def status(self, db) -> List[Dict[str, Any]]:
+        checkpoints = {doc["_id"]: doc for doc in await db[CHECKPOINTS].find().to_list(length=None)}
+        return [
+            {
+                "id": migration.id,
+                "collection": migration.collection,
+                "description": migration.description,
+                "state": checkpoints.get(migration.id, {}).get("state", "pending"),
+                **{
+                    key: checkpoints.get(migration.id, {}).get(key)
+                    for key in ("processed", "modified", "last_id", "completed_at")
+                },
+            }
+            for migration in load_migrations()
+        ]
+
+    async def run(self, db, only: Optional[str] = None, dry_run: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """Apply unfinished migrations in order. Returns None when another process holds the lease."""
+        lease = Lease(db, LEASE_ID, self.owner, self.lease_seconds)
+        if not await lease.acquire():
+            logger.info("Migration lease held by another process; skipping")
+            return None
+        try:
+            results = []
+            for migration in load_migrations():
+                if only is not None and migration.id != only:
+                    continue
+                checkpoint = await db[CHECKPOINTS].find_one({"_id": migration.id}) or {}
+                if checkpoint.get("state") == "complete":
+                    self.completed.add(migration.id)
+                    continue
+                results.append(await self._migrate(db, migration, checkpoint, lease, dry_run))
+            return results
+        finally:
+            await lease.release()
+
+    async def _migrate(
+        self,
+        db,
+        migration: Migration,
+        checkpoint: Dict[str, Any],
+        lease: Lease,
+        dry_run: bool
+    ) -> Dict[str, Any]:
+        collection = db[migration.collection]
+        checkpoints = db[CHECKPOINTS]
+        resume = not dry_run and bool(checkpoint)
+        progress = self.progress[migration.id] = {
+            "state": "dry_run" if dry_run else "running",
+            "processed": checkpoint.get("processed", 0) if resume else 0,
+            "modified": checkpoint.get("modified", 0) if resume else 0,
+            "remaining": await collection.count_documents(migration.filter),
+        }
+        samples = []
+        last_id = checkpoint.get("last_id") if resume else None
+        if not dry_run:
+            await checkpoints.update_one(
+                {"_id": migration.id},
+                {"$set": {"state": "running"}, "$setOnInsert": {"started_at": utc_now()}},
+                upsert=True
+            )
+        logger.info(
+            "%s migration %s: %s documents to examine%s",
+            "Dry-running" if dry_run else "Running", migration.id, progress["remaining"],
+            f", resuming after {last_id}" if last_id is not None else ""
+        )
+
+        while True:
+            query = dict(migration.filter)
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            cursor = collection.find(query, migration.projection).sort("_id", 1).limit(self.batch_size)
+            batch = await cursor.to_list(length=None)
+            if not batch:
+                break
+
+            requests = []
+            for document in batch:
+                update = migration.update(document)
+                if update is not None:
+                    requests.append(UpdateOne({"_id": document["_id"], **migration.filter}, update))
+                    if dry_run and len(samples) < _DRY_RUN_SAMPLES:
+                        samples.append({"_id": document["_id"], "update": update})
+
+            if dry_run:
+                modified = len(requests)
+            elif requests:
+                modified = (await collection.bulk_write(requests, ordered=False)).modified_count
+            else:
+                modified = 0
+            last_id = batch[-1]["_id"]
+            progress["processed"] += len(batch)
+            progress["modified"] += modified
+            progress["remaining"] = max(progress["remaining"] - len(batch), 0)
+
+            if not dry_run:
+                await checkpoints.update_one({"_id": migration.id}, {"$set": {
+                    "last_id": last_id,
+                    "processed": progress["processed"],
+                    "modified": progress["modified"],
+                    "updated_at": utc_now(),
+                }})
+                await lease.renew()
+            await asyncio.sleep(self.pause)
+
+        if not dry_run:
+            await checkpoints.update_one(
+                {"_id": migration.id},
+                {"$set": {"state": "complete", "completed_at": utc_now()}}
+            )
+            self.completed.add(migration.id)
+        progress["state"] = "dry_run" if dry_run else "complete"
+        logger.info(
+            "Migration %s %s: %s documents examined, %s %s",
+            migration.id, "dry run finished" if dry_run else "complete",
+            progress["processed"], progress["modified"], "would change" if dry_run else "changed"
+        )
+        result = {"id": migration.id, **progress}
+        if dry_run:
+            result["samples"] = samples
+        return result
+
+    def start(self):
+        """Run unfinished migrations in the background while the API serves."""
+        if settings.MIGRATION_AUTO_RUN and self._task is None:
+            self._task = asyncio.create_task(self._run(), name="migrations")
+
+    async def _run(self):
+        try:
+            await self.run(mongodb.db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The checkpoint keeps what was done; the next start or the CLI continues
+            logger.error("Running migrations failed: %s", e)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            migration_id: {key: value for key, value in progress.items() if key != "state"}
+            for migration_id, progress in self.progress.items()
+        }
+
+
+# Global instance
+migration_runner = MigrationRunner(
+    batch_size=settings.MIGRATION_BATCH_SIZE,
+    pause=settings.MIGRATION_PAUSE_MS / 1000,
+    lease_seconds=settings.MIGRATION_LEASE_SECONDS
+)
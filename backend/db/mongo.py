@@ -1,7 +1,20 @@
-from typing import Optional
-from pymongo import AsyncMongoClient, IndexModel, ASCENDING, DESCENDING, TEXT
+import asyncio
+import time
+from typing import Any, Dict, Optional
+from pymongo import AsyncMongoClient
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.read_preferences import SecondaryPreferred
 from core.config import settings
 from core.logging_config import get_logger
+from core.tracing import TracingListener
+from db.consistency import CausalTokenListener, causal_tokens, current_read_state
+from db.monitoring import (
+    CollectionVersionListener,
+    CommandMetricsListener,
+    PoolMetricsListener,
+    RequestStatsListener,
+)
+from db.slow_queries import SlowQueryListener, slow_query_recorder
 
 logger = get_logger(__name__)
 
@@ -11,70 +24,127 @@ class MongoDB:
         self.client: Optional[AsyncMongoClient] = None
         self.db = None
         self._collections = {}
+        self._transactions: Optional[bool] = None
 
     async def connect(self):
         try:
-            self.client = AsyncMongoClient(settings.MONGODB_URL)
-            self.db = self.client[settings.DATABASE_NAME]
+            self.client = AsyncMongoClient(
+                settings.MONGODB_URL,
+                **self._client_options(),
+                event_listeners=[
+                    CollectionVersionListener(),
+                    CommandMetricsListener(),
+                    PoolMetricsListener(settings.MONGODB_MAX_POOL_SIZE),
+                    RequestStatsListener(),
+                    SlowQueryListener(slow_query_recorder),
+                    CausalTokenListener(),
+                    *([TracingListener()] if settings.TRACING_ENABLED else []),
+                ]
+            )
+            self.use_database(settings.DATABASE_NAME)
             await self.client.admin.command('ping')
-            logger.info(f"Connected to MongoDB: {settings.DATABASE_NAME}")
-            
-            # Create indexes after connection
-            await self._create_indexes()
+            logger.info("Connected to MongoDB: %s", settings.DATABASE_NAME)
         except Exception as e:
-            logger.error(f"Failed to connect to MongoDB: {e}")
+            logger.error("Failed to connect to MongoDB: %s", e)
             raise
 
+    def use_database(self, name: str):
+        """Point the collections at a database; the query plan check uses a scratch one."""
+        self.db = self.client[name]
+        self._collections = {}
+        slow_query_recorder.attach(self.db)
+
+    @staticmethod
+    def _client_options() -> Dict[str, Any]:
+        options: Dict[str, Any] = {
+            "maxPoolSize": settings.MONGODB_MAX_POOL_SIZE,
+            "minPoolSize": settings.MONGODB_MIN_POOL_SIZE,
+            "maxIdleTimeMS": settings.MONGODB_MAX_IDLE_TIME_MS,
+            "waitQueueTimeoutMS": settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+            "serverSelectionTimeoutMS": settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            "connectTimeoutMS": settings.MONGODB_CONNECT_TIMEOUT_MS,
+        }
+        compressors = [name.strip() for name in settings.MONGODB_COMPRESSORS.split(",") if name.strip()]
+        if compressors:
+            options["compressors"] = compressors
+        return options
+
+    async def warm_pool(self):
+        """
+        Open minPoolSize connections up front with concurrent pings, so the
+        first requests after a start do not pay for connection setup. The
+        driver keeps the pool at that size afterwards.
+        """
+        size = settings.MONGODB_MIN_POOL_SIZE
+        if not self.client or size <= 0:
+            return
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(self.client.admin.command("ping") for _ in range(size)),
+            return_exceptions=True
+        )
+        failed = sum(isinstance(result, Exception) for result in results)
+        logger.info(
+            "Warmed MongoDB pool: %s connections in %.0fms (%s failed)",
+            size - failed, (time.perf_counter() - started) * 1000, failed
+        )
+
+    def secondary(self, name: str):
+        """
+        A collection for list, search and aggregate reads that tolerate
+        some lag: secondaryPreferred with maxStalenessSeconds. Reads that
+        decide ownership or permissions stay on the primary collections.
+        Pass read_session() along so users see their own writes.
+        """
+        if self.db is None:
+            raise RuntimeError("Database not connected")
+        state = current_read_state()
+        if not settings.SECONDARY_READS_ENABLED or (state is not None and state.owned() and state.primary):
+            return self.db[name]
+        collection = self._collections.get(name)
+        if collection is None:
+            preference = SecondaryPreferred(max_staleness=settings.SECONDARY_MAX_STALENESS_SECONDS)
+            collection = self._collections[name] = self.db[name].with_options(read_preference=preference)
+        return collection
+
+    def read_session(self) -> Optional[AsyncClientSession]:
+        """
+        Session for secondary reads: None unless the current user wrote
+        within the read-your-writes window or the response is tagged with
+        collection versions a secondary may not have reached. Reads then
+        carry afterClusterTime and a secondary waits until it has applied
+        the user's write and the writes behind the tag. Also None in a task
+        that does not own the request's state: the request ends its session.
+        """
+        state = current_read_state()
+        if state is None or not state.owned() or self.client is None:
+            return None
+        if state.session is None:
+            tokens = causal_tokens.get(state.user_id) if state.user_id is not None else None
+            if tokens is None and state.after_cluster_time is None:
+                return None
+            state.session = self.client.start_session(causal_consistency=True)
+            if tokens is not None:
+                cluster_time, operation_time = tokens
+                if cluster_time is not None:
+                    state.session.advance_cluster_time(cluster_time)
+                state.session.advance_operation_time(operation_time)
+            if state.after_cluster_time is not None:
+                state.session.advance_operation_time(state.after_cluster_time)
+        return state.session
+
+    async def supports_transactions(self) -> bool:
+        """Replica sets and sharded clusters do; a standalone server does not."""
+        if self._transactions is None:
+            hello = await self.client.admin.command("hello")
+            self._transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+        return self._transactions
+
     async def disconnect(self):
         if self.client:
             await self.client.close()
             logger.info("Disconnected from MongoDB")
 
-    async def _create_indexes(self):
-        try:
-            # Users collection indexes
-            await self.users.create_indexes([
-                IndexModel([("user_id", ASCENDING)], unique=True),
-                IndexModel([("email", ASCENDING)], unique=True),
-                IndexModel([("skills", ASCENDING)]),
-                IndexModel([("institute", ASCENDING)]),
-                IndexModel([("grad_year", ASCENDING)]),
-            ])
-            
-            # Projects collection indexes
-            await self.projects.create_indexes([
-                IndexModel([("created_by", ASCENDING)]),
-                IndexModel([("contributors", ASCENDING)]),
-                IndexModel([("tech_stack", ASCENDING)]),
-                IndexModel([("tags", ASCENDING)]),
-                IndexModel([("status", ASCENDING)]),
-                IndexModel([("created_at", DESCENDING)]),
-                IndexModel([("upvotes", DESCENDING)]),
-                IndexModel([("featured", DESCENDING)]),
-                IndexModel([("title", TEXT), ("abstract", TEXT)]),
-            ])
-            
-            # Teammate requests collection indexes
-            await self.teammate_requests.create_indexes([
-                IndexModel([("user_id", ASCENDING)]),
-                IndexModel([("project_id", ASCENDING)]),
-                IndexModel([("tags", ASCENDING)]),
-                IndexModel([("created_at", DESCENDING)]),
-            ])
-            
-            # Testimonials collection indexes
-            await self.testimonials.create_indexes([
-                IndexModel([("from_user", ASCENDING)]),
-                IndexModel([("project_id", ASCENDING)]),
-                IndexModel([("from_user", ASCENDING), ("project_id", ASCENDING)], unique=True),
-                IndexModel([("created_at", DESCENDING)]),
-            ])
-            
-            logger.info("All indexes created successfully")
-        except Exception as e:
-            logger.error(f"Error creating indexes: {e}")
-            raise
-
     @property
     def users(self):
         if self.db is None:
@@ -99,6 +169,18 @@ class MongoDB:
             raise RuntimeError("Database not connected")
         return self.db["testimonials"]
 
+    @property
+    def jobs(self):
+        if self.db is None:
+            raise RuntimeError("Database not connected")
+        return self.db["jobs"]
+
+    @property
+    def rate_limits(self):
+        if self.db is None:
+            raise RuntimeError("Database not connected")
+        return self.db["rate_limits"]
+
 
 # Global MongoDB instance
 mongodb = MongoDB()
\ No newline at end of file
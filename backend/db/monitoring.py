@@ -0,0 +1,165 @@
+from typing import Dict, Tuple
+from pymongo import monitoring
+from core.cache import collection_versions
+from core.db_stats import current_db_stats
+from core.metrics import (
+    mongo_command_duration,
+    mongo_commands,
+    mongo_pool_checked_out,
+    mongo_pool_checkout_failures,
+    mongo_pool_checkout_wait,
+    mongo_pool_connections,
+    mongo_pool_saturation,
+    mongo_pool_waiting,
+)
+
+WRITE_COMMANDS = frozenset({"insert", "update", "delete", "findAndModify"})
+
+
+class CollectionVersionListener(monitoring.CommandListener):
+    """
+    Bumps collection_versions once a write command against a collection
+    completes. Ignored while the change stream runs, which reports the same
+    write with a version every worker shares.
+    """
+
+    def __init__(self):
+        self._pending: Dict[int, str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name in WRITE_COMMANDS:
+            self._pending[event.request_id] = event.command.get(event.command_name)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._complete(event.request_id)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        # A failed write may still have applied partially
+        self._complete(event.request_id)
+
+    def _complete(self, request_id: int):
+        collection = self._pending.pop(request_id, None)
+        if collection:
+            collection_versions.bump(collection)
+
+
+def command_collection(event: monitoring.CommandStartedEvent) -> str:
+    """Collection a command targets, or "-" for database-level commands."""
+    target = event.command.get(event.command_name)
+    if event.command_name == "getMore":
+        target = event.command.get("collection")
+    return target if isinstance(target, str) else "-"
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Command counts and driver-measured latency by collection and command."""
+
+    def __init__(self):
+        self._pending: Dict[Tuple[int, object], str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        self._pending[(event.request_id, event.connection_id)] = command_collection(event)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._record(event, "success")
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._record(event, "failure")
+
+    def _record(self, event, outcome: str):
+        collection = self._pending.pop((event.request_id, event.connection_id), "-")
+        mongo_commands.inc(collection, event.command_name, outcome)
+        mongo_command_duration.observe(event.duration_micros / 1_000_000, collection, event.command_name)
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Per server address: open and checked-out connections, operations
+    waiting for a connection, checkout wait time and pool saturation
+    (checked out / maxPoolSize; at 1.0 every new operation queues).
+    """
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self._checked_out: Dict[str, int] = {}
+
+    @staticmethod
+    def _address(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def pool_created(self, event):
+        mongo_pool_connections.set(0, self._address(event))
+        mongo_pool_checked_out.set(0, self._address(event))
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        mongo_pool_connections.inc(self._address(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        mongo_pool_connections.dec(self._address(event))
+
+    def connection_check_out_started(self, event):
+        mongo_pool_waiting.inc(self._address(event))
+
+    def connection_check_out_failed(self, event):
+        address = self._address(event)
+        mongo_pool_waiting.dec(address)
+        mongo_pool_checkout_failures.inc(address, str(event.reason))
+        if event.duration is not None:
+            mongo_pool_checkout_wait.observe(event.duration, address)
+
+    def connection_checked_out(self, event):
+        address = self._address(event)
+        mongo_pool_waiting.dec(address)
+        mongo_pool_checked_out.inc(address)
+        if event.duration is not None:
+            mongo_pool_checkout_wait.observe(event.duration, address)
+        self._set_checked_out(address, 1)
+
+    def connection_checked_in(self, event):
+        address = self._address(event)
+        mongo_pool_checked_out.dec(address)
+        self._set_checked_out(address, -1)
+
+    def _set_checked_out(self, address: str, delta: int):
+        count = self._checked_out[address] = self._checked_out.get(address, 0) + delta
+        if self.max_pool_size:
+            mongo_pool_saturation.set(count / self.max_pool_size, address)
+
+
+def returned_documents(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or ())
+    if "value" in reply:  # findAndModify
+        return 1 if reply["value"] else 0
+    return 0
+
+
+class RequestStatsListener(monitoring.CommandListener):
+    """Adds each command to the RequestDbStats of the request that issued it."""
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        stats = current_db_stats()
+        if stats is not None:
+            stats.record(event.duration_micros / 1_000_000, returned_documents(event.reply))
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        stats = current_db_stats()
+        if stats is not None:
+            stats.record(event.duration_micros / 1_000_000, 0)
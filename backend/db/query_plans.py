@@ -0,0 +1,312 @@
+"""
+Query plan regression check.
+
+Seeds a scratch database (`<DATABASE_NAME>_plancheck`), applies the index
+manifest, calls every CRUD read with representative arguments and explains
+each command those calls sent. A plan fails when it scans the collection,
+sorts in memory, or examines more than --max-ratio index keys or documents
+per document it returns. Run it after changing a query or INDEXES:
+
+    python -m db.query_plans                 # exit status 1 when a plan fails
+    python -m db.query_plans --keep          # leave the scratch database for inspection
+"""
+import argparse
+import asyncio
+import copy
+import random
+import sys
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import monitoring
+from core.cache import entity_cache, negative_cache, request_coalescer, stale_cache
+from core.config import settings
+from core.utils import utc_now
+from db.crud.projects import project_crud
+from db.crud.requests import teammate_request_crud
+from db.crud.testimonials import testimonial_crud
+from db.crud.users import user_crud
+from db.indexes import index_manager
+from db.migrations.runner import CHECKPOINTS, load_migrations, migration_runner
+from db.mongo import mongodb
+from db.slow_queries import RECORDED_COMMANDS, explain_command
+
+SKILLS = [f"skill-{i}" for i in range(30)]
+TECH = [f"tech-{i}" for i in range(25)]
+TAGS = [f"tag-{i}" for i in range(30)]
+INSTITUTES = [f"Institute {i}" for i in range(20)]
+
+# Exemptions a case may carry, with the reason it is acceptable
+COLLSCAN, SORT, RATIO = "collscan", "sort", "ratio"
+UNINDEXABLE_SEARCH = frozenset({COLLSCAN, RATIO})
+
+
+@dataclass
+class Seed:
+    """Ids the cases query for: a prolific user and a busy project."""
+    user_id: str
+    project_id: str
+
+
+@dataclass
+class PlanCase:
+    name: str
+    call: Callable[[], Awaitable[Any]]
+    allow: FrozenSet[str] = frozenset()
+    reason: str = ""
+    # Must be answered from the index without fetching documents
+    covered: bool = False
+
+
+@dataclass
+class PlanResult:
+    case: str
+    collection: str
+    command: str
+    plan: Dict[str, Any]
+    problems: List[str] = field(default_factory=list)
+
+
+class _CommandCapture(monitoring.CommandListener):
+    """Keeps a copy of every read command, labelled with the case that sent it."""
+
+    def __init__(self):
+        self.case: Optional[str] = None
+        self.commands: List[Tuple[str, str, str, Dict[str, Any]]] = []
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        collection = event.command.get(event.command_name)
+        if self.case and event.command_name in RECORDED_COMMANDS and isinstance(collection, str):
+            self.commands.append((self.case, collection, event.command_name, copy.deepcopy(dict(event.command))))
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        pass
+
+
+async def seed_database(db, users: int, projects: int, rng: random.Random) -> Seed:
+    """Insert a skewed data set: user 0 and the first project are the busy ones."""
+    now = utc_now()
+
+    def ago(days: int):
+        return now - timedelta(days=rng.uniform(0, days))
+
+    user_ids = [f"user_{i:05d}" for i in range(users)]
+    await db.users.insert_many([{
+        "user_id": user_id,
+        "email": f"{user_id}@example.com",
+        "name": f"User {i}",
+        "bio": "Seeded for the query plan check",
+        "skills": rng.sample(SKILLS, rng.randint(1, 5)),
+        "institute": rng.choice(INSTITUTES),
+        "grad_year": rng.randint(2020, 2030),
+        "created_at": ago(365),
+        "updated_at": now,
+        "active": rng.random() > 0.05,
+    } for i, user_id in enumerate(user_ids)])
+
+    def author():
+        return user_ids[0] if rng.random() < 0.03 else rng.choice(user_ids)
+
+    project_docs = []
+    for i in range(projects):
+        created_by = author()
+        project_docs.append({
+            "_id": ObjectId(),
+            "title": f"Project {i}",
+            "abstract": "A seeded project for the query plan check",
+            "tech_stack": rng.sample(TECH, rng.randint(1, 4)),
+            "github_link": f"https://github.com/example/project-{i}",
+            "contributors": [created_by, *rng.sample(user_ids, rng.randint(0, 3))],
+            "tags": rng.sample(TAGS, rng.randint(0, 4)),
+            "status": rng.choice(("open", "completed")),
+            "created_by": created_by,
+            "created_at": ago(120),
+            "updated_at": now,
+            "upvotes": rng.randint(0, 200),
+            "upvoted_by": [],
+            "featured": rng.random() < 0.02,
+        })
+    await db.projects.insert_many(project_docs)
+    project_ids = [str(doc["_id"]) for doc in project_docs]
+
+    def project():
+        return project_ids[0] if rng.random() < 0.05 else rng.choice(project_ids)
+
+    await db.teammate_requests.insert_many([{
+        "user_id": author(),
+        "looking_for": "A teammate",
+        "description": "Seeded for the query plan check",
+        "project_id": project() if rng.random() < 0.7 else None,
+        "tags": rng.sample(TAGS, rng.randint(0, 4)),
+        "created_at": ago(120),
+    } for _ in range(projects)])
+
+    pairs = {(author(), project()) for _ in range(projects)}
+    await db.testimonials.insert_many([{
+        "from_user": from_user,
+        "project_id": project_id,
+        "content": "Seeded for the query plan check",
+        "created_at": ago(120),
+    } for from_user, project_id in pairs])
+
+    # The seed already has the migrated shape, so queries may rely on it
+    await db[CHECKPOINTS].insert_many([
+        {"_id": migration.id, "state": "complete", "completed_at": now} for migration in load_migrations()
+    ])
+    await migration_runner.load_completed(db)
+
+    return Seed(user_id=user_ids[0], project_id=project_ids[0])
+
+
+def cases(seed: Seed) -> List[PlanCase]:
+    """Every CRUD read, once per filter and sort it supports."""
+    user, project = seed.user_id, seed.project_id
+    return [
+        PlanCase("projects.get_project_by_id", lambda: project_crud.get_project_by_id(project)),
+        PlanCase("projects.get_projects", lambda: project_crud.get_projects()),
+        PlanCase("projects.get_projects tech_stack", lambda: project_crud.get_projects(tech_stack=TECH[:2])),
+        PlanCase("projects.get_projects tags", lambda: project_crud.get_projects(tags=TAGS[:3])),
+        PlanCase("projects.get_projects status", lambda: project_crud.get_projects(status="open")),
+        PlanCase("projects.get_projects featured", lambda: project_crud.get_projects(featured_only=True)),
+        PlanCase("projects.get_projects trending", lambda: project_crud.get_projects(sort="trending")),
+        PlanCase("projects.get_projects upvotes", lambda: project_crud.get_projects(sort="upvotes")),
+        PlanCase("projects.get_projects oldest", lambda: project_crud.get_projects(sort="oldest")),
+        PlanCase(
+            "projects.get_projects search", lambda: project_crud.get_projects(search="project 1"),
+            UNINDEXABLE_SEARCH, "unanchored case-insensitive regex"
+        ),
+        PlanCase("projects.get_trending_projects", lambda: project_crud.get_trending_projects()),
+        PlanCase("projects.get_user_projects", lambda: project_crud.get_user_projects(user)),
+        PlanCase("requests.get_requests", lambda: teammate_request_crud.get_requests()),
+        PlanCase("requests.get_requests tags", lambda: teammate_request_crud.get_requests(tags=TAGS[:3])),
+        PlanCase("requests.get_requests user", lambda: teammate_request_crud.get_requests(user_id=user)),
+        PlanCase("requests.get_requests project", lambda: teammate_request_crud.get_requests(project_id=project)),
+        PlanCase(
+            "requests.get_requests search", lambda: teammate_request_crud.get_requests(search="teammate"),
+            UNINDEXABLE_SEARCH, "unanchored case-insensitive regex"
+        ),
+        PlanCase("requests.get_user_requests", lambda: teammate_request_crud.get_user_requests(user)),
+        PlanCase("requests.get_requests_by_project", lambda: teammate_request_crud.get_requests_by_project(project)),
+        PlanCase("requests.get_recent_requests", lambda: teammate_request_crud.get_recent_requests()),
+        PlanCase("requests.get_requests_by_tags", lambda: teammate_request_crud.get_requests_by_tags(TAGS[:3])),
+        PlanCase("testimonials.get_all_testimonials", lambda: testimonial_crud.get_all_testimonials()),
+        PlanCase("testimonials.get_testimonials_by_author", lambda: testimonial_crud.get_testimonials_by_author(user)),
+        PlanCase("testimonials.get_testimonials_by_project", lambda: testimonial_crud.get_testimonials_by_project(project)),
+        PlanCase("users.get_user_by_id", lambda: user_crud.get_user_by_id(user)),
+        PlanCase("users.get_user_public", lambda: user_crud.get_user_public(user)),
+        PlanCase("users.user_exists", lambda: user_crud.user_exists(user), covered=True),
+        PlanCase("users.get_user_stats", lambda: user_crud.get_user_stats(user)),
+        PlanCase(
+            "users.search_users", lambda: user_crud.search_users(),
+            frozenset({COLLSCAN}), "lists every active user; nothing selective to index"
+        ),
+        PlanCase("users.search_users skills", lambda: user_crud.search_users(skills=SKILLS[:2])),
+        PlanCase("users.search_users institute", lambda: user_crud.search_users(institute=INSTITUTES[0])),
+        PlanCase("users.search_users grad_year", lambda: user_crud.search_users(grad_year=2024)),
+        PlanCase(
+            "users.search_users term", lambda: user_crud.search_users(search_term="user 1"),
+            UNINDEXABLE_SEARCH, "unanchored case-insensitive regex"
+        ),
+    ]
+
+
+def _is_count(command_name: str, command: Dict[str, Any]) -> bool:
+    """Counts return one number however many documents they match."""
+    if command_name == "count":
+        return True
+    pipeline = command.get("pipeline") or []
+    return command_name == "aggregate" and bool(pipeline) and "$group" in pipeline[-1]
+
+
+def check(plan: Dict[str, Any], case: PlanCase, is_count: bool, max_ratio: float) -> List[str]:
+    problems = []
+    allow = case.allow
+    if plan["collscan"] and COLLSCAN not in allow:
+        problems.append("COLLSCAN")
+    if "SORT" in plan["stages"] and SORT not in allow:
+        problems.append("in-memory SORT")
+    if case.covered and "FETCH" in plan["stages"]:
+        problems.append("not covered by an index")
+    examined = max(plan["keys_examined"] or 0, plan["docs_examined"] or 0)
+    returned = plan["returned"] or 0
+    if not is_count and RATIO not in allow and examined > max_ratio * max(returned, 1):
+        problems.append(f"examined {examined} for {returned} returned")
+    return problems
+
+
+def _disable_caches():
+    """Every call has to reach Mongo for its commands to be captured."""
+    for cache in (entity_cache, negative_cache, request_coalescer, stale_cache):
+        cache.enabled = False
+
+
+async def run(db, seed_ids: Seed, capture: _CommandCapture, max_ratio: float) -> List[PlanResult]:
+    by_name = {}
+    results = []
+    for case in cases(seed_ids):
+        by_name[case.name] = case
+        capture.case = case.name
+        try:
+            await case.call()
+        except Exception as e:
+            results.append(PlanResult(case.name, "-", "-", {}, [f"call failed: {e}"]))
+    capture.case = None
+
+    for case_name, collection, command_name, command in capture.commands:
+        plan = await explain_command(db, command_name, command)
+        problems = check(plan, by_name[case_name], _is_count(command_name, command), max_ratio)
+        results.append(PlanResult(case_name, collection, command_name, plan, problems))
+    return results
+
+
+def _report(result: PlanResult, reasons: Dict[str, str]) -> str:
+    plan = result.plan
+    line = (
+        f"{'FAIL' if result.problems else 'ok  '} {result.case}: {result.command} {result.collection} "
+        f"{'>'.join(plan.get('stages', []))} {','.join(plan.get('indexes', []))} "
+        f"keys={plan.get('keys_examined')} docs={plan.get('docs_examined')} returned={plan.get('returned')}"
+    )
+    if result.problems:
+        line += f" -- {'; '.join(result.problems)}"
+    elif reasons.get(result.case) and (plan.get("collscan") or "SORT" in plan.get("stages", [])):
+        line += f" (allowed: {reasons[result.case]})"
+    return line
+
+
+async def _main(args: argparse.Namespace) -> int:
+    capture = _CommandCapture()
+    monitoring.register(capture)
+    _disable_caches()
+    await mongodb.connect()
+    name = f"{settings.DATABASE_NAME}_plancheck"
+    try:
+        await mongodb.client.drop_database(name)
+        mongodb.use_database(name)
+        seed_ids = await seed_database(mongodb.db, args.users, args.projects, random.Random(args.seed))
+        await index_manager.apply(mongodb.db)
+
+        results = await run(mongodb.db, seed_ids, capture, args.max_ratio)
+        reasons = {case.name: case.reason for case in cases(seed_ids)}
+        for result in results:
+            print(_report(result, reasons))
+        failed = sum(1 for result in results if result.problems)
+        print(f"{len(results)} plans checked, {failed} failed")
+        return 1 if failed else 0
+    finally:
+        if not args.keep:
+            await mongodb.client.drop_database(name)
+        await mongodb.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Explain every CRUD query against the index manifest")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--projects", type=int, default=3000, help="also the number of requests and testimonials")
+    parser.add_argument("--max-ratio", type=float, default=10.0, help="keys or documents examined per document returned")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
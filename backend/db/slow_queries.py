@@ -0,0 +1,266 @@
+import asyncio
+import contextvars
+import copy
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+from pymongo import monitoring
+from core.config import settings
+from core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+RECORDED_COMMANDS = frozenset({"find", "aggregate", "count"})
+RANGE_OPERATORS = frozenset({"$gt", "$gte", "$lt", "$lte", "$ne", "$nin", "$regex", "$exists", "$not"})
+# Driver-added fields that explain must not receive
+_SESSION_FIELDS = ("lsid", "txnNumber", "$clusterTime", "$db", "$readPreference", "cursor", "batchSize", "readConcern")
+
+
+def query_shape(value: Any) -> Any:
+    """Field names and operators of a filter with every literal replaced by '?'."""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in sorted(value.items())}
+    if isinstance(value, list):
+        shapes = [query_shape(item) for item in value]
+        # $in/$all value lists collapse; $and/$or branch lists keep structure
+        if all(not isinstance(item, (dict, list)) for item in value):
+            return ["?"] if value else []
+        return shapes
+    return "?"
+
+
+def command_filter(command_name: str, command: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """(filter, sort) of a find, count or aggregate ($match/$sort stages)."""
+    if command_name == "find":
+        return command.get("filter") or {}, dict(command.get("sort") or {})
+    if command_name == "count":
+        return command.get("query") or {}, {}
+
+    match: Dict[str, Any] = {}
+    sort: Dict[str, int] = {}
+    for stage in command.get("pipeline") or ():
+        if "$match" in stage and not match:
+            match = stage["$match"]
+        elif "$sort" in stage and not sort:
+            sort = dict(stage["$sort"])
+        elif not ("$match" in stage or "$sort" in stage):
+            break  # later stages work on derived documents
+    return match, sort
+
+
+def suggest_index(filter_: Dict[str, Any], sort: Dict[str, int]) -> List[List[Tuple[str, int]]]:
+    """
+    Compound index keys following the equality, sort, range rule. A
+    top-level $or needs one index per branch for the planner to use them.
+    """
+    if "$or" in filter_ and len(filter_) == 1:
+        suggestions = []
+        for branch in filter_["$or"]:
+            suggestions.extend(suggest_index(branch, sort))
+        return suggestions
+
+    equality, ranges = [], []
+    for field, condition in filter_.items():
+        if field.startswith("$"):
+            continue
+        if isinstance(condition, dict) and any(op in RANGE_OPERATORS for op in condition):
+            ranges.append(field)
+        else:
+            equality.append(field)  # plain values and $in lists
+
+    keys = [(field, 1) for field in equality]
+    keys += [(field, direction) for field, direction in sort.items() if field not in equality]
+    keys += [(field, 1) for field in ranges if field not in sort and field not in equality]
+    return [keys] if keys else []
+
+
+def summarize_plan(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """Winning plan stages and executionStats counters of an explain result."""
+    stages: List[str] = []
+    indexes: List[str] = []
+    stats: Dict[str, Any] = {}
+
+    def walk(node: Any):
+        if isinstance(node, dict):
+            if "stage" in node:
+                stages.append(node["stage"])
+                if node.get("indexName"):
+                    indexes.append(node["indexName"])
+            if "executionStats" in node and not stats:
+                stats.update(node["executionStats"])
+            for key, value in node.items():
+                if key not in ("rejectedPlans", "allPlansExecution"):
+                    walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(explain)
+    return {
+        "stages": stages,
+        "collscan": "COLLSCAN" in stages,
+        "indexes": indexes,
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "returned": stats.get("nReturned"),
+        "execution_ms": stats.get("executionTimeMillis"),
+    }
+
+
+async def explain_command(database, command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    """Re-run a captured command under explain and summarize its plan."""
+    target = {name: value for name, value in command.items() if name not in _SESSION_FIELDS}
+    if command_name == "aggregate":
+        target["cursor"] = {}
+    explain = await database.command({"explain": target, "verbosity": "executionStats"})
+    return summarize_plan(explain)
+
+
+def _needs_index(plan: Dict[str, Any]) -> bool:
+    if plan["collscan"]:
+        return True
+    examined = plan["docs_examined"] or 0
+    returned = plan["returned"] or 0
+    return examined > 100 and examined > 10 * max(returned, 1)
+
+
+def _covered(keys: List[Tuple[str, int]], existing: List[List[Tuple[str, int]]]) -> bool:
+    fields = [field for field, _ in keys]
+    return any([field for field, _ in index[: len(fields)]] == fields for index in existing)
+
+
+class SlowQueryRecorder:
+    """
+    Aggregates slow find/aggregate/count commands by collection and query
+    shape. The first sample of each shape is explained in the background
+    with executionStats; shapes whose plan scans the collection or examines
+    far more documents than it returns get compound index suggestions.
+    """
+
+    def __init__(self, threshold_ms: float, max_shapes: int, explain: bool = True):
+        self.threshold_ms = threshold_ms
+        self.max_shapes = max_shapes
+        self.explain = explain
+        self.database = None
+        self._shapes: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._explaining: set = set()
+
+    def attach(self, database):
+        """Database used for background explains; set once connected."""
+        self.database = database
+
+    def record(self, collection: str, command_name: str, command: Dict[str, Any], duration_ms: float):
+        filter_, sort = command_filter(command_name, command)
+        shape = {"filter": query_shape(filter_), "sort": list(sort.items())}
+        key = f"{collection}:{command_name}:{json.dumps(shape, sort_keys=True, default=str)}"
+
+        entry = self._shapes.get(key)
+        if entry is None:
+            entry = self._shapes[key] = {
+                "collection": collection,
+                "command": command_name,
+                "shape": shape,
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "plan": None,
+                "suggested_indexes": [],
+            }
+            while len(self._shapes) > self.max_shapes:
+                self._shapes.popitem(last=False)
+        self._shapes.move_to_end(key)
+        entry["count"] += 1
+        entry["total_ms"] += duration_ms
+        entry["max_ms"] = max(entry["max_ms"], duration_ms)
+        entry["last_seen"] = time.time()
+
+        if self.explain and entry["plan"] is None and key not in self._explaining and self.database is not None:
+            self._explaining.add(key)
+            # Fresh context: the explain must not count against the request
+            asyncio.get_running_loop().create_task(
+                self._explain(key, collection, command_name, command, filter_, sort),
+                name="slow-query-explain",
+                context=contextvars.Context()
+            )
+
+    async def _explain(
+        self,
+        key: str,
+        collection: str,
+        command_name: str,
+        command: Dict[str, Any],
+        filter_: Dict[str, Any],
+        sort: Dict[str, int]
+    ):
+        try:
+            plan = await explain_command(self.database, command_name, command)
+
+            suggestions = []
+            if _needs_index(plan):
+                info = await self.database[collection].index_information()
+                existing = [list(index["key"]) for index in info.values()]
+                suggestions = [keys for keys in suggest_index(filter_, sort) if not _covered(keys, existing)]
+
+            entry = self._shapes.get(key)
+            if entry is not None:
+                entry["plan"] = plan
+                entry["suggested_indexes"] = suggestions
+            if suggestions:
+                logger.warning(
+                    "Slow %s on %s (%s); suggested indexes: %s",
+                    command_name, collection, plan["stages"], suggestions
+                )
+        except Exception as e:
+            logger.warning("Explain of slow %s on %s failed: %s", command_name, collection, e)
+        finally:
+            self._explaining.discard(key)
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Recorded shapes, slowest total time first."""
+        shapes = [
+            {**entry, "avg_ms": round(entry["total_ms"] / entry["count"], 2)}
+            for entry in self._shapes.values()
+        ]
+        return sorted(shapes, key=lambda entry: entry["total_ms"], reverse=True)
+
+    def clear(self):
+        self._shapes.clear()
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Feeds slow read commands to the recorder."""
+
+    def __init__(self, recorder: SlowQueryRecorder):
+        self.recorder = recorder
+        self._pending: Dict[Tuple[int, object], Tuple[str, Dict[str, Any]]] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name in RECORDED_COMMANDS:
+            collection = event.command.get(event.command_name)
+            if isinstance(collection, str):
+                self._pending[(event.request_id, event.connection_id)] = (collection, event.command)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._complete(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._complete(event)
+
+    def _complete(self, event):
+        pending = self._pending.pop((event.request_id, event.connection_id), None)
+        if pending is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms >= self.recorder.threshold_ms:
+            collection, command = pending
+            # Only slow commands pay for a private copy of the command document
+            self.recorder.record(collection, event.command_name, copy.deepcopy(dict(command)), duration_ms)
+
+
+# Global instance
+slow_query_recorder = SlowQueryRecorder(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    max_shapes=settings.SLOW_QUERY_MAX_SHAPES,
+    explain=settings.SLOW_QUERY_EXPLAIN
+)
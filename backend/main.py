@@ -1,14 +1,28 @@
 from contextlib import asynccontextmanager
 
 from typing import Dict
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from core.config import settings
-from core.logging_config import get_logger
-from core.middleware import setup_rate_limiting, limiter
+from core.logging_config import get_logger, logging_stats
+from core.middleware import setup_rate_limiting, enforce_rate_limit, rate_limit, standard_rate_limit
+from core.cache import entity_cache, negative_cache, request_coalescer, stale_cache
+from core.compression import CompressionMiddleware, compressed_variants
+from core.admission import admit_request, admission_controller
+from core.metrics import CONTENT_TYPE, MetricsMiddleware, metrics
+from core.db_stats import DbStatsMiddleware
+from core.loop_monitor import LoopMonitorMiddleware, loop_monitor
+from core.profiling import ProfilingMiddleware, profiler
+from core.tracing import TracedRoute, TracingMiddleware, tracer
+from db.consistency import causal_tokens, track_causal_reads
+from db.indexes import index_manager
+from db.jobs import job_runner
+from db.migrations.runner import migration_runner
 from db.mongo import mongodb
-from api.routes import projects, requests, testimonials, users
+from db.change_streams import cache_invalidation_listener
+from api.routes import admin, jobs, projects, requests, testimonials, users
 
 logger = get_logger(__name__)
 
@@ -20,13 +34,31 @@ async def lifespan(app: FastAPI):
     logger.info("Starting runeGard API...")
     
     try:
+        # Watch for blocking calls from the start, including startup itself
+        await loop_monitor.start()
+        
         # Connect to MongoDB
         await mongodb.connect()
         logger.info("MongoDB connection established")   
+        await mongodb.warm_pool()
+        
+        # Keep local caches coherent with writes from other workers
+        await cache_invalidation_listener.start()
+
+        # Build missing indexes in the background; the API serves meanwhile
+        index_manager.start()
+
+        # Finish data migrations in throttled batches alongside live traffic;
+        # queries that depend on one wait for its checkpoint to say complete
+        await migration_runner.load_completed(mongodb.db)
+        migration_runner.start()
+
+        # Work queued by requests, such as account deletion cascades
+        job_runner.start()
         logger.info("runeGard started successfully")
         
     except Exception as e:
-        logger.error(f"Failed to start application: {e}")
+        logger.error("Failed to start application: %s", e)
         raise
     
     yield
@@ -35,6 +67,12 @@ async def lifespan(app: FastAPI):
     logger.info("Shutting down runeGard API...")
     
     try:
+        await job_runner.stop()
+        await migration_runner.stop()
+        await index_manager.stop()
+        await cache_invalidation_listener.stop()
+        await loop_monitor.stop()
+        
         # Disconnect from MongoDB
         await mongodb.disconnect()
         logger.info("MongoDB connection closed")
@@ -42,7 +80,7 @@ async def lifespan(app: FastAPI):
         logger.info("runeGard API shutdown complete")
         
     except Exception as e:
-        logger.error(f"Error during shutdown: {e}")
+        logger.error("Error during shutdown: %s", e)
 
 
 # Create FastAPI application
@@ -50,9 +88,18 @@ app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.API_V1_STR,
     description=settings.API_DESCRIPTION,
-    lifespan=lifespan
+    lifespan=lifespan,
+    dependencies=[
+        # Admission first, so shed requests spend no rate limit budget or token checks
+        *([Depends(admit_request)] if settings.ADMISSION_ENABLED else []),
+        Depends(enforce_rate_limit),
+        Depends(track_causal_reads)
+    ]
 )
 
+# Span the dependency, endpoint and serialization phases of the app's own routes too
+app.router.route_class = TracedRoute
+
 # Setup rate limiting
 setup_rate_limiting(app)
 
@@ -65,16 +112,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Sampled stack profiles of opted-in requests
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# Per-request Mongo round trips: budget warnings and diagnostic headers
+app.add_middleware(DbStatsMiddleware)
+
+# Attribute event loop stalls to the request being served
+app.add_middleware(LoopMonitorMiddleware)
+
+# Outermost, so latency covers compression and every other middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Root span of sampled requests; wraps everything so the trace covers all middleware
+if settings.TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+
 
 # Include route modules
 app.include_router(projects.router, prefix="/projects", tags=["Project management"])
 app.include_router(requests.router, prefix="/requests", tags=["Team requests"])
 app.include_router(testimonials.router, prefix="/testimonials", tags=["Testimonials"])
 app.include_router(users.router, prefix="/users", tags=["User management"])
+app.include_router(jobs.router, prefix="/jobs", tags=["Jobs"])
+app.include_router(admin.router, prefix="/admin", tags=["Admin"])
 
 
 @app.get("/", response_model=Dict[str, str])
-@limiter.limit(f"{settings.RATE_LIMIT_REQUESTS}/{settings.RATE_LIMIT_WINDOW}seconds")
+@standard_rate_limit()
 async def root(request: Request):
     """Root endpoint."""
     return {
@@ -85,7 +155,7 @@ async def root(request: Request):
 
 
 @app.get("/health")
-@limiter.limit("30/60seconds")  
+@rate_limit(settings.RATE_LIMIT_REQUESTS / 30)
 async def health_check(request: Request):
     """Health check endpoint."""
     try:
@@ -94,14 +164,48 @@ async def health_check(request: Request):
             await mongodb.admin.command('ping')
             database_connected = True
         except Exception as e:
-            logger.warning(f"Database health check failed: {e}")
+            logger.warning("Database health check failed: %s", e)
 
         return {
             "status": "healthy" if database_connected else "degraded",
             "database_connected": database_connected,
-            "version": settings.API_V1_STR
+            "version": settings.API_V1_STR,
+            "cache": {
+                **entity_cache.stats(),
+                "change_stream": cache_invalidation_listener.stats()
+            },
+            "negative_cache": negative_cache.stats(),
+            "coalescing": request_coalescer.stats(),
+            "stale_cache": stale_cache.stats(),
+            "event_loop": loop_monitor.stats(),
+            "admission": admission_controller.stats()
         }
 
     except Exception as e:
-        logger.error(f"Health check failed: {e}")
-        raise HTTPException(status_code=500, detail="Health check failed")
\ No newline at end of file
+        logger.error("Health check failed: %s", e)
+        raise HTTPException(status_code=500, detail="Health check failed")
+
+metrics.register_stats("entity_cache", "Entity cache", entity_cache.stats)
+metrics.register_stats("negative_cache", "Negative lookup cache", negative_cache.stats)
+metrics.register_stats("coalescing", "List read coalescing", request_coalescer.stats)
+metrics.register_stats("stale_cache", "Stale-while-revalidate cache", stale_cache.stats)
+metrics.register_stats("change_stream", "Cache invalidation change stream", cache_invalidation_listener.stats)
+metrics.register_stats("admission", "Admission control", admission_controller.stats)
+metrics.register_stats("compression", "Response compression", compressed_variants.stats)
+metrics.register_stats("event_loop", "Event loop monitor", loop_monitor.stats)
+metrics.register_stats("logging", "Log pipeline", logging_stats)
+metrics.register_stats("profiling", "Request profiler", profiler.stats)
+metrics.register_stats("tracing", "Request tracing", tracer.stats)
+metrics.register_stats("indexes", "Index manifest", index_manager.stats)
+metrics.register_stats("migrations", "Data migration progress", migration_runner.stats)
+metrics.register_stats("jobs", "Background jobs", job_runner.stats)
+metrics.register_stats("read_your_writes", "Users with writes in the read-your-writes window", causal_tokens.stats)
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+@rate_limit(settings.RATE_LIMIT_REQUESTS / 30)
+async def metrics_endpoint():
+    """Metrics in the Prometheus text exposition format."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,19 @@
+from typing import Optional, List
+from pydantic import BaseModel
+from datetime import datetime
+
+
+class JobStatus(BaseModel):
+    id: str
+    type: str
+    state: str
+    attempts: int
+    steps_done: List[str]
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    run_after: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
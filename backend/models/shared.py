@@ -59,4 +59,6 @@ class FilterParams(BaseModel):
 
 class TimeStampMixin(BaseModel):
     created_at: datetime = Field(default_factory=datetime.now(timezone.utc))
-    updated_at: Optional[datetime] = None
\ No newline at end of file
+    updated_at: Optional[datetime] = None
+    # Write counter used for ETags; never part of API responses
+    version: int = Field(default=0, exclude=True)
\ No newline at end of file
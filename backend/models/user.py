@@ -87,6 +87,8 @@ class UserPublic(BaseModel):
     institute: str
     grad_year: int
     created_at: datetime
+    updated_at: Optional[datetime] = Field(default=None, exclude=True)
+    version: int = Field(default=0, exclude=True)
     
     class Config:
         from_attributes = True
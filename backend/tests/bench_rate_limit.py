@@ -0,0 +1,86 @@
+"""
+Per-request overhead of the rate limiter.
+
+Times the GCRA store on its own (one key, and many distinct keys), then
+whole requests to `GET /` with the limiter's check in place and replaced
+by a no-op. The key dependency still runs in both, as its identity lookup
+is shared with other app-wide dependencies:
+
+    python tests/bench_rate_limit.py [--requests 20000] [--keys 100000] [--rounds 5]
+
+With RATE_LIMIT_BACKEND=mongo and a reachable MONGODB_URL the store
+figures include the round trip to the shared collection.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "runegard_bench")
+os.environ.setdefault("CLERK_SECRET_KEY", "sk_bench")
+os.environ.setdefault("CLERK_PUBLISHABLE_KEY", "pk_bench")
+os.environ.setdefault("ENVIRONMENT", "bench")
+
+from starlette.testclient import TestClient  # noqa: E402
+
+from core.middleware import RateLimit, _create_store, limiter  # noqa: E402
+
+
+async def time_store(keys: int, calls: int) -> float:
+    """Microseconds per acquire, cycling through `keys` keys."""
+    store = _create_store()
+    # Generous enough that no call is denied; denials are cheaper
+    limit = RateLimit(requests=1_000_000, window=1)
+    now = time.time()
+    started = time.perf_counter()
+    for i in range(calls):
+        await store.acquire(f"ip:{i % keys}", limit, now, 1.0)
+    return (time.perf_counter() - started) / calls * 1_000_000
+
+
+def time_requests(client: TestClient, requests: int) -> float:
+    """Microseconds per GET / through the whole middleware stack."""
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get("/")
+    return (time.perf_counter() - started) / requests * 1_000_000
+
+
+def main(args: argparse.Namespace):
+    from main import app
+
+    print(f"store: {type(limiter.store).__name__}")
+    print(f"{'acquire, 1 key':<28}{asyncio.run(time_store(1, args.requests)):10.2f} us")
+    print(f"{f'acquire, {args.keys} keys':<28}{asyncio.run(time_store(args.keys, args.keys)):10.2f} us")
+
+    # Budget large enough that the benchmark itself is never throttled
+    limiter.limit = RateLimit(requests=10 ** 9, window=1)
+    client = TestClient(app)
+    time_requests(client, 200)  # warm up
+
+    # Alternate the two setups and keep each one's best round, so drift
+    # in machine load does not land on one side only
+    async def skip_check(request, client_key):
+        pass
+
+    limited, unlimited = [], []
+    batch = max(args.requests // args.rounds, 1)
+    for _ in range(args.rounds):
+        limited.append(time_requests(client, batch))
+        limiter.check = skip_check
+        unlimited.append(time_requests(client, batch))
+        del limiter.check
+    print(f"{'GET / with the limiter':<28}{min(limited):10.2f} us")
+    print(f"{'GET / without':<28}{min(unlimited):10.2f} us")
+    print(f"{'rate limit check':<28}{min(limited) - min(unlimited):10.2f} us per request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the rate limiter's per-request overhead")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--keys", type=int, default=100000)
+    parser.add_argument("--rounds", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,189 @@
+"""
+Shared fixtures. Unit tests run anywhere; tests that need MongoDB take the
+`mongo` fixture and are skipped unless TEST_MONGODB_URL points at a server
+they may create and drop scratch databases on:
+
+    TEST_MONGODB_URL=mongodb://localhost:27017 python -m pytest
+"""
+import os
+import uuid
+
+# Settings are read on import, so they have to be in place before the app is
+TEST_MONGODB_URL = os.environ.get("TEST_MONGODB_URL")
+os.environ["MONGODB_URL"] = TEST_MONGODB_URL or "mongodb://localhost:27017"
+os.environ.setdefault("DATABASE_NAME", "runegard_test")
+os.environ.setdefault("CLERK_SECRET_KEY", "sk_test")
+os.environ.setdefault("CLERK_PUBLISHABLE_KEY", "pk_test")
+os.environ.setdefault("ENVIRONMENT", "test")
+
+from typing import Any, Dict, List, Tuple
+
+import httpx
+import pytest
+from pymongo import monitoring
+
+from core import auth
+from core.auth import identity_cache
+from core.cache import entity_cache, negative_cache, request_coalescer, stale_cache
+from core.middleware import MemoryRateLimitStore, limiter
+from core.utils import utc_now
+from db.migrations.runner import migration_runner
+
+
+class CommandLog(monitoring.CommandListener):
+    """Every command sent by clients created after it was registered."""
+
+    def __init__(self):
+        self.commands: List[Tuple[str, Any]] = []
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        self.commands.append((event.command_name, event.command.get(event.command_name)))
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        pass
+
+    def clear(self):
+        self.commands = []
+
+    def names(self) -> List[str]:
+        return [name for name, _ in self.commands]
+
+
+# Registered before any client exists, so every test client reports to it
+command_log = CommandLog()
+monitoring.register(command_log)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    """No cached results, spent rate limit budget or known-complete migrations carried between tests."""
+    monkeypatch.setattr(limiter, "store", MemoryRateLimitStore())
+    monkeypatch.setattr(migration_runner, "completed", set())
+    entity_cache.clear()
+    negative_cache.clear()
+    identity_cache._entries.clear()
+    yield
+    entity_cache.clear()
+    negative_cache.clear()
+
+
+@pytest.fixture
+def no_caches(monkeypatch):
+    """Every read reaches Mongo, so command counts do not depend on test order."""
+    for cache in (entity_cache, negative_cache, request_coalescer, stale_cache):
+        monkeypatch.setattr(cache, "enabled", False)
+
+
+@pytest.fixture
+async def mongo():
+    """A connected `mongodb` on a scratch database with the index manifest applied."""
+    if not TEST_MONGODB_URL:
+        pytest.skip("TEST_MONGODB_URL is not set")
+    from db.indexes import index_manager
+    from db.mongo import mongodb
+
+    await mongodb.connect()
+    name = f"runegard_test_{uuid.uuid4().hex[:8]}"
+    mongodb.use_database(name)
+    await index_manager.apply(mongodb.db)
+    try:
+        yield mongodb
+    finally:
+        await mongodb.client.drop_database(name)
+        await mongodb.disconnect()
+
+
+@pytest.fixture
+def commands(mongo):
+    """The command log, emptied of the fixture's own setup commands."""
+    command_log.clear()
+    return command_log
+
+
+@pytest.fixture
+async def client(mongo):
+    """The app without its lifespan; `mongo` stands in for the startup connection."""
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        yield http
+
+
+@pytest.fixture
+def create_user(mongo):
+    """Insert an active user document; keyword arguments override its fields."""
+    async def create(user_id: str, **fields) -> Dict[str, Any]:
+        now = utc_now()
+        document = {
+            "user_id": user_id,
+            "email": f"{user_id}@example.com",
+            "name": f"User {user_id}",
+            "bio": None,
+            "skills": ["python"],
+            "institute": "Test Institute",
+            "grad_year": 2026,
+            "created_at": now,
+            "updated_at": now,
+            "active": True,
+            **fields,
+        }
+        await mongo.users.insert_one(document)
+        return document
+    return create
+
+
+@pytest.fixture
+def create_project(mongo):
+    """Insert a project document owned by `created_by`."""
+    async def create(created_by: str, **fields) -> Dict[str, Any]:
+        now = utc_now()
+        document = {
+            "title": "Test project",
+            "abstract": "A project created by the test suite",
+            "tech_stack": ["python"],
+            "github_link": "https://github.com/example/test",
+            "contributors": [created_by],
+            "tags": [],
+            "status": "open",
+            "created_by": created_by,
+            "created_at": now,
+            "updated_at": now,
+            "upvotes": 0,
+            "upvoted_by": [],
+            "featured": False,
+            **fields,
+        }
+        await mongo.projects.insert_one(document)
+        return document
+    return create
+
+
+@pytest.fixture
+def sign_in(monkeypatch):
+    """
+    Accept `Bearer <user_id>` tokens without calling Clerk. Returns a
+    function building the headers of a signed-in user.
+    """
+    identities: Dict[str, dict] = {}
+
+    async def verify(token: str) -> dict:
+        if token not in identities:
+            raise auth.AuthenticationError("Invalid or expired token")
+        return identities[token]
+
+    monkeypatch.setattr(auth, "verify_clerk_token", verify)
+
+    def headers(user_id: str, email: str = None) -> Dict[str, str]:
+        identities[user_id] = {"user_id": user_id, "email": email or f"{user_id}@example.com", "name": user_id}
+        return {"Authorization": f"Bearer {user_id}"}
+
+    return headers
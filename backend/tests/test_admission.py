@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from core.admission import AdmissionController, ConcurrencyLimiter, ServiceOverloaded, classify, request_priority
+
+pytestmark = pytest.mark.anyio
+
+
+def make_request(method: str = "GET", token: bool = False, route_class: str = None) -> Request:
+    async def endpoint():
+        pass
+    if route_class is not None:
+        endpoint._route_class = route_class
+    headers = [(b"authorization", b"Bearer token")] if token else []
+    return Request({"type": "http", "method": method, "path": "/", "headers": headers, "endpoint": endpoint})
+
+
+async def queue(limiter: ConcurrencyLimiter, priority: int) -> asyncio.Task:
+    task = asyncio.ensure_future(limiter.acquire(priority))
+    await asyncio.sleep(0)
+    return task
+
+
+async def test_admits_up_to_the_limit_then_queues():
+    limiter = ConcurrencyLimiter("read", limit=2, queue_size=5, timeout=1)
+    assert await limiter.acquire(0) and await limiter.acquire(0)
+
+    waiter = await queue(limiter, 0)
+    assert not waiter.done()
+    assert limiter.stats()["queue_depth"] == 1
+
+    limiter.release()
+    assert await waiter is True
+    assert limiter.in_flight == 2
+
+
+async def test_released_slot_goes_to_the_highest_priority_waiter():
+    limiter = ConcurrencyLimiter("read", limit=1, queue_size=5, timeout=1)
+    await limiter.acquire(0)
+    low = await queue(limiter, 3)
+    high = await queue(limiter, 0)
+
+    limiter.release()
+    assert await high is True
+    assert not low.done()
+    limiter.release()
+    assert await low is True
+
+
+async def test_full_queue_sheds_the_newcomer_unless_it_outranks_a_waiter():
+    limiter = ConcurrencyLimiter("read", limit=1, queue_size=1, timeout=1)
+    await limiter.acquire(0)
+    anonymous = await queue(limiter, 3)
+
+    assert await limiter.acquire(3) is False
+    authenticated = await queue(limiter, 0)
+    assert await anonymous is False  # evicted to make room
+    assert limiter.shed == 2
+
+    limiter.release()
+    assert await authenticated is True
+
+
+async def test_waiters_time_out_as_shed():
+    limiter = ConcurrencyLimiter("read", limit=1, queue_size=5, timeout=0.01)
+    await limiter.acquire(0)
+    assert await limiter.acquire(0) is False
+    assert limiter.timeouts == 1
+    assert limiter.stats()["queue_depth"] == 0
+
+    # The timed-out waiter does not swallow the next release
+    limiter.release()
+    assert limiter.in_flight == 0
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    limiter = ConcurrencyLimiter("read", limit=1, queue_size=5, timeout=1)
+    await limiter.acquire(0)
+    waiter = await queue(limiter, 0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    limiter.release()
+    assert limiter.in_flight == 0
+    assert limiter.stats()["queue_depth"] == 0
+
+
+async def test_slot_raises_503_when_the_class_is_full(monkeypatch):
+    controller = AdmissionController()
+    monkeypatch.setattr(controller.classes["search"], "limit", 1)
+    monkeypatch.setattr(controller.classes["search"], "queue_size", 0)
+
+    async with controller.slot("search", 2):
+        with pytest.raises(ServiceOverloaded) as error:
+            async with controller.slot("search", 2):
+                pass
+    assert error.value.status_code == 503
+    assert "Retry-After" in error.value.headers
+    assert controller.classes["search"].in_flight == 0
+    assert controller.overall.in_flight == 0
+
+
+def test_requests_are_classified_by_tier_then_method():
+    assert classify(make_request("GET")) == "read"
+    assert classify(make_request("POST")) == "write"
+    assert classify(make_request("GET", route_class="search")) == "search"
+
+
+def test_anonymous_requests_rank_behind_authenticated_ones():
+    authenticated = request_priority(make_request(token=True), "search")
+    anonymous = request_priority(make_request(), "write")
+    assert authenticated < anonymous
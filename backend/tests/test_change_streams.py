@@ -0,0 +1,101 @@
+"""
+Writes made by another worker reach this process's caches only through the
+change stream. The "other worker" here is a second client: its writes go
+past this process's command listeners and cache invalidation calls.
+Change streams need a replica set; a single-node one is enough:
+
+    mongod --replSet rs0 ...  &&  mongosh --eval "rs.initiate()"
+    TEST_MONGODB_URL=mongodb://localhost:27017/?replicaSet=rs0 python -m pytest tests/test_change_streams.py
+"""
+import asyncio
+import time
+
+import pytest
+from bson import ObjectId
+from pymongo import AsyncMongoClient
+
+from core.cache import collection_versions
+from core.config import settings
+from db.change_streams import CacheInvalidationListener
+from db.crud.projects import project_crud
+from db.crud.users import user_crud
+
+pytestmark = pytest.mark.anyio
+
+
+async def wait_until(predicate, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not await predicate():
+        assert time.monotonic() < deadline, "timed out waiting for the change stream"
+        await asyncio.sleep(0.05)
+
+
+@pytest.fixture
+async def listener(mongo):
+    if not await mongo.supports_transactions():
+        pytest.skip("change streams need a replica set")
+    listener = CacheInvalidationListener()
+    await listener.start()
+
+    async def active():
+        return listener.active
+    await wait_until(active)
+    try:
+        yield listener
+    finally:
+        await listener.stop()
+
+
+@pytest.fixture
+async def other_worker(mongo):
+    client = AsyncMongoClient(settings.MONGODB_URL)
+    try:
+        yield client[mongo.db.name]
+    finally:
+        await client.close()
+
+
+async def test_remote_update_invalidates_cached_project(listener, other_worker, create_project):
+    project = await create_project("owner", title="Before")
+    project_id = str(project["_id"])
+    assert (await project_crud.get_project_by_id(project_id)).title == "Before"
+
+    await other_worker.projects.update_one({"_id": project["_id"]}, {"$set": {"title": "After"}})
+
+    async def refreshed():
+        return (await project_crud.get_project_by_id(project_id)).title == "After"
+    await wait_until(refreshed)
+
+
+async def test_remote_delete_drops_cached_profile(listener, other_worker, create_user):
+    await create_user("remote_delete")
+    assert await user_crud.get_user_public("remote_delete") is not None
+
+    await other_worker.users.delete_one({"user_id": "remote_delete"})
+
+    async def gone():
+        return await user_crud.get_user_public("remote_delete") is None
+    await wait_until(gone)
+
+
+async def test_remote_insert_clears_negative_entry(listener, other_worker, create_project):
+    project_id = ObjectId()
+    assert await project_crud.get_project_by_id(str(project_id)) is None
+
+    template = await create_project("owner")
+    await other_worker.projects.insert_one({**template, "_id": project_id})
+
+    async def found():
+        return await project_crud.get_project_by_id(str(project_id)) is not None
+    await wait_until(found)
+
+
+async def test_remote_write_bumps_collection_version(listener, other_worker):
+    assert collection_versions.coherent
+    before = collection_versions.get("testimonials")
+
+    await other_worker.testimonials.insert_one({"from_user": "a", "project_id": "p", "content": "Remote write"})
+
+    async def bumped():
+        return collection_versions.get("testimonials") != before
+    await wait_until(bumped)
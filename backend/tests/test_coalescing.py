@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from core.cache import RequestCoalescer, collection_versions, use_private_reads
+
+pytestmark = pytest.mark.anyio
+
+
+class Lists:
+    """A CRUD-like list read that counts the queries it would send."""
+
+    def __init__(self, coalescer: RequestCoalescer):
+        self.queries = 0
+        self.release = asyncio.Event()
+        self.release.set()
+        self.fail = False
+
+        @coalescer.coalesce("things", collections=("things",))
+        async def list_things(crud, tags=None, limit: int = 10):
+            self.queries += 1
+            await self.release.wait()
+            if self.fail:
+                raise RuntimeError("database unavailable")
+            return [f"thing-{i}" for i in range(limit)]
+
+        self.list_things = list_things
+
+
+async def test_concurrent_identical_reads_share_one_query():
+    coalescer = RequestCoalescer(window=0, max_entries=10)
+    lists = Lists(coalescer)
+    lists.release.clear()
+
+    calls = [asyncio.ensure_future(lists.list_things(None, limit=3)) for _ in range(5)]
+    await asyncio.sleep(0)
+    lists.release.set()
+    results = await asyncio.gather(*calls)
+
+    assert lists.queries == 1
+    assert all(result == ["thing-0", "thing-1", "thing-2"] for result in results)
+    stats = coalescer.stats()
+    assert (stats["calls"], stats["executions"], stats["coalesced"]) == (5, 1, 4)
+    assert stats["coalescing_ratio"] == 0.8
+    assert stats["in_flight"] == 0
+
+
+async def test_arguments_are_normalized_into_one_key():
+    coalescer = RequestCoalescer(window=5, max_entries=10)
+    lists = Lists(coalescer)
+
+    await lists.list_things(None, ["b", "a"], 10)
+    await lists.list_things(None, tags=["a", "b"])
+    assert lists.queries == 1
+
+    await lists.list_things(None, tags=["a"])
+    assert lists.queries == 2
+
+
+async def test_window_reuses_completed_results():
+    coalescer = RequestCoalescer(window=5, max_entries=10)
+    lists = Lists(coalescer)
+
+    await lists.list_things(None)
+    await lists.list_things(None)
+    assert lists.queries == 1
+    assert coalescer.stats()["window_hits"] == 1
+
+
+async def test_write_to_the_collection_starts_a_new_query():
+    coalescer = RequestCoalescer(window=5, max_entries=10)
+    lists = Lists(coalescer)
+
+    await lists.list_things(None)
+    collection_versions.bump("things")
+    await lists.list_things(None)
+    assert lists.queries == 2
+
+
+async def test_failures_are_shared_but_not_kept():
+    coalescer = RequestCoalescer(window=5, max_entries=10)
+    lists = Lists(coalescer)
+    lists.fail = True
+
+    with pytest.raises(RuntimeError):
+        await lists.list_things(None)
+    lists.fail = False
+    assert len(await lists.list_things(None)) == 10
+    assert lists.queries == 2
+
+
+async def test_a_caller_leaving_does_not_cancel_the_shared_query():
+    coalescer = RequestCoalescer(window=0, max_entries=10)
+    lists = Lists(coalescer)
+    lists.release.clear()
+
+    first = asyncio.ensure_future(lists.list_things(None))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(lists.list_things(None))
+    await asyncio.sleep(0)
+    first.cancel()
+    lists.release.set()
+
+    assert len(await second) == 10
+    assert lists.queries == 1
+
+
+async def test_private_reads_bypass_the_coalescer():
+    coalescer = RequestCoalescer(window=5, max_entries=10)
+    lists = Lists(coalescer)
+
+    use_private_reads()
+    await lists.list_things(None)
+    await lists.list_things(None)
+    assert lists.queries == 2
+    assert coalescer.stats()["calls"] == 0
@@ -0,0 +1,73 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from core.compression import CompressionMiddleware, negotiate_encoding
+
+LARGE = {"items": ["x" * 40] * 100}
+
+
+async def large(request):
+    return JSONResponse(LARGE)
+
+
+async def small(request):
+    return JSONResponse({"ok": True})
+
+
+async def image(request):
+    return Response(b"\x89PNG" * 1000, media_type="image/png")
+
+
+async def not_modified(request):
+    return Response(status_code=304, headers={"ETag": 'W/"abc"'})
+
+
+@pytest.fixture
+def client():
+    app = Starlette(routes=[
+        Route("/large", large),
+        Route("/small", small),
+        Route("/image", image),
+        Route("/not-modified", not_modified),
+    ])
+    return TestClient(CompressionMiddleware(app, minimum_size=500))
+
+
+def test_negotiation_follows_q_values():
+    assert negotiate_encoding("gzip;q=0.5, br", ["zstd", "br", "gzip"]) == "br"
+    assert negotiate_encoding("gzip;q=0", ["gzip"]) is None
+    assert negotiate_encoding("*", ["zstd", "gzip"]) == "zstd"
+
+
+def test_large_json_is_compressed(client):
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.json() == LARGE
+
+
+@pytest.mark.parametrize("path, accept", [
+    ("/small", "gzip"),          # below the threshold
+    ("/large", "identity"),      # nothing we support
+    ("/large", ""),
+])
+def test_uncompressed_json_still_varies(client, path, accept):
+    response = client.get(path, headers={"Accept-Encoding": accept})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_not_modified_varies_like_the_full_response(client):
+    response = client.get("/not-modified", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 304
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_incompressible_types_pass_through(client):
+    response = client.get("/image", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+    assert response.content.startswith(b"\x89PNG")
@@ -0,0 +1,159 @@
+import pytest
+from bson import Timestamp
+from fastapi import HTTPException, Response
+from starlette.requests import Request
+
+from core import conditional
+from core.cache import CollectionVersions
+from db import consistency
+
+
+def make_request(path: str = "/projects/", query: str = "", headers: dict = None) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    })
+
+
+def token(position: int) -> dict:
+    return {"_data": f"8264{position:08X}"}
+
+
+@pytest.fixture
+async def read_state():
+    state = consistency.ReadState(None)
+    reset = consistency._read_state.set(state)
+    try:
+        yield state
+    finally:
+        consistency._read_state.reset(reset)
+
+
+@pytest.fixture
+def versions(monkeypatch):
+    versions = CollectionVersions()
+    monkeypatch.setattr(conditional, "collection_versions", versions)
+    return versions
+
+
+def test_local_writes_change_the_tag(versions):
+    before = conditional.list_etag(make_request(), ("projects",))
+    versions.bump("projects")
+    assert conditional.list_etag(make_request(), ("projects",)) != before
+
+
+def test_restarted_process_does_not_reissue_old_tags():
+    # Same counters, new process: the epoch keeps the tags apart
+    first, second = CollectionVersions(), CollectionVersions()
+    assert first.get("projects") != second.get("projects")
+
+
+def test_change_stream_is_the_only_source_while_it_runs():
+    versions = CollectionVersions()
+    versions.follow(token(1))
+    before = versions.get("projects")
+
+    versions.bump("projects")
+    assert versions.get("projects") == before
+
+    versions.observe("projects", token(2))
+    assert versions.get("projects") != before
+
+
+def test_workers_on_the_same_stream_agree():
+    a, b = CollectionVersions(), CollectionVersions()
+    a.follow(token(1))
+    b.follow(token(3))
+    for worker in (a, b):
+        worker.observe("projects", token(5))
+    assert a.get("projects") == b.get("projects")
+
+
+def test_database_wide_change_moves_every_collection():
+    versions = CollectionVersions()
+    versions.follow(token(1))
+    versions.observe("users", token(2))
+    before = {name: versions.get(name) for name in ("users", "projects")}
+
+    versions.observe(None, token(3))
+    assert all(versions.get(name) != version for name, version in before.items())
+
+
+def test_losing_the_stream_does_not_reissue_earlier_counter_tags():
+    versions = CollectionVersions()
+    unfollowed = versions.get("projects")
+    versions.follow(token(1))
+    versions.unfollow()
+    assert versions.get("projects") != unfollowed
+
+
+def test_tag_rotates_only_without_a_change_stream(versions, monkeypatch):
+    request = make_request()
+    monkeypatch.setattr(conditional.time, "time", lambda: 1000.0)
+    first = conditional.list_etag(request, ("projects",))
+    monkeypatch.setattr(conditional.time, "time", lambda: 1000.0 + 3600)
+    assert conditional.list_etag(request, ("projects",)) != first
+
+    versions.follow(token(1))
+    coherent = conditional.list_etag(request, ("projects",))
+    monkeypatch.setattr(conditional.time, "time", lambda: 1000.0)
+    assert conditional.list_etag(request, ("projects",)) == coherent
+
+
+def test_if_none_match_uses_weak_comparison(versions):
+    etag = conditional.list_etag(make_request(), ("projects",))
+    request = make_request(headers={"If-None-Match": f'"other", {etag.removeprefix("W/")}'})
+    assert conditional.is_not_modified(request, etag)
+    assert not conditional.is_not_modified(make_request(headers={"If-None-Match": '"other"'}), etag)
+
+
+def test_cluster_time_is_unknown_without_a_change_stream():
+    versions = CollectionVersions()
+    versions.bump("projects")
+    assert versions.cluster_time(("projects",)) is None
+
+
+def test_cluster_time_covers_every_tagged_collection():
+    versions = CollectionVersions()
+    versions.follow(token(1), Timestamp(100, 1))
+    versions.observe("projects", token(2), Timestamp(105, 1))
+    versions.observe("users", token(3), Timestamp(110, 1))
+
+    assert versions.cluster_time(("projects",)) == Timestamp(105, 1)
+    assert versions.cluster_time(("projects", "users")) == Timestamp(110, 1)
+    # Unchanged since the stream opened
+    assert versions.cluster_time(("testimonials",)) == Timestamp(100, 1)
+
+
+def test_cluster_time_is_unknown_when_the_stream_opened_without_one():
+    versions = CollectionVersions()
+    versions.follow(token(1))
+    assert versions.cluster_time(("projects",)) is None
+
+
+@pytest.mark.anyio
+async def test_tagged_body_reads_after_the_tag(versions, read_state):
+    versions.follow(token(1), Timestamp(100, 1))
+    versions.observe("projects", token(2), Timestamp(105, 1))
+
+    await conditional.conditional_list("projects")(make_request(), Response())
+    assert read_state.after_cluster_time == Timestamp(105, 1)
+    assert not read_state.primary
+
+
+@pytest.mark.anyio
+async def test_tagged_body_without_a_cluster_time_reads_the_primary(versions, read_state):
+    await conditional.conditional_list("projects")(make_request(), Response())
+    assert read_state.primary
+
+
+@pytest.mark.anyio
+async def test_not_modified_reads_nothing(versions, read_state):
+    etag = conditional.list_etag(make_request(), ("projects",))
+    with pytest.raises(HTTPException) as raised:
+        await conditional.conditional_list("projects")(make_request(headers={"If-None-Match": etag}), Response())
+    assert raised.value.status_code == 304
+    assert not read_state.primary
@@ -0,0 +1,116 @@
+"""
+Mongo command budgets of the hot read paths. Each list is seeded with more
+documents than a page and by many distinct users, so a per-document lookup
+(an N+1) shows up as a blown budget rather than passing on a small fixture.
+"""
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from api.routes import projects, requests, testimonials, users
+from core.config import settings
+from core.db_stats import DbStatsMiddleware, current_db_stats, db_budget_exceeded, db_command_budget, track_db_commands
+from db.crud.projects import project_crud
+from db.crud.requests import teammate_request_crud
+from db.crud.testimonials import testimonial_crud
+from db.crud.users import user_crud
+
+pytestmark = pytest.mark.anyio
+
+AUTHORS = 15
+
+
+def route_budget(router, path: str, method: str = "GET") -> int:
+    """The command budget DbStatsMiddleware holds a route to."""
+    for route in router.routes:
+        if route.path == path and method in route.methods:
+            return getattr(route.endpoint, "_db_command_budget", settings.DB_COMMAND_BUDGET)
+    raise LookupError(f"no route {method} {path}")
+
+
+# The middleware itself, with commands recorded by hand
+
+def record(commands: int):
+    async def endpoint(request):
+        for _ in range(commands):
+            current_db_stats().record(0.001, 2)
+        return JSONResponse({"ok": True})
+    return endpoint
+
+
+@db_command_budget(2)
+async def tight(request):
+    return await record(3)(request)
+
+
+@pytest.fixture
+def stats_client():
+    app = Starlette(routes=[Route("/three", record(3)), Route("/tight", tight)])
+    return TestClient(DbStatsMiddleware(app, headers=True))
+
+
+def test_headers_report_the_request_totals(stats_client):
+    response = stats_client.get("/three")
+    assert response.headers["x-db-commands"] == "3"
+    assert 'desc="3 commands, 6 docs"' in response.headers["server-timing"]
+
+
+def test_exceeding_the_route_budget_is_counted(stats_client):
+    before = db_budget_exceeded._values.get(("/tight",), 0)
+    stats_client.get("/tight")
+    stats_client.get("/three")
+    assert db_budget_exceeded._values.get(("/tight",), 0) == before + 1
+    assert ("/three",) not in db_budget_exceeded._values
+
+
+def test_tracked_blocks_nest():
+    with track_db_commands() as outer:
+        current_db_stats().record(0.001, 1)
+        with track_db_commands() as inner:
+            current_db_stats().record(0.001, 1)
+    assert (outer.commands, inner.commands) == (1, 1)
+
+
+# Hot endpoints against a real server
+
+@pytest.fixture
+async def seeded(mongo, create_user, create_project, no_caches):
+    owner = await create_user("author_0")
+    for i in range(1, AUTHORS):
+        await create_user(f"author_{i}")
+    project = await create_project(owner["user_id"])
+    projects = [project] + [await create_project(f"author_{i}") for i in range(1, AUTHORS)]
+    await mongo.testimonials.insert_many([
+        {"from_user": f"author_{i}", "project_id": str(project["_id"]), "content": f"Testimonial {i}", "created_at": project["created_at"]}
+        for i in range(AUTHORS)
+    ] + [
+        {"from_user": "author_0", "project_id": str(other["_id"]), "content": "By the owner", "created_at": other["created_at"]}
+        for other in projects[1:]
+    ])
+    await mongo.teammate_requests.insert_many([
+        {"user_id": f"author_{i}", "looking_for": "A teammate", "description": "Seeded", "tags": [], "created_at": project["created_at"]}
+        for i in range(AUTHORS)
+    ])
+    return {"user_id": owner["user_id"], "project_id": str(project["_id"])}
+
+
+@pytest.mark.parametrize("router, path, call, expected", [
+    (testimonials.router, "/", lambda seed: testimonial_crud.get_all_testimonials(), 3),
+    (testimonials.router, "/my", lambda seed: testimonial_crud.get_testimonials_by_author(seed["user_id"]), 4),
+    (testimonials.router, "/project/{project_id}", lambda seed: testimonial_crud.get_testimonials_by_project(seed["project_id"]), 4),
+    (projects.router, "/", lambda seed: project_crud.get_projects(), 2),
+    (projects.router, "/{project_id}", lambda seed: project_crud.get_project_by_id(seed["project_id"]), 1),
+    (projects.router, "/trending", lambda seed: project_crud.get_trending_projects(), 1),
+    (requests.router, "/", lambda seed: teammate_request_crud.get_requests(), 2),
+    (users.router, "/{user_id}", lambda seed: user_crud.get_user_public(seed["user_id"]), 1),
+    (users.router, "/{user_id}/stats", lambda seed: user_crud.get_user_stats(seed["user_id"]), 4),
+])
+async def test_hot_reads_stay_within_budget(seeded, router, path, call, expected):
+    with track_db_commands() as stats:
+        await call(seeded)
+
+    assert stats.commands <= route_budget(router, path)
+    # Exact, so a new per-document lookup fails here before it reaches the budget
+    assert stats.commands == expected
@@ -0,0 +1,52 @@
+import pytest
+from pydantic import BaseModel
+
+from core.cache import EntityCache
+
+pytestmark = pytest.mark.anyio
+
+
+class Thing(BaseModel):
+    id: str
+    owner: str
+
+
+class Lookups:
+    def __init__(self, cache: EntityCache):
+        self.calls = 0
+
+        @cache.cached("thing", Thing, tags=lambda thing: [f"owner:{thing.owner}"])
+        async def get(crud, thing_id: str, owner: str = "a") -> Thing:
+            self.calls += 1
+            return Thing(id=thing_id, owner=owner)
+
+        self.get = get
+
+
+async def test_positional_and_keyword_calls_share_an_entry():
+    cache = EntityCache(max_entries=10, ttl=30)
+    lookups = Lookups(cache)
+
+    await lookups.get(None, "t1")
+    await lookups.get(None, thing_id="t1")
+    await lookups.get(None, "t1", owner="a")
+    assert lookups.calls == 1
+
+
+async def test_keyword_call_is_invalidated_by_tag():
+    cache = EntityCache(max_entries=10, ttl=30)
+    lookups = Lookups(cache)
+
+    await lookups.get(None, thing_id="t1")
+    await cache.invalidate("owner:a")
+    await lookups.get(None, "t1")
+    assert lookups.calls == 2
+
+
+async def test_arguments_still_tell_entries_apart():
+    cache = EntityCache(max_entries=10, ttl=30)
+    lookups = Lookups(cache)
+
+    assert (await lookups.get(None, "t1", "a")).owner == "a"
+    assert (await lookups.get(None, "t1", owner="b")).owner == "b"
+    assert lookups.calls == 2
@@ -0,0 +1,224 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+
+from core.config import settings
+from core.utils import utc_now
+from db import indexes
+from db.indexes import MANIFEST_VERSION, META_ID, IndexManager, plan
+from db.leases import META_COLLECTION
+
+pytestmark = pytest.mark.anyio
+
+MANIFEST = {
+    "things": [
+        IndexModel([("owner", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("slug", ASCENDING)], unique=True),
+        IndexModel([("title", TEXT)]),
+    ],
+}
+
+
+class FakeCollection:
+    def __init__(self, name: str, db: "FakeDatabase"):
+        self.name = name
+        self.db = db
+        self.live = {"_id_": {"key": [("_id", 1)], "v": 2}}
+        self.usage = {}
+
+    async def index_information(self):
+        return dict(self.live)
+
+    async def create_indexes(self, models):
+        for model in models:
+            document = dict(model.document)
+            name = document.pop("name")
+            self.db.ops.append(("create", name))
+            if name in self.db.failing:
+                raise RuntimeError("index build failed")
+            await asyncio.sleep(self.db.build_seconds)
+            self.live[name] = {**document, "key": list(document["key"].items())}
+
+    async def drop_index(self, name: str):
+        self.db.ops.append(("drop", name))
+        del self.live[name]
+
+    async def aggregate(self, pipeline):
+        return AsyncList([{"name": name, "accesses": accesses} for name, accesses in self.usage.items()])
+
+
+class AsyncList:
+    def __init__(self, items):
+        self.items = items
+
+    async def __aiter__(self):
+        for item in self.items:
+            yield item
+
+
+class FakeMeta:
+    def __init__(self, db: "FakeDatabase"):
+        self.db = db
+        self.documents = {}
+
+    async def find_one_and_update(self, filter_, update, upsert, return_document):
+        if self.db.lease_held:
+            return None
+        document = self.documents.setdefault(filter_["_id"], {"_id": filter_["_id"]})
+        document.update(update["$set"])
+        return document
+
+    async def update_one(self, filter_, update):
+        if "lease_expires" in update["$set"] and "lease_owner" in filter_:
+            self.db.renewals += 1
+        self.documents.setdefault(filter_["_id"], {"_id": filter_["_id"]}).update(update["$set"])
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.ops = []
+        self.failing = set()
+        self.build_seconds = 0.0
+        self.lease_held = False
+        self.renewals = 0
+        self.meta = FakeMeta(self)
+        self.collections = {}
+
+    def __getitem__(self, name: str):
+        if name == META_COLLECTION:
+            return self.meta
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(name, self)
+        return self.collections[name]
+
+    def recorded_version(self):
+        return self.meta.documents.get(META_ID, {}).get("version")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(indexes, "INDEXES", MANIFEST)
+    return FakeDatabase()
+
+
+def manager() -> IndexManager:
+    return IndexManager(lease_seconds=60, unused_after_days=14)
+
+
+async def test_plan_diffs_the_manifest_against_live_indexes(db):
+    things = db["things"]
+    things.live["slug_1"] = {"key": [("slug", 1)], "v": 2}  # not unique yet
+    things.live["title_text"] = {"key": [("_fts", "text"), ("_ftsx", 1)], "weights": {"title": 1}}
+    things.live["legacy_1"] = {"key": [("legacy", 1)]}
+    since = utc_now()
+    things.usage = {"legacy_1": {"ops": 0, "since": since}}
+
+    diff = await plan(db)
+    assert diff.summary() == {
+        "create": {"things": ["owner_1_created_at_-1"]},
+        "changed": {"things": ["slug_1"]},
+        "unmanaged": {"things": [{"name": "legacy_1", "ops": 0, "since": since}]},
+    }
+    assert not diff.empty
+
+
+async def test_apply_builds_one_index_at_a_time_and_records_the_version(db):
+    index_manager = manager()
+    diff = await index_manager.apply(db)
+
+    assert [name for _, name in db.ops] == ["owner_1_created_at_-1", "slug_1", "title_text"]
+    assert db.recorded_version() == MANIFEST_VERSION
+    assert index_manager.stats() == {
+        "manifest_version": MANIFEST_VERSION, "applied_version": MANIFEST_VERSION, "pending": 0, "built": 3, "failed": 0,
+    }
+    assert (await plan(db)).empty
+    assert diff is not None
+
+
+async def test_changed_index_is_replaced_behind_a_stand_in(db):
+    await manager().apply(db)
+    db["things"].live["slug_1"].pop("unique")
+    db.ops = []
+
+    await manager().apply(db)
+    assert db.ops == [("create", "slug_1_rebuild"), ("drop", "slug_1"), ("create", "slug_1"), ("drop", "slug_1_rebuild")]
+    assert db["things"].live["slug_1"]["unique"] is True
+    assert "slug_1_rebuild" not in db["things"].live
+
+
+async def test_text_index_is_rebuilt_in_place(db, monkeypatch):
+    changed = {"things": [IndexModel([("title", TEXT)], sparse=True)]}
+    await manager().apply(db)
+    monkeypatch.setattr(indexes, "INDEXES", changed)
+    db.ops = []
+
+    await manager().apply(db)
+    assert db.ops == [("drop", "title_text"), ("create", "title_text")]
+
+
+async def test_failed_build_leaves_the_version_unrecorded(db):
+    db.failing = {"slug_1"}
+    index_manager = manager()
+    await index_manager.apply(db)
+
+    assert db.recorded_version() is None
+    assert index_manager.applied_version is None
+    assert index_manager.stats()["failed"] == 1
+    assert "owner_1_created_at_-1" in db["things"].live
+
+
+async def test_failed_rebuild_keeps_the_stand_in_until_the_index_builds(db):
+    await manager().apply(db)
+    db["things"].live["slug_1"].pop("unique")
+    db.failing = {"slug_1"}
+    await manager().apply(db)
+    assert "slug_1_rebuild" in db["things"].live
+
+    db.failing = set()
+    await manager().apply(db)
+    assert "slug_1" in db["things"].live
+    assert "slug_1_rebuild" not in db["things"].live
+    assert db.recorded_version() == MANIFEST_VERSION
+
+
+async def test_lease_held_elsewhere_skips_the_run(db):
+    db.lease_held = True
+    assert await manager().apply(db) is None
+    assert db.ops == []
+
+
+async def test_lease_is_renewed_while_a_build_runs(db):
+    db.build_seconds = 0.05
+    index_manager = IndexManager(lease_seconds=0.03, unused_after_days=14)
+    await index_manager.apply(db)
+    assert db.renewals >= 3
+
+
+async def test_unused_indexes_are_dropped_only_when_idle_long_enough(db, monkeypatch):
+    monkeypatch.setattr(settings, "SECONDARY_READS_ENABLED", False)
+    things = db["things"]
+    things.live["idle_1"] = {"key": [("idle", 1)]}
+    things.live["fresh_1"] = {"key": [("fresh", 1)]}
+    things.live["used_1"] = {"key": [("used", 1)]}
+    old = utc_now() - timedelta(days=30)
+    things.usage = {
+        "idle_1": {"ops": 0, "since": old},
+        "fresh_1": {"ops": 0, "since": utc_now()},
+        "used_1": {"ops": 12, "since": old},
+    }
+
+    await manager().apply(db, drop_unused=True)
+    assert ("drop", "idle_1") in db.ops
+    assert {"fresh_1", "used_1"} <= set(things.live)
+
+
+async def test_unused_indexes_are_kept_while_reads_go_to_secondaries(db, monkeypatch):
+    monkeypatch.setattr(settings, "SECONDARY_READS_ENABLED", True)
+    things = db["things"]
+    things.live["idle_1"] = {"key": [("idle", 1)]}
+    things.usage = {"idle_1": {"ops": 0, "since": utc_now() - timedelta(days=30)}}
+
+    await manager().apply(db, drop_unused=True)
+    assert "idle_1" in things.live
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from db.crud.users import user_crud
+from db.jobs import QUEUED, SUCCEEDED, job_runner
+
+pytestmark = pytest.mark.anyio
+
+
+async def run_next_job():
+    """Claim and run one due job in this process, as a worker would."""
+    document = await job_runner._claim()
+    assert document is not None, "no job was due"
+    await job_runner._execute(document)
+    return await job_runner.get(document["_id"])
+
+
+@pytest.fixture(autouse=True)
+def no_batch_pause(monkeypatch):
+    monkeypatch.setattr(job_runner, "batch_pause", 0)
+
+
+async def test_deleting_a_user_from_before_the_flag_removes_the_record(mongo, create_user, create_project, no_caches):
+    await create_user("legacy")
+    await mongo.users.update_one({"user_id": "legacy"}, {"$unset": {"active": ""}})
+    await create_project("legacy")
+
+    job = await user_crud.delete_user("legacy")
+    assert job is not None
+    assert not await user_crud.user_exists("legacy")
+
+    assert (await run_next_job())["state"] == SUCCEEDED
+    assert await mongo.users.find_one({"user_id": "legacy"}) is None
+    assert await mongo.projects.count_documents({"created_by": "legacy"}) == 0
+
+
+async def test_concurrent_enqueues_share_one_job(mongo):
+    jobs = await asyncio.gather(*(
+        job_runner.enqueue("noop", {}, dedupe_key="noop:1") for _ in range(20)
+    ))
+    assert len({job["_id"] for job in jobs}) == 1
+    assert await mongo.jobs.count_documents({"dedupe_key": "noop:1"}) == 1
+
+
+async def test_finished_job_frees_its_dedupe_key(mongo, monkeypatch):
+    async def noop(job):
+        pass
+    monkeypatch.setitem(job_runner._handlers, "noop", noop)
+
+    first = await job_runner.enqueue("noop", {}, dedupe_key="noop:2")
+    finished = await run_next_job()
+    assert finished["state"] == SUCCEEDED
+    assert "active_dedupe_key" not in finished
+
+    second = await job_runner.enqueue("noop", {}, dedupe_key="noop:2")
+    assert second["_id"] != first["_id"]
+
+
+async def test_cancelled_job_is_requeued_without_spending_an_attempt(mongo, monkeypatch):
+    async def interrupted(job):
+        raise asyncio.CancelledError
+    monkeypatch.setitem(job_runner._handlers, "interrupted", interrupted)
+
+    job = await job_runner.enqueue("interrupted", {})
+    document = await job_runner._claim()
+    with pytest.raises(asyncio.CancelledError):
+        await job_runner._execute(document)
+
+    requeued = await job_runner.get(job["_id"])
+    assert requeued["state"] == QUEUED
+    assert requeued["attempts"] == 0
@@ -0,0 +1,100 @@
+import json
+import logging
+import logging.config
+import queue
+import sys
+
+import pytest
+from uvicorn.config import LOGGING_CONFIG
+
+from core import logging_config
+from core.logging_config import DroppingQueueHandler, JsonFormatter, SamplingFilter, _parse_sampling, setup_logging
+
+
+@pytest.fixture
+def restore_logging():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    root.handlers = handlers
+    root.setLevel(level)
+
+
+def test_uvicorn_loggers_write_through_the_queue(restore_logging):
+    # What uvicorn does before it imports the app
+    logging.config.dictConfig(LOGGING_CONFIG)
+    handler, listener = setup_logging()
+    listener.stop()
+
+    for name in logging_config._UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        assert uvicorn_logger.handlers == []
+        assert uvicorn_logger.propagate
+    assert logging.getLogger().handlers == [handler]
+    assert isinstance(handler, DroppingQueueHandler)
+
+    logging.getLogger("uvicorn.error").warning("Started server process [%d]", 1)
+    assert handler.queue.get_nowait().getMessage() == "Started server process [1]"
+
+
+def make_record(name: str = "api.routes", level: int = logging.INFO, msg: str = "hello %s", args=("world",), **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_queued_records_keep_the_values_at_log_time():
+    handler = DroppingQueueHandler(queue.Queue())
+    values = ["before"]
+    handler.handle(make_record(args=(values,)))
+    values.append("after")
+
+    record = handler.queue.get_nowait()
+    assert record.getMessage() == "hello ['before']"
+    assert record.args is None
+
+
+def test_full_queue_drops_and_counts_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    for _ in range(3):
+        handler.handle(make_record())
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 2
+
+
+def test_sampling_applies_to_the_logger_and_its_children():
+    sampling = SamplingFilter({"db": 0.0, "api.routes": 1.0})
+    assert not sampling.filter(make_record("db"))
+    assert not sampling.filter(make_record("db.crud.users", logging.DEBUG))
+    assert sampling.filter(make_record("api.routes.projects"))
+    assert sampling.filter(make_record("core.cache"))
+    assert sampling.filter(make_record("dbx"))
+
+
+def test_sampling_never_drops_warnings():
+    sampling = SamplingFilter({"db": 0.0})
+    assert sampling.filter(make_record("db.jobs", logging.WARNING))
+    assert sampling.filter(make_record("db.jobs", logging.ERROR))
+
+
+def test_sampling_spec_is_parsed():
+    assert _parse_sampling("api.routes=0.1, db=0.5,,broken") == {"api.routes": 0.1, "db": 0.5}
+    assert _parse_sampling("") == {}
+
+
+def test_json_lines_carry_extras_but_not_uvicorns_colored_copy():
+    record = make_record(request_id="r1", color_message="\x1b[1mhello\x1b[0m")
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "hello world"
+    assert entry["level"] == "INFO" and entry["logger"] == "api.routes"
+    assert entry["request_id"] == "r1"
+    assert "color_message" not in entry
+
+
+def test_json_lines_include_the_exception():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("db", logging.ERROR, __file__, 1, "failed", (), sys.exc_info())
+    entry = json.loads(JsonFormatter().format(record))
+    assert "ValueError: boom" in entry["exception"]
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+from core.loop_monitor import LoopLagMonitor, loop_stalls
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def monitor():
+    monitor = LoopLagMonitor(interval=0.01, threshold=0.05, log_interval=0)
+    await monitor.start()
+    yield monitor
+    await monitor.stop()
+
+
+def block_the_loop(seconds: float):
+    time.sleep(seconds)
+
+
+async def serve(monitor: LoopLagMonitor, scope, seconds: float):
+    task = monitor.track(scope)
+    try:
+        await asyncio.sleep(0.02)
+        block_the_loop(seconds)
+    finally:
+        monitor.untrack(task)
+
+
+async def test_stall_is_attributed_to_the_blocking_request(monitor, caplog):
+    caplog.set_level(logging.WARNING, logger="core.loop_monitor")
+    scope = {"type": "http", "method": "GET", "path": "/api/things/1"}
+
+    await serve(monitor, scope, 0.2)
+    await asyncio.sleep(0.05)
+
+    assert monitor.stalls == 1
+    assert monitor.stats()["max_lag_ms"] >= 150
+    assert loop_stalls._values.get(("GET /api/things/1",))
+    [record] = [record for record in caplog.records if "blocked" in record.getMessage()]
+    assert "GET /api/things/1" in record.getMessage()
+    assert "block_the_loop" in record.getMessage()
+    assert not monitor._requests
+
+
+async def test_short_pauses_are_not_stalls(monitor):
+    await serve(monitor, {"type": "http", "method": "GET", "path": "/"}, 0.01)
+    await asyncio.sleep(0.05)
+    assert monitor.stalls == 0
+
+
+async def test_stall_outside_any_request_is_background(monitor):
+    before = loop_stalls._values.get(("background",), 0)
+    await asyncio.sleep(0.02)
+    block_the_loop(0.2)
+    await asyncio.sleep(0.05)
+    assert loop_stalls._values.get(("background",), 0) == before + 1
+
+
+async def test_repeated_stalls_are_logged_once_per_interval(monitor, caplog):
+    caplog.set_level(logging.WARNING, logger="core.loop_monitor")
+    monitor.log_interval = 60
+    for _ in range(2):
+        await asyncio.sleep(0.02)
+        block_the_loop(0.15)
+        await asyncio.sleep(0.05)
+
+    assert monitor.stalls == 2
+    assert len([record for record in caplog.records if "blocked" in record.getMessage()]) == 1
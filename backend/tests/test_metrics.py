@@ -0,0 +1,78 @@
+from fastapi import APIRouter, FastAPI
+from starlette.testclient import TestClient
+
+from core.metrics import CONTENT_TYPE, MetricsMiddleware, MetricsRegistry, http_requests
+
+
+def test_counter_renders_help_type_and_labelled_totals():
+    registry = MetricsRegistry()
+    counter = registry.counter("things", "Things seen", ("kind",))
+    counter.inc("a")
+    counter.inc("a", amount=2)
+    counter.inc('quote"d')
+
+    assert registry.render().splitlines() == [
+        "# HELP runegard_things Things seen",
+        "# TYPE runegard_things counter",
+        'runegard_things_total{kind="a"} 3',
+        'runegard_things_total{kind="quote\\"d"} 1',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'runegard_latency_seconds_bucket{le="0.1"} 2',
+        'runegard_latency_seconds_bucket{le="1"} 3',
+        'runegard_latency_seconds_bucket{le="+Inf"} 4',
+        "runegard_latency_seconds_sum 3.65",
+        "runegard_latency_seconds_count 4",
+    ]
+
+
+def test_stats_gauges_flatten_numeric_fields():
+    registry = MetricsRegistry()
+    registry.register_stats("cache", "Cache", lambda: {
+        "enabled": True, "entries": 4, "hit_ratio": 0.5, "backend": "memory", "classes": {"read": {"shed": 2}},
+    })
+
+    samples = [line for line in registry.render().splitlines() if not line.startswith("#")]
+    assert samples == [
+        "runegard_cache_enabled 1",
+        "runegard_cache_entries 4",
+        "runegard_cache_hit_ratio 0.5",
+        "runegard_cache_classes_read_shed 2",
+    ]
+    assert "# TYPE runegard_cache_entries gauge" in registry.render()
+
+
+def test_requests_are_labelled_by_route_template():
+    router = APIRouter(prefix="/things")
+
+    @router.get("/{thing_id}")
+    async def get_thing(thing_id: str):
+        return {}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(MetricsMiddleware)
+
+    TestClient(app).get("/things/abc123")
+    TestClient(app).get("/missing")
+    assert http_requests._values.get(("/things/{thing_id}", "GET", "200"))
+    assert http_requests._values.get(("unmatched", "GET", "404"))
+
+
+def test_metrics_endpoint_serves_the_exposition_format():
+    from main import app
+
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE
+    assert "# TYPE runegard_http_requests counter" in response.text
+    assert "runegard_admission_overall_in_flight" in response.text
@@ -0,0 +1,67 @@
+import pytest
+
+from db.crud.users import ACTIVE_FLAG_MIGRATION, active_filter, user_crud
+from db.migrations.runner import CHECKPOINTS, Migration, load_migrations, migration_runner
+
+pytestmark = pytest.mark.anyio
+
+
+def test_active_flag_migration_is_the_one_that_backfills():
+    assert ACTIVE_FLAG_MIGRATION in {migration.id for migration in load_migrations()}
+
+
+def test_migration_without_filter_or_update_does_not_load():
+    class NoFilter(Migration):
+        collection = "users"
+
+        def update(self, document):
+            return None
+
+    class NoUpdate(Migration):
+        collection = "users"
+        filter = {"active": {"$exists": False}}
+
+    for incomplete in (NoFilter, NoUpdate):
+        with pytest.raises(TypeError):
+            incomplete()
+
+
+def test_filter_is_not_shared_between_migrations():
+    filters = [migration.filter for migration in load_migrations()]
+    assert len({id(filter) for filter in filters}) == len(filters)
+
+
+def test_users_without_the_flag_count_as_active_until_the_backfill_completes():
+    assert active_filter() == {"$ne": False}
+    migration_runner.completed.add(ACTIVE_FLAG_MIGRATION)
+    assert active_filter() is True
+
+
+async def test_completion_is_read_from_the_checkpoints(mongo):
+    await mongo.db[CHECKPOINTS].insert_many([
+        {"_id": ACTIVE_FLAG_MIGRATION, "state": "complete"},
+        {"_id": "m0002_user_timestamps", "state": "running"},
+    ])
+    await migration_runner.load_completed(mongo.db)
+    assert migration_runner.is_complete(ACTIVE_FLAG_MIGRATION)
+    assert not migration_runner.is_complete("m0002_user_timestamps")
+
+
+async def test_user_from_before_the_flag_is_found_during_the_backfill(mongo, create_user, no_caches):
+    await create_user("legacy")
+    await mongo.users.update_one({"user_id": "legacy"}, {"$unset": {"active": ""}})
+    await create_user("deactivated", active=False)
+
+    assert await user_crud.user_exists("legacy")
+    assert await user_crud.get_user_public("legacy") is not None
+    assert not await user_crud.user_exists("deactivated")
+
+
+async def test_backfill_run_switches_to_the_indexed_filter(mongo, create_user, no_caches, monkeypatch):
+    await create_user("legacy")
+    await mongo.users.update_one({"user_id": "legacy"}, {"$unset": {"active": ""}})
+    monkeypatch.setattr(migration_runner, "pause", 0)
+
+    await migration_runner.run(mongo.db, only=ACTIVE_FLAG_MIGRATION)
+    assert active_filter() is True
+    assert await user_crud.user_exists("legacy")
@@ -0,0 +1,62 @@
+import pytest
+from fastapi import HTTPException
+
+from core.cache import NegativeCache
+from db.crud.users import user_crud
+from db.mongo import mongodb
+
+pytestmark = pytest.mark.anyio
+
+
+class Lookups:
+    def __init__(self, cache: NegativeCache):
+        self.calls = 0
+        self.fail = False
+
+        @cache.guard("things", missing=False)
+        async def exists(crud, thing_id: str) -> bool:
+            self.calls += 1
+            if self.fail:
+                raise RuntimeError("database unavailable")
+            return False
+
+        self.exists = exists
+
+
+async def test_misses_are_answered_from_the_cache():
+    lookups = Lookups(NegativeCache(max_entries=10, ttl=30))
+
+    assert await lookups.exists(None, "a") is False
+    assert await lookups.exists(None, "a") is False
+    assert lookups.calls == 1
+
+
+async def test_errors_are_not_cached():
+    lookups = Lookups(NegativeCache(max_entries=10, ttl=30))
+    lookups.fail = True
+
+    with pytest.raises(RuntimeError):
+        await lookups.exists(None, "a")
+    lookups.fail = False
+    assert await lookups.exists(None, "a") is False
+    assert lookups.calls == 2
+
+
+async def test_discard_forgets_the_miss():
+    cache = NegativeCache(max_entries=10, ttl=30)
+    lookups = Lookups(cache)
+
+    await lookups.exists(None, "a")
+    cache.discard("things", "a")
+    await lookups.exists(None, "a")
+    assert lookups.calls == 2
+
+
+async def test_user_exists_raises_instead_of_recording_a_miss(monkeypatch):
+    # Not connected: every query fails
+    monkeypatch.setattr(mongodb, "db", None)
+
+    for _ in range(2):
+        with pytest.raises(HTTPException) as error:
+            await user_crud.user_exists("user_1")
+        assert error.value.status_code == 500
@@ -0,0 +1,94 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from pymongo import AsyncMongoClient
+
+from core.config import settings
+from core.metrics import mongo_pool_checked_out, mongo_pool_saturation, mongo_pool_waiting
+from db.monitoring import PoolMetricsListener
+from db.mongo import MongoDB, mongodb
+
+pytestmark = pytest.mark.anyio
+
+
+def test_client_options_come_from_settings(monkeypatch):
+    monkeypatch.setattr(settings, "MONGODB_MAX_POOL_SIZE", 50)
+    monkeypatch.setattr(settings, "MONGODB_MIN_POOL_SIZE", 5)
+    monkeypatch.setattr(settings, "MONGODB_COMPRESSORS", " zstd, ,zlib")
+
+    options = MongoDB._client_options()
+    assert options["maxPoolSize"] == 50 and options["minPoolSize"] == 5
+    assert options["compressors"] == ["zstd", "zlib"]
+
+    monkeypatch.setattr(settings, "MONGODB_COMPRESSORS", "")
+    assert "compressors" not in MongoDB._client_options()
+
+
+async def test_driver_accepts_the_client_options(monkeypatch):
+    monkeypatch.setattr(settings, "MONGODB_COMPRESSORS", "zlib")
+    client = AsyncMongoClient("mongodb://localhost:1", connect=False, **MongoDB._client_options())
+    try:
+        pool = client.options.pool_options
+        assert pool.max_pool_size == settings.MONGODB_MAX_POOL_SIZE
+        assert pool.min_pool_size == settings.MONGODB_MIN_POOL_SIZE
+        assert pool.wait_queue_timeout == settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS / 1000
+    finally:
+        await client.close()
+
+
+class FakeAdmin:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self.pings = 0
+
+    async def command(self, name: str):
+        self.pings += 1
+        self.concurrent += 1
+        self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        await asyncio.sleep(0.01)
+        self.concurrent -= 1
+        if self.pings <= self.failures:
+            raise ConnectionError("connection refused")
+        return {"ok": 1}
+
+
+async def test_warm_pool_pings_min_pool_size_at_once(monkeypatch):
+    admin = FakeAdmin(failures=1)
+    monkeypatch.setattr(mongodb, "client", SimpleNamespace(admin=admin))
+    monkeypatch.setattr(settings, "MONGODB_MIN_POOL_SIZE", 4)
+
+    await mongodb.warm_pool()  # a failed ping is logged, not raised
+    assert admin.pings == 4
+    assert admin.max_concurrent == 4
+
+
+async def test_warm_pool_is_off_without_a_minimum(monkeypatch):
+    admin = FakeAdmin(failures=0)
+    monkeypatch.setattr(mongodb, "client", SimpleNamespace(admin=admin))
+    monkeypatch.setattr(settings, "MONGODB_MIN_POOL_SIZE", 0)
+
+    await mongodb.warm_pool()
+    assert admin.pings == 0
+
+
+def test_pool_listener_tracks_waiting_and_saturation():
+    listener = PoolMetricsListener(max_pool_size=4)
+    event = SimpleNamespace(address=("pool-test", 27017), duration=0.002, reason="timeout")
+    address = "pool-test:27017"
+
+    listener.pool_created(event)
+    for _ in range(2):
+        listener.connection_check_out_started(event)
+        listener.connection_checked_out(event)
+    listener.connection_check_out_started(event)
+    assert mongo_pool_waiting._values[(address,)] == 1
+    assert mongo_pool_saturation._values[(address,)] == 0.5
+
+    listener.connection_check_out_failed(event)
+    listener.connection_checked_in(event)
+    assert mongo_pool_waiting._values[(address,)] == 0
+    assert mongo_pool_checked_out._values[(address,)] == 1
+    assert mongo_pool_saturation._values[(address,)] == 0.25
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from core import auth, profiling
+from core.auth import identity_cache
+from core.config import settings
+from core.profiling import AWAITING, PROFILE_HEADER, PROFILE_ID_HEADER, Profile, ProfilingMiddleware, SamplingProfiler
+
+pytestmark = pytest.mark.anyio
+
+
+def busy_work(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def slow_endpoint(request):
+    busy_work(0.05)
+    await asyncio.sleep(0.05)
+    return PlainTextResponse("ok")
+
+
+app = Starlette(routes=[Route("/things/{thing_id}", slow_endpoint)])
+app.add_middleware(ProfilingMiddleware)
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    profiler = SamplingProfiler(interval=0.002, max_per_route=2, sample_percent=0)
+    monkeypatch.setattr(profiling, "profiler", profiler)
+    return profiler
+
+
+async def get(path: str, headers=None) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get(path, headers=headers)
+
+
+async def test_unprofiled_requests_get_no_profile(profiler):
+    response = await get("/things/1", {PROFILE_HEADER: "1"})
+    assert PROFILE_ID_HEADER not in response.headers
+    assert profiler.stats()["profiled"] == 0
+
+
+async def test_sampled_request_charges_its_own_stacks_and_its_waits(profiler):
+    profiler.sample_percent = 100
+    response = await get("/things/1")
+
+    profile = profiler.get(response.headers[PROFILE_ID_HEADER])
+    assert profile.reason == "sampled"
+    assert (profile.route, profile.status) == ("/things/{thing_id}", 200)
+    assert any("busy_work" in stack for stack in profile.stacks)
+    assert profile.summary()["awaiting_samples"] > 0
+    assert profile.collapsed().splitlines()[0].rsplit(" ", 1)[1] == str(max(profile.stacks.values()))
+
+
+async def test_admin_header_needs_an_already_verified_token(profiler, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_USER_IDS", "admin")
+
+    async def verify(token: str) -> dict:
+        return {"user_id": token, "email": None, "name": None}
+    monkeypatch.setattr(auth, "verify_clerk_token", verify)
+
+    headers = {PROFILE_HEADER: "1", "Authorization": "Bearer admin"}
+    assert PROFILE_ID_HEADER not in (await get("/things/1", headers)).headers
+
+    await identity_cache.get_or_verify("admin")
+    response = await get("/things/1", headers)
+    assert profiler.get(response.headers[PROFILE_ID_HEADER]).reason == "header"
+
+    await identity_cache.get_or_verify("someone")
+    response = await get("/things/1", {PROFILE_HEADER: "1", "Authorization": "Bearer someone"})
+    assert PROFILE_ID_HEADER not in response.headers
+
+
+async def test_only_the_latest_profiles_per_route_are_kept(profiler):
+    profiler.sample_percent = 100
+    ids = [(await get(f"/things/{i}")).headers[PROFILE_ID_HEADER] for i in range(3)]
+
+    [stored] = profiler.list().values()
+    assert [profile["id"] for profile in stored] == ids[:0:-1]
+    assert profiler.get(ids[0]) is None
+
+
+def test_collapsed_format_sorts_by_count():
+    profile = Profile("GET", "/", "header")
+    for stack in ("a;b", AWAITING, "a;b", "a;c"):
+        profile.add(stack)
+    assert profile.collapsed() == f"a;b 2\n{AWAITING} 1\na;c 1\n"
+    assert profile.summary()["samples"] == 4
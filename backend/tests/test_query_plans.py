@@ -0,0 +1,63 @@
+"""
+Winning plans of every CRUD read against the index manifest: the same
+cases and checks as `python -m db.query_plans`, on a smaller seed. A query
+change that falls back to a collection scan or an in-memory sort, or an
+index dropped from INDEXES that a query still needs, fails here.
+"""
+import random
+
+import pytest
+from pymongo import monitoring
+
+from db.indexes import INDEXES
+from db.query_plans import PlanResult, Seed, _CommandCapture, cases, run, seed_database
+
+pytestmark = pytest.mark.anyio
+
+USERS = 400
+PROJECTS = 600
+MAX_RATIO = 10.0
+
+# Registered before any client exists, like the listener the script registers
+capture = _CommandCapture()
+monitoring.register(capture)
+
+MANIFEST = {"_id_"} | {model.document["name"] for models in INDEXES.values() for model in models}
+
+
+def describe(result: PlanResult) -> str:
+    plan = result.plan
+    return (
+        f"{result.case}: {result.command} {result.collection} {'>'.join(plan.get('stages', []))} "
+        f"{','.join(plan.get('indexes', []))} -- {'; '.join(result.problems)}"
+    )
+
+
+@pytest.fixture
+async def results(mongo, no_caches):
+    seed = await seed_database(mongo.db, USERS, PROJECTS, random.Random(0))
+    capture.commands = []
+    try:
+        return await run(mongo.db, seed, capture, MAX_RATIO)
+    finally:
+        capture.commands = []
+
+
+async def test_every_plan_passes(results):
+    failed = [describe(result) for result in results if result.problems]
+    assert not failed, "\n".join(failed)
+
+
+async def test_every_case_reaches_mongo(results):
+    explained = {result.case for result in results}
+    missing = [case.name for case in cases(Seed("", "")) if case.name not in explained]
+    assert not missing, f"no command captured for {missing}"
+
+
+async def test_plans_use_only_manifest_indexes(results):
+    unmanaged = {
+        f"{result.case}: {index}"
+        for result in results for index in result.plan.get("indexes", [])
+        if index not in MANIFEST
+    }
+    assert not unmanaged, sorted(unmanaged)
@@ -0,0 +1,175 @@
+import pytest
+from starlette.requests import Request
+from starlette.testclient import TestClient
+
+from core import middleware
+from core.config import settings
+from core.middleware import MemoryRateLimitStore, RateLimit, RateLimiter, RateLimitExceeded
+
+pytestmark = pytest.mark.anyio
+
+LIMIT = RateLimit(requests=5, window=10)  # one request every 2s, bursts of 5
+
+
+async def acquire_many(store, key: str, count: int, now: float, cost: float = 1.0):
+    return [(await store.acquire(key, LIMIT, now, cost))[0] for _ in range(count)]
+
+
+async def test_burst_up_to_the_limit_then_deny():
+    store = MemoryRateLimitStore()
+    assert await acquire_many(store, "a", 5, now=100.0) == [True] * 5
+
+    allowed, retry_after = await store.acquire("a", LIMIT, 100.0, 1.0)
+    assert not allowed
+    assert retry_after == pytest.approx(2.0)
+
+
+async def test_budget_refills_at_the_emission_interval():
+    store = MemoryRateLimitStore()
+    await acquire_many(store, "a", 5, now=100.0)
+
+    assert (await store.acquire("a", LIMIT, 101.0, 1.0))[0] is False
+    assert (await store.acquire("a", LIMIT, 102.0, 1.0))[0] is True
+    assert (await store.acquire("a", LIMIT, 102.0, 1.0))[0] is False
+
+
+async def test_denied_requests_do_not_spend_budget():
+    store = MemoryRateLimitStore()
+    await acquire_many(store, "a", 5, now=100.0)
+    await acquire_many(store, "a", 10, now=100.0)
+
+    assert (await store.acquire("a", LIMIT, 102.0, 1.0))[0] is True
+
+
+async def test_cost_weights_the_budget():
+    store = MemoryRateLimitStore()
+    assert await acquire_many(store, "a", 3, now=100.0, cost=2.0) == [True, True, False]
+    assert (await store.acquire("a", LIMIT, 100.0, 1.0))[0] is True
+
+
+async def test_keys_have_separate_budgets():
+    store = MemoryRateLimitStore()
+    await acquire_many(store, "a", 5, now=100.0)
+    assert (await store.acquire("b", LIMIT, 100.0, 1.0))[0] is True
+
+
+async def test_state_stays_bounded():
+    store = MemoryRateLimitStore(max_keys=10)
+    for i in range(50):
+        await store.acquire(f"ip:{i}", LIMIT, 100.0 + i, 1.0)
+        assert len(store._tats) <= 10
+
+
+async def test_throttled_keys_outlive_expired_ones_when_full():
+    store = MemoryRateLimitStore(max_keys=10)
+    await acquire_many(store, "abuser", 5, now=100.0)  # throttled until 110
+    for i in range(20):
+        await store.acquire(f"ip:{i}", LIMIT, 100.0 + i / 4, 1.0)
+
+    assert "abuser" in store._tats
+    assert (await store.acquire("abuser", LIMIT, 101.0, 1.0))[0] is False
+
+
+async def test_full_table_of_live_keys_evicts_the_earliest_arrival_time():
+    store = MemoryRateLimitStore(max_keys=3)
+    await acquire_many(store, "busy", 3, now=100.0)  # arrival time 106
+    await store.acquire("a", LIMIT, 100.0, 1.0)  # 102
+    await store.acquire("b", LIMIT, 100.0, 2.0)  # 104
+    await store.acquire("c", LIMIT, 100.0, 1.0)
+
+    assert set(store._tats) == {"busy", "b", "c"}
+
+
+async def test_superseded_heap_entries_are_compacted():
+    store = MemoryRateLimitStore(max_keys=10)
+    for i in range(100):
+        await store.acquire("a", LIMIT, 100.0 + 2 * i, 1.0)
+    assert len(store._expiry) <= 2 * store.max_keys + 1
+
+
+def make_request(cost: float = None) -> Request:
+    async def endpoint():
+        pass
+    if cost is not None:
+        endpoint._rate_limit_cost = cost
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [], "endpoint": endpoint})
+
+
+async def test_limiter_raises_429_with_retry_after():
+    limiter = RateLimiter(MemoryRateLimitStore(), LIMIT)
+    for _ in range(5):
+        await limiter.check(make_request(), "ip:1")
+
+    with pytest.raises(RateLimitExceeded) as error:
+        await limiter.check(make_request(), "ip:1")
+    assert error.value.status_code == 429
+    assert int(error.value.headers["Retry-After"]) >= 1
+
+
+async def test_limiter_charges_the_endpoint_cost():
+    limiter = RateLimiter(MemoryRateLimitStore(), LIMIT)
+    await limiter.check(make_request(cost=5.0), "ip:1")
+    with pytest.raises(RateLimitExceeded):
+        await limiter.check(make_request(), "ip:1")
+
+
+async def test_limiter_fails_open_when_the_store_fails():
+    class BrokenStore:
+        async def acquire(self, key, limit, now, cost):
+            raise ConnectionError("store unavailable")
+
+    await RateLimiter(BrokenStore(), LIMIT).check(make_request(), "ip:1")
+
+
+def test_app_checks_each_request_once(monkeypatch):
+    from main import app
+
+    # Frozen clock: no budget refills while the requests run
+    monkeypatch.setattr(middleware.time, "time", lambda: 1000.0)
+    client = TestClient(app, raise_server_exceptions=False)
+    statuses = [client.get("/").status_code for _ in range(settings.RATE_LIMIT_REQUESTS + 1)]
+
+    assert statuses[:-1] == [200] * settings.RATE_LIMIT_REQUESTS
+    assert statuses[-1] == 429
+
+
+def test_unverified_tokens_spend_the_ip_budget_before_any_clerk_call(monkeypatch):
+    from core import auth
+    from main import app
+
+    calls = []
+
+    async def verify(token: str) -> dict:
+        calls.append(token)
+        raise auth.AuthenticationError("Invalid or expired token")
+
+    monkeypatch.setattr(auth, "verify_clerk_token", verify)
+    monkeypatch.setattr(middleware.time, "time", lambda: 1000.0)
+    client = TestClient(app, raise_server_exceptions=False)
+    statuses = [
+        client.get("/", headers={"Authorization": f"Bearer bogus-{i}"}).status_code
+        for i in range(settings.RATE_LIMIT_REQUESTS + 5)
+    ]
+
+    assert statuses[-5:] == [429] * 5
+    # Only requests let through by the IP budget reach verification
+    assert len(calls) == settings.RATE_LIMIT_REQUESTS
+
+
+def test_verified_tokens_get_their_own_budget(monkeypatch):
+    from core import auth
+    from main import app
+
+    async def verify(token: str) -> dict:
+        return {"user_id": token, "email": None, "name": None}
+
+    monkeypatch.setattr(auth, "verify_clerk_token", verify)
+    monkeypatch.setattr(middleware.time, "time", lambda: 1000.0)
+    client = TestClient(app, raise_server_exceptions=False)
+    # The first request verifies the token, on the IP's budget
+    client.get("/", headers={"Authorization": "Bearer alice"})
+    for _ in range(settings.RATE_LIMIT_REQUESTS - 1):
+        client.get("/")
+
+    assert client.get("/").status_code == 429
+    assert client.get("/", headers={"Authorization": "Bearer alice"}).status_code == 200
@@ -0,0 +1,134 @@
+"""
+A request's causal session belongs to the request: shared reads that
+outlive it (stale refreshes, coalesced flights) run under their own read
+state and never use, or open, the request's session.
+"""
+import asyncio
+
+import pytest
+from bson import Timestamp
+
+from core.cache import RequestCoalescer, StaleWhileRevalidate
+from db import consistency
+from db.mongo import mongodb
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeSession:
+    def __init__(self):
+        self.operation_time = None
+        self.ended = False
+
+    def advance_cluster_time(self, cluster_time):
+        pass
+
+    def advance_operation_time(self, operation_time):
+        if self.operation_time is None or operation_time > self.operation_time:
+            self.operation_time = operation_time
+
+    async def end_session(self):
+        self.ended = True
+
+
+class FakeClient:
+    def __init__(self):
+        self.sessions = []
+
+    def start_session(self, causal_consistency: bool):
+        session = FakeSession()
+        self.sessions.append(session)
+        return session
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(mongodb, "client", client)
+    return client
+
+
+async def request(floor=None):
+    """What track_causal_reads and conditional_list leave behind, minus FastAPI."""
+    state = consistency.ReadState(None)
+    state.read_after(floor)
+    consistency._read_state.set(state)
+    return state
+
+
+async def end_request(state):
+    if state.session is not None:
+        await state.session.end_session()
+
+
+async def test_read_session_belongs_to_the_request_task(client):
+    state = await request(Timestamp(100, 1))
+    assert mongodb.read_session() is state.session is not None
+
+    # A task copying the request's context must not use (or open) its session
+    inherited = await asyncio.ensure_future(_read_session())
+    assert inherited is None
+    assert len(client.sessions) == 1
+
+
+async def _read_session():
+    return mongodb.read_session()
+
+
+async def test_stale_request_returns_before_its_refresh(client):
+    cache = StaleWhileRevalidate(soft_ttl=0, hard_ttl=60, latency_budget=1, max_entries=10)
+    release = asyncio.Event()
+    seen = {}
+
+    async def load(value):
+        await release.wait()
+        seen["session"] = mongodb.read_session()
+        seen["state"] = consistency.current_read_state()
+        return value
+
+    state = await request(Timestamp(100, 1))
+    state_session = mongodb.read_session()
+    release.set()
+    await cache._get("key", ("v1",), lambda: load("old"))  # first fill
+    release.clear()
+
+    # Stale hit: answered at once while the refresh waits on the database
+    assert await cache._get("key", ("v1",), lambda: load("new")) == "old"
+    await end_request(state)
+    assert state_session.ended
+
+    release.set()
+    await asyncio.sleep(0.01)
+    assert cache._entries["key"][1] == "new"
+    assert seen["state"] is not state
+    assert seen["state"].after_cluster_time == Timestamp(100, 1)
+    # The refresh opened its own session, carrying the request's floor, and ended it
+    refresh_session = seen["session"]
+    assert refresh_session is not state_session
+    assert refresh_session.operation_time == Timestamp(100, 1)
+    assert refresh_session.ended
+
+
+async def test_coalesced_flight_does_not_share_the_first_callers_session(client):
+    coalescer = RequestCoalescer(window=0, max_entries=10)
+    release = asyncio.Event()
+    sessions = []
+
+    class Reads:
+        @coalescer.coalesce("reads", collections=("projects",))
+        async def read(self):
+            await release.wait()
+            sessions.append(mongodb.read_session())
+            return "result"
+
+    state = await request(Timestamp(100, 1))
+    state_session = mongodb.read_session()
+    call = asyncio.ensure_future(Reads().read())
+    await asyncio.sleep(0)
+    call.cancel()  # the first caller goes away
+    await end_request(state)
+
+    release.set()
+    await asyncio.sleep(0.01)
+    assert sessions and sessions[0] is not state_session
+    assert sessions[0].ended
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from core.context import RequestContext
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_callers_share_one_lookup():
+    context = RequestContext()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+        return {"user_id": "u1"}
+
+    results = await asyncio.gather(*(context.memoize(("user", "u1"), load) for _ in range(5)))
+    assert calls == 1
+    assert all(result == {"user_id": "u1"} for result in results)
+
+
+async def test_failures_are_memoized_for_the_request():
+    context = RequestContext()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        raise ValueError("lookup failed")
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            await context.memoize(("identity", "token"), load)
+    assert calls == 1
+
+
+async def test_forget_reloads():
+    context = RequestContext()
+    values = iter(["old", "new"])
+
+    async def load():
+        return next(values)
+
+    assert await context.memoize("key", load) == "old"
+    context.forget("key")
+    assert await context.memoize("key", load) == "new"
+
+
+# One command per request for the profile, however many dependencies need it
+
+async def test_get_me_reads_the_profile_once(client, commands, create_user, sign_in, no_caches):
+    await create_user("user_me")
+    commands.clear()
+
+    response = await client.get("/users/me", headers=sign_in("user_me"))
+
+    assert response.status_code == 200
+    assert commands.commands == [("find", "users")]
+
+
+async def test_init_existing_user_reads_the_profile_once(client, commands, create_user, sign_in, no_caches):
+    await create_user("user_init")
+    commands.clear()
+
+    response = await client.post(
+        "/users/init",
+        json={"name": "Init", "institute": "Test Institute", "grad_year": 2026},
+        headers=sign_in("user_init")
+    )
+
+    assert response.status_code == 409
+    assert commands.commands == [("find", "users")]
+
+
+async def test_init_new_user_does_not_read_back_the_insert(client, commands, sign_in, no_caches):
+    response = await client.post(
+        "/users/init",
+        json={"name": "New", "institute": "Test Institute", "grad_year": 2026},
+        headers=sign_in("user_new")
+    )
+
+    assert response.status_code == 200
+    assert commands.commands == [("find", "users"), ("insert", "users")]
+
+
+async def test_owner_update_is_one_command(client, commands, create_user, create_project, sign_in, no_caches):
+    await create_user("owner")
+    project = await create_project("owner")
+    commands.clear()
+
+    response = await client.put(
+        f"/projects/{project['_id']}",
+        json={"title": "Renamed"},
+        headers=sign_in("owner")
+    )
+
+    assert response.status_code == 200
+    assert commands.commands == [("findAndModify", "projects")]
+
+
+async def test_non_owner_update_looks_up_the_owner_once(client, commands, create_user, create_project, sign_in, no_caches):
+    await create_user("owner")
+    await create_user("intruder")
+    project = await create_project("owner")
+    commands.clear()
+
+    response = await client.put(
+        f"/projects/{project['_id']}",
+        json={"title": "Renamed"},
+        headers=sign_in("intruder")
+    )
+
+    assert response.status_code == 403
+    assert commands.commands == [("findAndModify", "projects"), ("find", "projects")]
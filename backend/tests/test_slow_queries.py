@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from db.slow_queries import SlowQueryRecorder, command_filter, query_shape, suggest_index, summarize_plan
+
+pytestmark = pytest.mark.anyio
+
+COLLSCAN_EXPLAIN = {
+    "queryPlanner": {"winningPlan": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}, "rejectedPlans": []},
+    "executionStats": {"nReturned": 5, "totalKeysExamined": 0, "totalDocsExamined": 5000, "executionTimeMillis": 40},
+}
+
+
+def test_query_shape_replaces_literals():
+    shape = query_shape({"tags": {"$in": ["ai", "web"]}, "created_by": "u1", "$or": [{"a": 1}, {"b": {"$gt": 2}}]})
+    assert shape == {"$or": [{"a": "?"}, {"b": {"$gt": "?"}}], "created_by": "?", "tags": {"$in": ["?"]}}
+    assert query_shape({"tags": {"$in": ["ai"]}}) == query_shape({"tags": {"$in": ["x", "y", "z"]}})
+
+
+def test_aggregate_filter_and_sort_come_from_the_leading_stages():
+    command = {"aggregate": "projects", "pipeline": [
+        {"$match": {"status": "active"}},
+        {"$sort": {"created_at": -1}},
+        {"$group": {"_id": "$created_by"}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]}
+    assert command_filter("aggregate", command) == ({"status": "active"}, {"created_at": -1})
+    assert command_filter("count", {"count": "users", "query": {"active": True}}) == ({"active": True}, {})
+
+
+def test_suggested_keys_follow_equality_sort_range():
+    keys = suggest_index({"grad_year": {"$gte": 2024}, "institute": "x", "skills": {"$in": ["go"]}}, {"created_at": -1})
+    assert keys == [[("institute", 1), ("skills", 1), ("created_at", -1), ("grad_year", 1)]]
+
+
+def test_top_level_or_gets_one_index_per_branch():
+    keys = suggest_index({"$or": [{"created_by": "?"}, {"contributors": "?"}]}, {"created_at": -1})
+    assert keys == [[("created_by", 1), ("created_at", -1)], [("contributors", 1), ("created_at", -1)]]
+
+
+def test_plan_summary_reads_the_winning_plan_only():
+    explain = {**COLLSCAN_EXPLAIN, "queryPlanner": {
+        **COLLSCAN_EXPLAIN["queryPlanner"],
+        "rejectedPlans": [{"stage": "IXSCAN", "indexName": "status_1"}],
+    }}
+    plan = summarize_plan(explain)
+    assert plan["stages"] == ["SORT", "COLLSCAN"]
+    assert plan["collscan"] and plan["indexes"] == []
+    assert (plan["docs_examined"], plan["returned"], plan["execution_ms"]) == (5000, 5, 40)
+
+
+class FakeCollection:
+    def __init__(self, indexes):
+        self.indexes = indexes
+
+    async def index_information(self):
+        return self.indexes
+
+
+class FakeDatabase:
+    def __init__(self, indexes):
+        self.explained = []
+        self.indexes = indexes
+
+    async def command(self, command):
+        self.explained.append(command)
+        return COLLSCAN_EXPLAIN
+
+    def __getitem__(self, name):
+        return FakeCollection(self.indexes)
+
+
+async def test_shapes_are_aggregated_and_explained_once():
+    database = FakeDatabase({"_id_": {"key": [("_id", 1)]}, "status_1": {"key": [("status", 1)]}})
+    recorder = SlowQueryRecorder(threshold_ms=100, max_shapes=10)
+    recorder.attach(database)
+
+    for user_id, duration in (("u1", 150.0), ("u2", 250.0)):
+        command = {"find": "projects", "filter": {"created_by": user_id}, "sort": {"created_at": -1}, "lsid": {}}
+        recorder.record("projects", "find", command, duration)
+    await asyncio.sleep(0.01)
+
+    [entry] = recorder.report()
+    assert (entry["count"], entry["max_ms"], entry["avg_ms"]) == (2, 250.0, 200.0)
+    assert entry["shape"] == {"filter": {"created_by": "?"}, "sort": [("created_at", -1)]}
+    assert len(database.explained) == 1
+    assert "lsid" not in database.explained[0]["explain"]
+    assert entry["plan"]["collscan"]
+    assert entry["suggested_indexes"] == [[("created_by", 1), ("created_at", -1)]]
+
+
+async def test_no_suggestion_when_an_index_has_the_keys_as_prefix():
+    database = FakeDatabase({"status_1_created_at_-1": {"key": [("status", 1), ("created_at", -1), ("_id", 1)]}})
+    recorder = SlowQueryRecorder(threshold_ms=100, max_shapes=10)
+    recorder.attach(database)
+
+    recorder.record("projects", "find", {"filter": {"status": "active"}, "sort": {"created_at": -1}}, 300.0)
+    await asyncio.sleep(0.01)
+    assert recorder.report()[0]["suggested_indexes"] == []
+
+
+def test_shapes_are_bounded():
+    recorder = SlowQueryRecorder(threshold_ms=100, max_shapes=2, explain=False)
+    for field in ("a", "b", "c"):
+        recorder.record("users", "find", {"filter": {field: 1}}, 200.0)
+    assert sorted(next(iter(entry["shape"]["filter"])) for entry in recorder.report()) == ["b", "c"]
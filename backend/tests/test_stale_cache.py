@@ -0,0 +1,140 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from starlette.responses import Response
+
+from core import cache
+from core.cache import StaleWhileRevalidate, allow_stale
+
+pytestmark = pytest.mark.anyio
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Only the cache's clock: the event loop keeps the real one
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+@pytest.fixture
+async def response():
+    response = Response()
+    response.headers["etag"] = 'W/"list"'
+    await allow_stale(response)
+    return response
+
+
+class Loader:
+    """Fake list read: returns the next value, optionally slow or failing."""
+
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = 0
+        self.delay = 0.0
+        self.fail = False
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        return self.values.pop(0)
+
+
+def make_cache(**overrides) -> StaleWhileRevalidate:
+    options = dict(soft_ttl=10, hard_ttl=60, latency_budget=0.05, max_entries=10)
+    options.update(overrides)
+    return StaleWhileRevalidate(**options)
+
+
+async def test_fresh_entries_are_served_without_a_query(clock, response):
+    stale = make_cache()
+    loader = Loader("v1")
+    assert await stale._get("key", ("1",), loader) == "v1"
+    clock.now += 5
+    assert await stale._get("key", ("1",), loader) == "v1"
+
+    assert loader.calls == 1
+    assert stale.stats()["fresh_hits"] == 1
+    assert "Warning" not in response.headers
+
+
+async def test_soft_expired_entry_is_served_stale_while_one_refresh_runs(clock, response):
+    stale = make_cache()
+    loader = Loader("v1", "v2")
+    await stale._get("key", ("1",), loader)
+    clock.now += 15
+
+    assert await stale._get("key", ("1",), loader) == "v1"
+    assert await stale._get("key", ("1",), loader) == "v1"
+    assert response.headers["Age"] == "15"
+    assert response.headers["Warning"] == '110 - "Response is Stale"'
+    assert "etag" not in response.headers
+
+    await asyncio.sleep(0.01)
+    assert loader.calls == 2  # one refresh for both stale hits
+    assert await stale._get("key", ("1",), loader) == "v2"
+    assert stale.stats()["stale_served"] == 2
+
+
+async def test_hard_expired_entry_waits_for_the_database(clock, response):
+    stale = make_cache()
+    loader = Loader("v1", "v2")
+    await stale._get("key", ("1",), loader)
+    clock.now += 61
+
+    assert await stale._get("key", ("1",), loader) == "v2"
+    assert "Warning" not in response.headers
+
+
+async def test_write_refreshes_inline_within_the_latency_budget(clock, response):
+    stale = make_cache()
+    loader = Loader("v1", "v2")
+    await stale._get("key", ("1",), loader)
+
+    assert await stale._get("key", ("2",), loader) == "v2"
+    assert "Warning" not in response.headers
+
+
+async def test_slow_refresh_after_a_write_falls_back_to_the_last_value(clock, response):
+    stale = make_cache()
+    loader = Loader("v1", "v2")
+    await stale._get("key", ("1",), loader)
+    clock.now += 3
+    loader.delay = 0.2
+
+    assert await stale._get("key", ("2",), loader) == "v1"
+    assert response.headers["Warning"] == '110 - "Response is Stale"'
+    assert response.headers["Age"] == "3"
+    assert stale.stats()["fallbacks"] == 1
+
+    await asyncio.sleep(0.3)
+    assert await stale._get("key", ("2",), loader) == "v2"
+
+
+async def test_failed_refresh_after_a_write_serves_the_last_value(clock, response):
+    stale = make_cache()
+    loader = Loader("v1")
+    await stale._get("key", ("1",), loader)
+    loader.fail = True
+
+    assert await stale._get("key", ("2",), loader) == "v1"
+    assert response.headers["Warning"] == '111 - "Revalidation Failed"'
+    assert stale.stats()["refresh_failures"] == 1
+
+
+async def test_entries_are_bounded(clock):
+    stale = make_cache(max_entries=2)
+    for i in range(4):
+        await stale._get(f"key{i}", ("1",), Loader(i))
+    assert list(stale._entries) == ["key2", "key3"]
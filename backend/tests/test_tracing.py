@@ -0,0 +1,145 @@
+import json
+import queue
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import APIRouter, FastAPI
+
+from core.logging_config import DroppingQueueHandler
+from core.tracing import (
+    TRACE_ID_HEADER, Span, TracedRoute, TracingListener, TracingMiddleware, _current_span, traced_methods, tracer
+)
+
+pytestmark = pytest.mark.anyio
+
+
+@traced_methods
+class ThingCRUD:
+    async def get_thing(self, thing_id: str):
+        return {"id": thing_id}
+
+    def _private(self):
+        pass
+
+
+thing_crud = ThingCRUD()
+router = APIRouter(prefix="/things", route_class=TracedRoute)
+
+
+@router.get("/{thing_id}")
+async def get_thing(thing_id: str):
+    return await thing_crud.get_thing(thing_id)
+
+
+app = FastAPI()
+app.include_router(router)
+app.add_middleware(TracingMiddleware)
+
+
+@pytest.fixture
+def exported(monkeypatch):
+    """Batches the tracer exports, read straight off its queue."""
+    handler = DroppingQueueHandler(queue.Queue())
+    monkeypatch.setattr(tracer, "enabled", True)
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+    monkeypatch.setattr(tracer, "_handler", handler)
+
+    def batches():
+        items = []
+        while not handler.queue.empty():
+            items.append(json.loads(handler.queue.get_nowait().getMessage()))
+        return items
+    return batches
+
+
+async def get(path: str) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get(path)
+
+
+async def test_sampled_request_exports_one_zipkin_trace(exported):
+    response = await get("/things/abc")
+    assert response.json() == {"id": "abc"}
+
+    [spans] = exported()
+    by_name = {span["name"]: span for span in spans}
+    root = by_name["GET /things/{thing_id}"]
+    assert response.headers[TRACE_ID_HEADER] == root["traceId"]
+    assert {span["traceId"] for span in spans} == {root["traceId"]}
+    assert root["kind"] == "SERVER" and "parentId" not in root
+    assert root["tags"]["http.status_code"] == "200"
+    assert root["localEndpoint"] == {"serviceName": "runegard-api"}
+
+    route = by_name["route /things/{thing_id}"]
+    endpoint = by_name["endpoint get_thing"]
+    assert route["parentId"] == root["id"]
+    assert by_name["dependencies"]["parentId"] == route["id"]
+    assert by_name["serialize"]["parentId"] == route["id"]
+    assert endpoint["parentId"] == route["id"]
+    assert by_name["ThingCRUD.get_thing"]["parentId"] == endpoint["id"]
+    assert "ThingCRUD._private" not in by_name
+    assert all(span["duration"] >= 1 for span in spans)
+
+
+async def test_unsampled_requests_are_not_traced(exported, monkeypatch):
+    monkeypatch.setattr(tracer, "sample_rate", 0.0)
+    response = await get("/things/abc")
+    assert response.json() == {"id": "abc"}
+    assert TRACE_ID_HEADER not in response.headers
+    assert exported() == []
+
+
+async def test_failing_span_is_tagged_with_the_error(exported):
+    root = tracer.start_trace("GET")
+    token = _current_span.set(root)
+    try:
+        with pytest.raises(KeyError):
+            with tracer.span("lookup"):
+                raise KeyError("missing")
+    finally:
+        _current_span.reset(token)
+    root.finish()
+
+    [spans] = exported()
+    assert spans[0]["name"] == "lookup"
+    assert spans[0]["tags"] == {"error": "KeyError"}
+
+
+async def test_span_finished_after_its_trace_is_exported_alone(exported):
+    root = tracer.start_trace("GET")
+    late = Span(root.trace, "coalesced read", root)
+    root.finish()
+    late.finish()
+    assert [[span["name"] for span in batch] for batch in exported()] == [["GET"], ["coalesced read"]]
+
+
+def command_event(request_id: int, **fields):
+    return SimpleNamespace(
+        command_name="find", command={"find": "projects"}, database_name="runegard",
+        request_id=request_id, connection_id=("localhost", 27017), duration_micros=1500, **fields
+    )
+
+
+async def test_driver_commands_become_client_spans(exported):
+    listener = TracingListener()
+    listener.started(command_event(1))  # outside any trace: ignored
+
+    root = tracer.start_trace("GET")
+    token = _current_span.set(root)
+    try:
+        listener.started(command_event(2))
+        listener.succeeded(command_event(2))
+        listener.started(command_event(3))
+        listener.failed(command_event(3, failure={"codeName": "ExceededTimeLimit"}))
+    finally:
+        _current_span.reset(token)
+    listener.succeeded(command_event(1))
+    root.finish()
+
+    [spans] = exported()
+    ok, failed, _ = spans
+    assert ok["name"] == "mongo find" and ok["kind"] == "CLIENT"
+    assert ok["duration"] == 1500 and ok["parentId"] == root.id
+    assert ok["tags"] == {"db.system": "mongodb", "db.name": "runegard", "db.operation": "find", "db.collection": "projects"}
+    assert failed["tags"]["error"] == "ExceededTimeLimit"